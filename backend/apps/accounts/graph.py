@@ -0,0 +1,195 @@
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, IntegerField, Value
+from friendship.models import Block, Follow, Friend, FriendshipRequest
+
+# The friends graph: friendships, follows, blocks and pending friend requests.
+#
+# Each user's adjacency (the ids of their friends, the users they follow and
+# who follow them, block and are blocked by, and their pending requests each
+# way by user) is cached under one key, loaded in a single UNION query on a
+# miss. relationships() answers "how do I relate to these N users" from the
+# requesting user's adjacency alone, so search results and profiles cost no
+# query per user shown. The lists (friends(), followers(), requests) are one
+# select_related query each; an empty adjacency entry skips it.
+#
+# Every save or delete of a Friend, Follow, Block or FriendshipRequest row
+# drops the adjacency of both users it joins (see signals.py), right away and
+# again once the transaction commits, so no reader caches a state that is
+# rolled back or not yet visible. Rows bulk-inserted without signals (the
+# synthetic data generator) join users that were just created and therefore
+# have nothing cached.
+
+GRAPH_TIMEOUT = 60 * 60 * 24
+
+EDGES = {
+    # kind: (queryset of the user's rows, column of the other user)
+    "friends": (lambda pk: Friend.objects.filter(to_user_id=pk), "from_user_id"),
+    "following": (lambda pk: Follow.objects.filter(follower_id=pk), "followee_id"),
+    "followers": (lambda pk: Follow.objects.filter(followee_id=pk), "follower_id"),
+    "blocking": (lambda pk: Block.objects.filter(blocker_id=pk), "blocked_id"),
+    "blocked_by": (lambda pk: Block.objects.filter(blocked_id=pk), "blocker_id"),
+    "requests_sent": (
+        lambda pk: FriendshipRequest.objects.filter(from_user_id=pk, rejected__isnull=True),
+        "to_user_id",
+    ),
+    "requests_received": (
+        lambda pk: FriendshipRequest.objects.filter(to_user_id=pk, rejected__isnull=True),
+        "from_user_id",
+    ),
+}
+REQUESTS = ("requests_sent", "requests_received")
+
+
+def cache_key(user_pk):
+    return f"friends-graph:{user_pk}"
+
+
+def _pk(user):
+    return getattr(user, "pk", user)
+
+
+def _load(user_pk):
+    queries = [
+        rows(user_pk)
+        .order_by()
+        .annotate(
+            kind=Value(kind),
+            other=F(column),
+            request=F("id") if kind in REQUESTS else Value(None, output_field=IntegerField()),
+        )
+        .values_list("kind", "other", "request")
+        for kind, (rows, column) in EDGES.items()
+    ]
+    adjacency = {kind: {} if kind in REQUESTS else set() for kind in EDGES}
+    for kind, other, request in queries[0].union(*queries[1:], all=True):
+        if kind in REQUESTS:
+            adjacency[kind][other] = request
+        else:
+            adjacency[kind].add(other)
+    return adjacency
+
+
+def adjacency(user):
+    """
+    The user's relations, cached.
+
+    @param user: A user or a user id.
+    @return: {"friends", "following", "followers", "blocking", "blocked_by":
+        set of user ids, "requests_sent", "requests_received": {user id:
+        friendship request id}}, pending requests only.
+    """
+    key = cache_key(_pk(user))
+    found = cache.get(key)
+    if found is None:
+        found = _load(_pk(user))
+        cache.set(key, found, GRAPH_TIMEOUT)
+    return found
+
+
+def friend_ids(user):
+    return adjacency(user)["friends"]
+
+
+def relationship(edges, other_pk):
+    return {
+        "user_id": other_pk,
+        "is_friend": other_pk in edges["friends"],
+        "is_following": other_pk in edges["following"],
+        "is_followed_by": other_pk in edges["followers"],
+        "is_blocking": other_pk in edges["blocking"],
+        "is_blocked_by": other_pk in edges["blocked_by"],
+        "request_sent": edges["requests_sent"].get(other_pk),
+        "request_received": edges["requests_received"].get(other_pk),
+    }
+
+
+def relationships(user, others):
+    """
+    How the user relates to each of the others, from the user's adjacency
+    alone (no query once it is cached).
+
+    @param others: Users or user ids.
+    @return: {user id: {"user_id", "is_friend", "is_following", "is_followed_by",
+        "is_blocking", "is_blocked_by", "request_sent", "request_received"}},
+        the request fields being the id of the pending request or None.
+    """
+    edges = adjacency(user)
+    return {_pk(other): relationship(edges, _pk(other)) for other in others}
+
+
+def invalidate(*user_pks):
+    keys = [cache_key(pk) for pk in user_pks]
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+# --- Lists, one query each ---
+
+def friends(user):
+    if not friend_ids(user):
+        return []
+    return [
+        row.from_user
+        for row in Friend.objects.filter(to_user=user).select_related("from_user").order_by("created")
+    ]
+
+
+def followers(user):
+    if not adjacency(user)["followers"]:
+        return []
+    return [
+        row.follower
+        for row in Follow.objects.filter(followee=user).select_related("follower").order_by("created")
+    ]
+
+
+def following(user):
+    if not adjacency(user)["following"]:
+        return []
+    return [
+        row.followee
+        for row in Follow.objects.filter(follower=user).select_related("followee").order_by("created")
+    ]
+
+
+def blockers(user):
+    """Users blocking the user."""
+    if not adjacency(user)["blocked_by"]:
+        return []
+    return [
+        row.blocker
+        for row in Block.objects.filter(blocked=user).select_related("blocker").order_by("created")
+    ]
+
+
+def blocked(user):
+    """Users the user blocks."""
+    if not adjacency(user)["blocking"]:
+        return []
+    return [
+        row.blocked
+        for row in Block.objects.filter(blocker=user).select_related("blocked").order_by("created")
+    ]
+
+
+def requests_received(user):
+    """The user's pending incoming friend requests, users joined."""
+    if not adjacency(user)["requests_received"]:
+        return []
+    return list(
+        FriendshipRequest.objects.filter(to_user=user, rejected__isnull=True)
+        .select_related("from_user", "to_user")
+        .order_by("created")
+    )
+
+
+def requests_sent(user):
+    """The user's pending outgoing friend requests, users joined."""
+    if not adjacency(user)["requests_sent"]:
+        return []
+    return list(
+        FriendshipRequest.objects.filter(from_user=user, rejected__isnull=True)
+        .select_related("from_user", "to_user")
+        .order_by("created")
+    )
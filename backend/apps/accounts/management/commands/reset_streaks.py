@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from apps.accounts.streaks import rebuild_streaks, reset_broken_streaks
+
+
+class Command(BaseCommand):
+    help = (
+        "Zeroes the streaks broken by a missed day, in one statement. Meant to run "
+        "nightly, e.g. from cron shortly after midnight in TIME_ZONE."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--rebuild",
+            action="store_true",
+            help="Recompute every user's streak columns from the activity log instead (longest_streak only rises).",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of users written per update with --rebuild.",
+        )
+
+    def handle(self, *args, **options):
+        if options["rebuild"]:
+            users = rebuild_streaks(batch_size=options["batch_size"])
+            self.stdout.write(self.style.SUCCESS(f"Rebuilt the streaks of {users} active users."))
+        else:
+            reset = reset_broken_streaks()
+            self.stdout.write(self.style.SUCCESS(f"Reset {reset} broken streaks."))
@@ -0,0 +1,25 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from apps.accounts.utils import AVATAR_DIR, parse_avatar_name, store_avatar
+
+
+class Command(BaseCommand):
+    help = (
+        "Stores the shared default avatars users point to but storage is missing, "
+        "e.g. when a worker stopped before its background queue was done."
+    )
+
+    def handle(self, *args, **options):
+        names = (
+            get_user_model()
+            .objects.filter(profile_pic__startswith=f"{AVATAR_DIR}/")
+            .values_list("profile_pic", flat=True)
+            .distinct()
+        )
+        checked = 0
+        for name in names:
+            key = parse_avatar_name(name)
+            if key is not None:
+                store_avatar(*key)
+                checked += 1
+        self.stdout.write(self.style.SUCCESS(f"Checked {checked} default avatars."))
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.6 on 2026-10-18 14:42
+
+import apps.website.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_customuser_totp_secret'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='customuser',
+            name='profile_pic',
+            field=models.ImageField(blank=True, storage=apps.website.storage.image_storage, upload_to='Images/'),
+        ),
+    ]
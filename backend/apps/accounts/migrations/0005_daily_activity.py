@@ -0,0 +1,46 @@
+# Generated by Django 5.2.6 on 2026-10-18 15:12
+
+from datetime import timedelta
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def log_current_streaks(apps, schema_editor):
+    # The days behind each current streak; earlier streaks were never recorded
+    CustomUser = apps.get_model("accounts", "CustomUser")
+    DailyActivity = apps.get_model("accounts", "DailyActivity")
+    batch = []
+    for user_id, last_activity, streak in (
+        CustomUser.objects.exclude(last_activity=None).values_list("id", "last_activity", "streak").iterator()
+    ):
+        batch.extend(
+            DailyActivity(user_id=user_id, day=last_activity - timedelta(days=i))
+            for i in range(max(streak, 1))
+        )
+        if len(batch) >= 1000:
+            DailyActivity.objects.bulk_create(batch)
+            batch = []
+    DailyActivity.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_dedup_image_storage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyActivity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='activity', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'day'), name='unique_daily_activity')],
+            },
+        ),
+        migrations.RunPython(log_current_streaks, migrations.RunPython.noop),
+    ]
@@ -1,49 +1,30 @@
-from django.utils import timezone
 from django.db import models
 from django.contrib.auth.models import AbstractUser
 from auditlog.registry import auditlog
+from apps.website.storage import image_storage
 
 class CustomUser(AbstractUser):
     """
     Custom User model extending Django's AbstractUser.
     """
     # The new score field is added directly to the User model
-    profile_pic = models.ImageField(upload_to="Images/", blank=True)
+    profile_pic = models.ImageField(upload_to="Images/", storage=image_storage, blank=True)
     description = models.CharField(max_length=200, blank=True)
     streak = models.IntegerField(default=0)
     last_activity = models.DateField(null=True, blank=True)
     longest_streak = models.IntegerField(default=0)
     totp_secret = models.CharField(max_length=32, blank=True, null=True)
 
+    @property
+    def current_streak(self):
+        """The streak as of today; the stored one stays until the nightly reset."""
+        from .streaks import current_streak
+        return current_streak(self)
+
     def update_streak(self):
         """Call this whenever the user completes a streak-qualifying action."""
-        today = timezone.localdate()
-
-        # First action ever → initialize
-        if not self.last_activity:
-            self.last_activity = today
-            self.streak = 1
-            self.longest_streak = 1
-            self.save()
-            return
-
-        # If user already acted today → no change
-        if self.last_activity == today:
-            return
-
-        # If last action was yesterday → streak continues
-        if self.last_activity == today - timezone.timedelta(days=1):
-            self.streak += 1
-        else:
-            # Missed a day → reset streak
-            self.streak = 0
-
-        # Update longest streak
-        if self.streak > self.longest_streak:
-            self.longest_streak = self.streak
-
-        self.last_activity = today
-        self.save()
+        from .streaks import record_activity
+        record_activity(self)
 
     def save(self, *args, **kwargs):
         if not self.profile_pic:
@@ -59,4 +40,18 @@ class CustomUser(AbstractUser):
         return self.username
 
 
+class DailyActivity(models.Model):
+    """A day on which the user did something that counts towards their streak."""
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name="activity")
+    day = models.DateField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "day"], name="unique_daily_activity")
+        ]
+
+    def __str__(self):
+        return f"{self.user} on {self.day}"
+
+
 auditlog.register(CustomUser)
\ No newline at end of file
@@ -1,7 +1,9 @@
 from django.contrib.auth import get_user_model
 from friendship.models import FriendshipRequest
 from rest_framework import serializers
+from drf_spectacular.utils import extend_schema_field
 from django.contrib.auth.models import User
+from apps.website.serializers import ImageVariantsField
 
 User = get_user_model()
 
@@ -24,17 +26,45 @@ class UserSerializer(serializers.ModelSerializer):
     user_id = serializers.IntegerField(source="id", read_only=True)
     username = serializers.CharField()
     profile_pic = serializers.ImageField()
+    profile_pic_variants = ImageVariantsField(source="profile_pic")
     description = serializers.CharField()
-    streak = serializers.IntegerField()
-    longest_streak = serializers.IntegerField()
+    streak = serializers.IntegerField(source="current_streak", read_only=True)
+    longest_streak = serializers.IntegerField(read_only=True)
     date_joined = serializers.DateTimeField()
 
     class Meta:
         model = User
-        fields = ["user_id", "username", "profile_pic", "description", "date_joined", "email", "streak", "longest_streak"]
+        fields = ["user_id", "username", "profile_pic", "profile_pic_variants", "description", "date_joined", "email", "streak", "longest_streak"]
         read_only_fields = ["user_id", "date_joined"]
 
 
+# -------------------------------
+# Relationship Serializers
+# -------------------------------
+class RelationshipSerializer(serializers.Serializer):
+    user_id = serializers.IntegerField()
+    is_friend = serializers.BooleanField()
+    is_following = serializers.BooleanField()
+    is_followed_by = serializers.BooleanField()
+    is_blocking = serializers.BooleanField()
+    is_blocked_by = serializers.BooleanField()
+    request_sent = serializers.IntegerField(allow_null=True)
+    request_received = serializers.IntegerField(allow_null=True)
+
+
+class UserRelationshipSerializer(UserSerializer):
+    """A user and how the requesting user relates to them, from context["relationships"] (graph.relationships)."""
+
+    relationship = serializers.SerializerMethodField()
+
+    class Meta(UserSerializer.Meta):
+        fields = UserSerializer.Meta.fields + ["relationship"]
+
+    @extend_schema_field(RelationshipSerializer)
+    def get_relationship(self, obj):
+        return self.context["relationships"][obj.pk]
+
+
 # -------------------------------
 # FriendshipRequest Serializer
 # -------------------------------
@@ -0,0 +1,23 @@
+from django.db.models.signals import post_delete, post_save
+from friendship.models import Block, Follow, Friend, FriendshipRequest
+from . import graph
+
+# --- Friends graph (see graph.py) ---
+#
+# Each relation drops the cached adjacency of the two users it joins.
+
+RELATIONS = {
+    Friend: ("from_user_id", "to_user_id"),
+    FriendshipRequest: ("from_user_id", "to_user_id"),
+    Follow: ("follower_id", "followee_id"),
+    Block: ("blocker_id", "blocked_id"),
+}
+
+
+def _invalidate_graph(sender, instance, **kwargs):
+    graph.invalidate(*(getattr(instance, column) for column in RELATIONS[sender]))
+
+
+for model in RELATIONS:
+    post_save.connect(_invalidate_graph, sender=model, dispatch_uid=f"graph_save_{model.__name__}")
+    post_delete.connect(_invalidate_graph, sender=model, dispatch_uid=f"graph_delete_{model.__name__}")
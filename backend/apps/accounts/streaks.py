@@ -0,0 +1,149 @@
+from datetime import timedelta
+from itertools import groupby
+from operator import itemgetter
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Case, F, Q, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from apps.website import leaderboards
+from .models import DailyActivity
+
+# Streaks from a log of active days.
+#
+# A streak-qualifying action (record_activity) does not save the user. It
+# runs one conditional UPDATE of the user row, WHERE last_activity < today,
+# which continues or restarts the streak and raises longest_streak in SQL,
+# and logs the day in DailyActivity when that UPDATE matched. Every later
+# action of the day matches no row, and when the loaded user already shows
+# activity today, nothing is sent at all. None of it goes through
+# CustomUser.save() or auditlog.
+#
+# CustomUser.streak is only written on activity, so a broken streak stays in
+# the column until reset_broken_streaks() zeroes them all in one statement
+# (the nightly reset_streaks command). current_streak() gives the right value
+# in between. rebuild_streaks() recomputes the columns from the log, except
+# that longest_streak never goes down: the log only reaches back to when it
+# was introduced (migration 0005 logged each user's current streak alone).
+# The streak leaderboards (apps/website/leaderboards.py) follow every change.
+
+
+def current_streak(user, today=None):
+    """The user's streak, counting it as broken once a whole day is missed."""
+    today = today or timezone.localdate()
+    if user.last_activity is None or user.last_activity < today - timedelta(days=1):
+        return 0
+    return user.streak
+
+
+def record_activity(user, today=None):
+    """
+    Counts today towards the user's streak.
+
+    @return: Whether this was the user's first action of the day.
+    """
+    today = today or timezone.localdate()
+    if user.last_activity is not None and user.last_activity >= today:
+        return False
+
+    yesterday = today - timedelta(days=1)
+    streak = Case(When(last_activity=yesterday, then=F("streak") + 1), default=Value(1))
+    with transaction.atomic():
+        updated = (
+            get_user_model()
+            .objects.filter(Q(last_activity__lt=today) | Q(last_activity__isnull=True), pk=user.pk)
+            .update(
+                streak=streak,
+                longest_streak=Greatest("longest_streak", streak),
+                last_activity=today,
+            )
+        )
+        if updated:
+            DailyActivity.objects.bulk_create(
+                [DailyActivity(user_id=user.pk, day=today)], ignore_conflicts=True
+            )
+            leaderboards.mark_changed(("streak", "longest_streak"), [user.pk])
+
+    if updated:
+        # Mirror the UPDATE on the loaded user, as far as its values are current
+        user.streak = user.streak + 1 if user.last_activity == yesterday else 1
+        user.longest_streak = max(user.longest_streak, user.streak)
+    user.last_activity = today
+    return bool(updated)
+
+
+def reset_broken_streaks(today=None):
+    """
+    Zeroes the streak of every user who missed a whole day.
+
+    @return: The number of streaks reset.
+    """
+    today = today or timezone.localdate()
+    reset = (
+        get_user_model()
+        .objects.filter(streak__gt=0, last_activity__lt=today - timedelta(days=1))
+        .update(streak=0)
+    )
+    leaderboards.invalidate_on_commit("streak")
+    return reset
+
+
+def streaks_from_days(days, today):
+    """(streak, longest_streak) of a user active on the given sorted days."""
+    longest = run = 0
+    previous = None
+    for day in days:
+        run = run + 1 if previous == day - timedelta(days=1) else 1
+        longest = max(longest, run)
+        previous = day
+    if previous is None or previous < today - timedelta(days=1):
+        run = 0
+    return run, longest
+
+
+def _write_streaks(User, batch):
+    # The log may miss older, longer streaks, so the stored longest is kept
+    stored = dict(
+        User.objects.filter(pk__in=[user_id for user_id, *_ in batch]).values_list("pk", "longest_streak")
+    )
+    User.objects.bulk_update(
+        [
+            User(
+                pk=user_id,
+                streak=streak,
+                longest_streak=max(longest, stored.get(user_id, 0)),
+                last_activity=last_activity,
+            )
+            for user_id, streak, longest, last_activity in batch
+        ],
+        ["streak", "longest_streak", "last_activity"],
+    )
+    return len(batch)
+
+
+def rebuild_streaks(batch_size=1000, today=None):
+    """
+    Recomputes streak and last_activity of every user from the activity log,
+    raising longest_streak where the log shows a longer streak.
+
+    @param batch_size: Users written per UPDATE.
+    @return: The number of users with logged activity.
+    """
+    User = get_user_model()
+    today = today or timezone.localdate()
+
+    count = 0
+    with transaction.atomic():
+        User.objects.filter(activity__isnull=True).update(streak=0)
+        rows = DailyActivity.objects.order_by("user_id", "day").values_list("user_id", "day")
+        batch = []
+        for user_id, group in groupby(rows.iterator(), key=itemgetter(0)):
+            days = [day for _, day in group]
+            streak, longest = streaks_from_days(days, today)
+            batch.append((user_id, streak, longest, days[-1]))
+            if len(batch) >= batch_size:
+                count += _write_streaks(User, batch)
+                batch = []
+        count += _write_streaks(User, batch)
+        leaderboards.invalidate_on_commit("streak", "longest_streak")
+    return count
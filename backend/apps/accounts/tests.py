@@ -1,9 +1,22 @@
+import io
+import tempfile
+from datetime import timedelta
 from unittest import TestCase
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework.test import APITestCase
 from django.utils import timezone
 from rest_framework import status
+from auditlog.models import LogEntry
+from friendship.models import Block, Follow, Friend
+from . import graph, streaks, utils
+from .models import DailyActivity
 
 User = get_user_model()
 
@@ -83,4 +96,223 @@ class LoginSystemAPITestCase(APITestCase):
         self.url = reverse("delete_account") 
         self.client.login(username="django_lover6969", password="django_be_like")
         response = self.client.delete(self.url)
-        self.assertEqual(response.status_code, status.HTTP_200_OK)
\ No newline at end of file
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class DefaultAvatarTests(APITestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings = override_settings(MEDIA_ROOT=media.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        utils._stored.clear()
+
+    def same_avatar_usernames(self):
+        # Two usernames whose avatars share the initial and colour
+        seen = {}
+        for i in range(10000):
+            username = f"a{i}"
+            key = utils.avatar_key(username)
+            if key in seen:
+                return seen[key], username
+            seen[key] = username
+
+    @override_settings(DEFAULT_AVATARS_IN_BACKGROUND=False)
+    def test_shared_avatar(self):
+        first, second = self.same_avatar_usernames()
+        a = User.objects.create_user(username=first, password="pass")
+        b = User.objects.create_user(username=second, password="pass")
+        self.assertEqual(a.profile_pic.name, b.profile_pic.name)
+        self.assertTrue(default_storage.exists(a.profile_pic.name))
+        self.assertEqual(len(default_storage.listdir(utils.AVATAR_DIR)[1]), 1)
+
+    def test_generated_in_background(self):
+        user = User.objects.create_user(username="background", password="pass")
+        utils.avatar_worker.join()
+        self.assertEqual(user.profile_pic.name, utils.avatar_name(*utils.avatar_key("background")))
+        self.assertTrue(default_storage.exists(user.profile_pic.name))
+
+    @override_settings(DEFAULT_AVATARS_IN_BACKGROUND=False)
+    def test_store_missing(self):
+        user = User.objects.create_user(username="missing", password="pass")
+        default_storage.delete(user.profile_pic.name)
+        utils._stored.clear()
+        call_command("store_default_avatars", stdout=io.StringIO())
+        self.assertTrue(default_storage.exists(user.profile_pic.name))
+
+
+class StreakTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="streaker", password="pass")
+        self.today = timezone.localdate()
+
+    def act(self, days_ago=0):
+        user = User.objects.get(pk=self.user.pk)
+        return streaks.record_activity(user, today=self.today - timedelta(days=days_ago))
+
+    def columns(self):
+        user = User.objects.get(pk=self.user.pk)
+        return user.streak, user.longest_streak, user.last_activity
+
+    def test_consecutive_days(self):
+        for days_ago in (3, 2, 1):
+            self.assertTrue(self.act(days_ago))
+        self.assertEqual(self.columns(), (3, 3, self.today - timedelta(days=1)))
+
+        # A missed day restarts it, keeping the longest
+        self.assertTrue(streaks.record_activity(self.user, today=self.today + timedelta(days=1)))
+        self.assertEqual(self.columns(), (1, 3, self.today + timedelta(days=1)))
+        self.assertEqual(self.user.streak, 1)
+        self.assertEqual(DailyActivity.objects.filter(user=self.user).count(), 4)
+
+    def test_one_write_per_day(self):
+        LogEntry.objects.all().delete()
+        with CaptureQueriesContext(connection) as first:
+            self.assertTrue(self.act())
+        self.assertEqual(
+            [q["sql"].split()[0] for q in first if q["sql"].split()[0] in ("UPDATE", "INSERT")],
+            ["UPDATE", "INSERT"],
+        )
+        # Later actions match no row, or send nothing once the user shows today
+        self.assertFalse(streaks.record_activity(self.user, today=self.today))
+        with CaptureQueriesContext(connection) as later:
+            self.assertFalse(streaks.record_activity(self.user, today=self.today))
+        self.assertEqual(len(later), 0)
+        self.assertEqual(self.columns(), (1, 1, self.today))
+        self.assertFalse(LogEntry.objects.exists())
+
+    def test_broken_streaks(self):
+        broken = User.objects.create_user(username="broken", password="pass")
+        User.objects.filter(pk=broken.pk).update(streak=5, longest_streak=5, last_activity=self.today - timedelta(days=2))
+        self.act(1)
+        self.assertEqual(User.objects.get(pk=broken.pk).current_streak, 0)
+        self.assertEqual(User.objects.get(pk=self.user.pk).current_streak, 1)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(streaks.reset_broken_streaks(today=self.today), 1)
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(User.objects.get(pk=broken.pk).streak, 0)
+        self.assertEqual(self.columns()[0], 1)
+
+    def test_rebuild(self):
+        for days_ago in (9, 8, 7, 3, 1, 0):
+            self.act(days_ago)
+        expected = self.columns()
+        self.assertEqual(expected, (2, 3, self.today))
+        User.objects.update(streak=0, longest_streak=0, last_activity=None)
+        call_command("reset_streaks", "--rebuild", stdout=io.StringIO())
+        self.assertEqual(self.columns(), expected)
+
+    def test_rebuild_keeps_older_longest_streak(self):
+        # Best streak from before the log, and one user with no log at all
+        self.act(1)
+        User.objects.filter(pk=self.user.pk).update(longest_streak=10)
+        idle = User.objects.create_user(username="idle", password="pass")
+        User.objects.filter(pk=idle.pk).update(streak=4, longest_streak=7, last_activity=self.today - timedelta(days=5))
+
+        self.assertEqual(streaks.rebuild_streaks(today=self.today), 1)
+        self.assertEqual(self.columns(), (1, 10, self.today - timedelta(days=1)))
+        idle = User.objects.get(pk=idle.pk)
+        self.assertEqual((idle.streak, idle.longest_streak, idle.last_activity), (0, 7, self.today - timedelta(days=5)))
+
+
+class FriendsGraphTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.me = User.objects.create_user(username="me", password="pass")
+        self.others = {
+            name: User.objects.create_user(username=f"other_{name}", password="pass")
+            for name in ("friend", "followed", "blocked", "asked", "asking", "stranger")
+        }
+        Friend.objects.add_friend(self.others["friend"], self.me).accept()
+        Follow.objects.add_follower(self.me, self.others["followed"])
+        Block.objects.add_block(self.me, self.others["blocked"])
+        self.sent = Friend.objects.add_friend(self.me, self.others["asked"])
+        self.received = Friend.objects.add_friend(self.others["asking"], self.me)
+        self.client.force_authenticate(self.me)
+
+    def test_relationships(self):
+        found = graph.relationships(self.me, self.others.values())
+        self.assertEqual({name for name, user in self.others.items() if found[user.pk]["is_friend"]}, {"friend"})
+        self.assertTrue(found[self.others["followed"].pk]["is_following"])
+        self.assertTrue(found[self.others["blocked"].pk]["is_blocking"])
+        self.assertEqual(found[self.others["asked"].pk]["request_sent"], self.sent.pk)
+        self.assertEqual(found[self.others["asking"].pk]["request_received"], self.received.pk)
+        self.assertFalse(any(value for key, value in found[self.others["stranger"].pk].items() if key != "user_id"))
+
+        # The other side of each relation, and no query once cached
+        self.assertTrue(graph.relationships(self.others["followed"], [self.me])[self.me.pk]["is_followed_by"])
+        self.assertTrue(graph.relationships(self.others["blocked"], [self.me])[self.me.pk]["is_blocked_by"])
+        with self.assertNumQueries(0):
+            graph.relationships(self.me, [user.pk for user in self.others.values()])
+
+    def test_invalidated_on_change(self):
+        friend, asking = self.others["friend"], self.others["asking"]
+        graph.adjacency(self.me)
+        self.received.accept()
+        Friend.objects.remove_friend(self.me, friend)
+        Follow.objects.remove_follower(self.me, self.others["followed"])
+        found = graph.relationships(self.me, [friend, asking, self.others["followed"]])
+        self.assertFalse(found[friend.pk]["is_friend"])
+        self.assertTrue(found[asking.pk]["is_friend"])
+        self.assertIsNone(found[asking.pk]["request_received"])
+        self.assertFalse(found[self.others["followed"].pk]["is_following"])
+        self.assertEqual(graph.friend_ids(asking), {self.me.pk})
+
+        # Deleting a user drops them from the others' adjacency
+        asking.delete()
+        self.assertEqual(graph.friend_ids(self.me), set())
+
+    def test_relationships_endpoint(self):
+        ids = [self.others["asking"].pk, self.others["friend"].pk, 0]
+        response = self.client.get(f"/accounts/relationships/?user_ids={','.join(map(str, ids))}")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row["user_id"] for row in response.data], ids)
+        self.assertEqual(response.data[0]["request_received"], self.received.pk)
+        self.assertTrue(response.data[1]["is_friend"])
+
+        self.assertEqual(self.client.get("/accounts/relationships/?user_ids=a").status_code, 400)
+        self.assertEqual(self.client.get("/accounts/relationships/").status_code, 400)
+
+    def test_search_queries_do_not_grow(self):
+        def search():
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get("/accounts/search/?user_prefix=other")
+            self.assertEqual(response.status_code, 200)
+            return response.data, len(queries)
+
+        results, few = search()
+        self.assertEqual(len(results), 6)
+        self.assertTrue(next(r for r in results if r["username"] == "other_friend")["relationship"]["is_friend"])
+        for i in range(10):
+            Friend.objects.add_friend(User.objects.create_user(username=f"other_new{i}", password="pass"), self.me)
+        cache.clear()
+        results, many = search()
+        self.assertEqual(len(results), 16)
+        self.assertEqual(many, few)
+
+    def test_lists(self):
+        for i in range(5):
+            Friend.objects.add_friend(User.objects.create_user(username=f"asker{i}", password="pass"), self.me)
+        graph.adjacency(self.me)
+        with self.assertNumQueries(1):
+            response = self.client.get("/accounts/friend/requests/")
+        self.assertEqual(
+            {r["from_user"]["username"] for r in response.data["requests"]},
+            {"other_asking", *(f"asker{i}" for i in range(5))},
+        )
+        with self.assertNumQueries(1):
+            response = self.client.get("/accounts/friend/requests/sent/")
+        self.assertEqual([r["User"]["username"] for r in response.data["pending_users"]], ["other_asked"])
+        with self.assertNumQueries(2):
+            response = self.client.get("/accounts/friends/me/")
+        self.assertEqual([u["username"] for u in response.data["friends"]], ["other_friend"])
+
+        # An empty list costs no query past the user
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get("/accounts/followers/me/").status_code, 204)
+
+        response = self.client.get(f"/accounts/another_user_info/{self.others['asking'].username}")
+        self.assertEqual(response.data["relationship"]["request_received"], self.received.pk)
@@ -116,4 +116,5 @@ urlpatterns = [
     ),
     path('friend/remove/<slug:username>/', remove_friend, name='remove_friend'),
     path("search/", search_users, name="search_users"),
+    path("relationships/", relationships, name="relationships"),
 ]
\ No newline at end of file
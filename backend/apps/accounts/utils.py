@@ -1,51 +1,158 @@
 from PIL import Image, ImageDraw, ImageFont
+import io
 import os
 import hashlib
+import logging
+import queue
+import threading
+from functools import cache
 from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
 
-def generate_avatar(username, size=400, font_size=200):
+logger = logging.getLogger(__name__)
+
+AVATAR_DIR = "default_avatars"
+
+# Default avatars are shared: every user with the same initial and colour gets
+# the same file, named after the pair. The name is known up front, so
+# CustomUser.save() assigns it straight away and only the rendering and upload
+# happen in the background, once per pair.
+
+
+@cache
+def _font(font_size):
+    # Loaded once per size instead of on every avatar
+    try:
+        font_path = os.path.join(settings.BASE_DIR, "static", "fonts", "arial.ttf")
+        return ImageFont.truetype(font_path, font_size)
+    except Exception:
+        return ImageFont.load_default()
+
+
+def avatar_key(username):
     """
-    Generate an avatar with:
-    - First letter of username
-    - Color based on username hash
-    - Perfect centering using anchor 'mm'
+    The (initial, colour) of a username's default avatar.
+
+    The colour comes from the username hash, with each channel rounded to one
+    of 8 levels, so there are a limited number of distinct avatars to share.
     """
     # Fallback username
-    text = (username[0] if username else "?").upper()
+    initial = (username[0] if username else "?").upper()
 
-    # Generate a consistent color from username
+    # Use the first 6 hex digits of the hash as RGB
     hash_digest = hashlib.md5(username.encode("utf-8")).hexdigest()
-    # Use first 6 hex digits as RGB
-    r = int(hash_digest[0:2], 16)
-    g = int(hash_digest[2:4], 16)
-    b = int(hash_digest[4:6], 16)
-    bg_color = (r, g, b)
-
-    # Create image
-    img = Image.new("RGB", (size, size), color=bg_color)
-    draw = ImageDraw.Draw(img)
+    r, g, b = (int(hash_digest[i:i + 2], 16) & 0xE0 | 0x10 for i in (0, 2, 4))
+    return initial, f"{r:02x}{g:02x}{b:02x}"
+
+
+def avatar_name(initial, colour):
+    """Storage name of the avatar for (initial, colour)."""
+    # Code points, as initials can be any character
+    code = "-".join(f"{ord(char):x}" for char in initial)
+    return f"{AVATAR_DIR}/{code}-{colour}.png"
 
-    # Load font
+
+def parse_avatar_name(name):
+    """The (initial, colour) of a shared avatar name, or None for other names."""
+    directory, _, filename = name.rpartition("/")
+    stem, _, extension = filename.rpartition(".")
+    *codes, colour = stem.split("-")
+    if directory != AVATAR_DIR or extension != "png" or not codes or len(colour) != 6:
+        return None
     try:
-        font_path = os.path.join(settings.BASE_DIR, "static", "fonts", "arial.ttf")
-        font = ImageFont.truetype(font_path, font_size)
-    except Exception:
-        font = ImageFont.load_default()
-
-    # Draw text centered with anchor 'mm'
-    draw.text(
-        (size/2, size/2),
-        text,
-        fill="white",
-        font=font,
-        anchor="mm"
-    )
-
-    # Save to media
-    rel_dir = "default_avatars"
-    filename = f"{username}.png"
-    file_path = os.path.join(settings.MEDIA_ROOT, rel_dir, filename)
-    os.makedirs(os.path.dirname(file_path), exist_ok=True)
-    img.save(file_path)
-
-    return os.path.join(rel_dir, filename)
\ No newline at end of file
+        return "".join(chr(int(code, 16)) for code in codes), colour
+    except ValueError:
+        return None
+
+
+def render_avatar(initial, colour, size=400, font_size=200):
+    """
+    PNG bytes of an avatar with:
+    - The initial in white
+    - The colour as background
+    - Perfect centering using anchor 'mm'
+    """
+    img = Image.new("RGB", (size, size), color=f"#{colour}")
+    draw = ImageDraw.Draw(img)
+    draw.text((size / 2, size / 2), initial, fill="white", font=_font(font_size), anchor="mm")
+
+    buffer = io.BytesIO()
+    img.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+# Names known to be in storage, so they aren't checked again
+_stored = set()
+
+
+def store_avatar(initial, colour):
+    """Renders and saves the avatar for (initial, colour) unless it exists already."""
+    name = avatar_name(initial, colour)
+    if name in _stored:
+        return name
+    if not default_storage.exists(name):
+        saved = default_storage.save(name, ContentFile(render_avatar(initial, colour)))
+        if saved != name:
+            # Another process stored it meanwhile, and storage picked a free name
+            default_storage.delete(saved)
+    _stored.add(name)
+    return name
+
+
+class _AvatarWorker:
+    """Stores avatars on a background thread, each pending pair once."""
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def submit(self, key):
+        with self._lock:
+            if key in self._pending:
+                return
+            self._pending.add(key)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="avatar-worker", daemon=True
+                )
+                self._thread.start()
+        self._queue.put(key)
+
+    def _run(self):
+        while True:
+            key = self._queue.get()
+            try:
+                store_avatar(*key)
+            except Exception:
+                logger.exception("Could not store default avatar %s", avatar_name(*key))
+            finally:
+                with self._lock:
+                    self._pending.discard(key)
+                self._queue.task_done()
+
+    def join(self):
+        """Waits until every submitted avatar has been handled."""
+        self._queue.join()
+
+
+avatar_worker = _AvatarWorker()
+
+
+def generate_avatar(username):
+    """
+    Name of the default avatar for a username, to assign to profile_pic.
+
+    The file is rendered and stored in the background unless it exists already
+    (or inline when settings.DEFAULT_AVATARS_IN_BACKGROUND is False).
+    """
+    key = avatar_key(username)
+    name = avatar_name(*key)
+    if name not in _stored:
+        if getattr(settings, "DEFAULT_AVATARS_IN_BACKGROUND", True):
+            avatar_worker.submit(key)
+        else:
+            store_avatar(*key)
+    return name
@@ -14,12 +14,16 @@ from drf_spectacular.utils import (
 )
 from rest_framework_simplejwt.tokens import RefreshToken
 
+from apps.website import progress
 from apps.website.models import Course, VisibilityLevel
 from friendship.models import Block, Friend, FriendshipRequest, cache
 from apps.website.serializers import CourseSerializer
+from . import graph
 from .serializer import (
     FriendshipRequestSerializer,
     LoginSerializer,
+    RelationshipSerializer,
+    UserRelationshipSerializer,
     UserSerializer,
     VerifyLoginMFARequest,
 )
@@ -34,6 +38,8 @@ from io import BytesIO
 
 User = get_user_model()
 
+MAX_RELATIONSHIPS = 100
+
 
 # -------------------------------
 # User-related API calls
@@ -58,14 +64,14 @@ def all_users(request):
 @extend_schema(
     tags=["Users"],
     summary="Search users",
-    description="Returns a list of users matching the query.",
+    description="Returns a list of users matching the query, each with how the logged in user relates to them.",
     parameters=[
         OpenApiParameter(
             name="user_prefix", description="The search term", required=False, type=str
         ),
     ],
     responses={
-        200: UserSerializer(
+        200: UserRelationshipSerializer(
             many=True
         ),  # Document that it returns the standard User object
     },
@@ -80,11 +86,58 @@ def search_users(request):
     else:
         users = User.objects.none()
 
-    serializer = UserSerializer(users, many=True, context={"request": request})
+    users = list(users)
+    serializer = UserRelationshipSerializer(
+        users,
+        many=True,
+        context={
+            "request": request,
+            "relationships": graph.relationships(request.user, users),
+        },
+    )
 
     return Response(serializer.data, status=status.HTTP_200_OK)
 
 
+@extend_schema(
+    tags=["Friends"],
+    summary="Relationships with users",
+    description="How the logged in user relates to each of the given users (friends, follows, blocks and pending friend requests), in one call.",
+    parameters=[
+        OpenApiParameter(
+            name="user_ids",
+            description="Comma-separated ids of the users, at most 100",
+            required=True,
+            type=str,
+        ),
+    ],
+    responses={
+        200: RelationshipSerializer(many=True),
+        400: OpenApiResponse(description="Missing, malformed or too many ids."),
+    },
+)
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def relationships(request):
+    try:
+        user_ids = list(
+            dict.fromkeys(int(pk) for pk in request.query_params.get("user_ids", "").split(",") if pk)
+        )
+    except ValueError:
+        return Response({"detail": "user_ids must be integers."}, status=status.HTTP_400_BAD_REQUEST)
+    if not 0 < len(user_ids) <= MAX_RELATIONSHIPS:
+        return Response(
+            {"detail": f"Give between 1 and {MAX_RELATIONSHIPS} user_ids."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    found = graph.relationships(request.user, user_ids)
+    return Response(
+        RelationshipSerializer([found[pk] for pk in user_ids], many=True).data,
+        status=status.HTTP_200_OK,
+    )
+
+
 @extend_schema(
     tags=["Users"],
     summary="Create a new user.",
@@ -282,12 +335,7 @@ def get_user_info(request):
     user = request.user
 
     courses_created_int = Course.objects.filter(creator=user).count()
-    courses_completed_int = (
-        Course.objects.filter_by_user_access(user)
-        .user_progress_percent(user)
-        .filter(progress_percent=100)
-        .count()
-    )
+    courses_completed_int = progress.completed_courses(user)
 
     serializer = UserSerializer(user)
 
@@ -318,6 +366,7 @@ def get_user_info(request):
                 "longest_streak": serializers.IntegerField(),
                 "courses_created": serializers.IntegerField(),
                 "courses_completed": serializers.IntegerField(),
+                "relationship": RelationshipSerializer(),
             },
         ),
         404: OpenApiResponse(description="Could not get user."),
@@ -329,12 +378,7 @@ def get_another_user_info(request, user_username):
     user = get_object_or_404(User, username=user_username)
 
     courses_created_int = Course.objects.filter(creator=user).count()
-    courses_completed_int = (
-        Course.objects.filter_by_user_access(user)
-        .user_progress_percent(user)
-        .filter(progress_percent=100)
-        .count()
-    )
+    courses_completed_int = progress.completed_courses(user)
 
     serializer = UserSerializer(user)
 
@@ -343,6 +387,7 @@ def get_another_user_info(request, user_username):
             **serializer.data,
             "courses_created": courses_created_int,
             "courses_completed": courses_completed_int,
+            "relationship": graph.relationships(request.user, [user])[user.pk],
         },
         status=status.HTTP_200_OK,
     )
@@ -440,7 +485,7 @@ def get_courses_created(request, user_username):
 @api_view(["GET"])
 def view_friends(request, username):
     user = get_object_or_404(User, username=username)
-    friends = Friend.objects.friends(user)
+    friends = graph.friends(user)
     if not friends:
         return Response({"message": "User has no friends"}, status=204)
     return Response(
@@ -497,9 +542,7 @@ def friendship_add_friend(request, to_username):
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
 def friendship_request_list(request):
-    requests = FriendshipRequest.objects.filter(
-        to_user=request.user, rejected__isnull=True
-    )
+    requests = graph.requests_received(request.user)
     if not requests:
         return Response(status=204)
     return Response(
@@ -593,10 +636,12 @@ def friendship_cancel(request, friendship_request_id):
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
 def friendship_request_list_rejected(request):
-    requests = FriendshipRequest.objects.filter(rejected__isnull=False)
+    requests = FriendshipRequest.objects.filter(rejected__isnull=False).select_related(
+        "from_user", "to_user"
+    )
 
     return Response(
-        {"rejected_requests": FriendshipRequestSerializer(requests, many=True)},
+        {"rejected_requests": FriendshipRequestSerializer(requests, many=True).data},
         status=200,
     )
 
@@ -614,9 +659,12 @@ def friendship_request_list_rejected(request):
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
 def friendship_requests_detail(request, friendship_request_id):
-    r = get_object_or_404(FriendshipRequest, id=friendship_request_id)
+    r = get_object_or_404(
+        FriendshipRequest.objects.select_related("from_user", "to_user"),
+        id=friendship_request_id,
+    )
 
-    return Response(FriendshipRequestSerializer(r), status=200)
+    return Response(FriendshipRequestSerializer(r).data, status=200)
 
 
 # ================= FOLLOW =================
@@ -636,7 +684,7 @@ def friendship_requests_detail(request, friendship_request_id):
 @api_view(["GET"])
 def followers(request, username):
     user = get_object_or_404(User, username=username)
-    data = Follow.objects.followers(user)
+    data = graph.followers(user)
     if not data:
         return Response({"message": "User has no followers."}, status=204)
     return Response({"followers": UserSerializer(data, many=True).data}, status=200)
@@ -656,7 +704,7 @@ def followers(request, username):
 @api_view(["GET"])
 def following(request, username):
     user = get_object_or_404(User, username=username)
-    data = Follow.objects.following(user)
+    data = graph.following(user)
     if not data:
         return Response({"message": "User has no one following."}, status=204)
     return Response({"following": UserSerializer(data, many=True).data}, status=200)
@@ -721,7 +769,8 @@ def follower_remove(request, followee_username):
 @api_view(["GET"])
 def blocking(request, username):
     user = get_object_or_404(User, username=username)
-    data = Block.objects.blocked(user)
+    # As django-friendship's own view: the users blocking the given one
+    data = graph.blockers(user)
     if not data:
         return Response({"message": "None blocking."}, status=204)
     return Response({"blocked": UserSerializer(data, many=True).data}, status=200)
@@ -741,7 +790,7 @@ def blocking(request, username):
 @api_view(["GET"])
 def blockers(request, username):
     user = get_object_or_404(User, username=username)
-    data = Block.objects.blocking(user)
+    data = graph.blocked(user)
     if not data:
         return Response({"message": "No blockers."}, status=204)
     return Response({"blockers": UserSerializer(data, many=True).data}, status=200)
@@ -817,9 +866,7 @@ def block_remove(request, blocked_username):
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
 def pending_friend_requests(request):
-    requests = FriendshipRequest.objects.filter(
-        from_user=request.user, rejected__isnull=True
-    )
+    requests = graph.requests_sent(request.user)
 
     if not requests:
         return Response({"pending_users": []}, status=200)
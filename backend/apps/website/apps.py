@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class WebsiteConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.website'
+
+    def ready(self):
+        from . import leaderboards, signals  # noqa: F401
+
+        leaderboards.check_cache()
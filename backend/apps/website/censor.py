@@ -0,0 +1,242 @@
+import threading
+
+# Profanity censoring with better_profanity's exact output, without its cost.
+#
+# better_profanity splits the text into words (and runs of up to
+# MAX_NUMBER_COMBINATIONS following words, with and without their separators)
+# and checks each candidate with `candidate in CENSOR_WORDSET`: a linear scan
+# that compares the candidate against every word of the list and its leetspeak
+# variants, one VaryingString at a time. That scan is nearly all of the time
+# spent censoring.
+#
+# Censor keeps the same word splitting, line for line, but compiles the word
+# list once into a trie whose edges accept every variant of a character
+# ("a" also matches "@", "*" and "4", ...). As variants overlap, the trie is
+# walked as a DFA whose states (sets of trie nodes) are built on first use and
+# cached, so each candidate is matched in one pass over its characters.
+
+REPLACEMENT_LENGTH = 4
+
+
+class _Automaton:
+    def __init__(self, words, char_map):
+        # Trie over the words: per node, {character: child}; node 0 is the root
+        children = [{}]
+        terminal = [False]
+        for word in words:
+            node = 0
+            for char in word:
+                child = children[node].get(char)
+                if child is None:
+                    child = len(children)
+                    children[node][char] = child
+                    children.append({})
+                    terminal.append(False)
+                node = child
+            terminal[node] = True
+
+        # Same edges keyed by every input character they accept
+        self._edges = []
+        for node_children in children:
+            edges = {}
+            for char, child in node_children.items():
+                for variant in char_map.get(char, (char,)):
+                    edges.setdefault(variant, []).append(child)
+            self._edges.append(edges)
+        self._terminal = terminal
+
+        # DFA over sets of trie nodes, filled in lazily
+        self._lock = threading.Lock()
+        self._states = [frozenset([0])]
+        self._state_ids = {self._states[0]: 0}
+        self._accepting = [terminal[0]]
+        self._transitions = [{}]
+
+    def _step(self, state, char):
+        with self._lock:
+            nodes = frozenset(
+                child
+                for node in self._states[state]
+                for child in self._edges[node].get(char, ())
+            )
+            if not nodes:
+                target = None
+            elif nodes in self._state_ids:
+                target = self._state_ids[nodes]
+            else:
+                # Complete the new state before anything can step into it
+                target = len(self._states)
+                self._states.append(nodes)
+                self._accepting.append(any(self._terminal[node] for node in nodes))
+                self._transitions.append({})
+                self._state_ids[nodes] = target
+            self._transitions[state][char] = target
+            return target
+
+    def __contains__(self, text):
+        """Whether `text` (already lowercased) is a listed word or a variant of one."""
+        state = 0
+        transitions = self._transitions
+        for char in text:
+            try:
+                state = transitions[state][char]
+            except KeyError:
+                state = self._step(state, char)
+            if state is None:
+                return False
+        return self._accepting[state]
+
+
+class Censor:
+    """
+    Drop-in for better_profanity.Profanity.censor(): same words, same variants,
+    same output.
+    """
+
+    def __init__(self, profanity=None):
+        if profanity is None:
+            # Imported here as importing better_profanity loads its word list
+            from better_profanity import profanity
+        self.allowed_characters = profanity.ALLOWED_CHARACTERS
+        self.max_number_combinations = profanity.MAX_NUMBER_COMBINATIONS
+        self.words = _Automaton(
+            [str(word) for word in profanity.CENSOR_WORDSET], profanity.CHARS_MAPPING
+        )
+
+    def censor(self, text, censor_char="*"):
+        """Replace the swear words in the text with `censor_char`."""
+        if not isinstance(text, str):
+            text = str(text)
+        if not isinstance(censor_char, str):
+            censor_char = str(censor_char)
+        return self._hide_swear_words(text, censor_char * REPLACEMENT_LENGTH)
+
+    # --- better_profanity's word splitting, with the automaton for lookups ---
+
+    def _hide_swear_words(self, text, replacement):
+        censored_text = ""
+        cur_word = ""
+        skip_index = -1
+        next_words_indices = []
+        allowed_characters = self.allowed_characters
+        start_idx_of_next_word = _start_of_next_word(text, 0, allowed_characters)
+
+        # If there are no words in the text, return the raw text without parsing
+        if start_idx_of_next_word >= len(text) - 1:
+            return text
+
+        # Left strip the text, to avoid inaccurate parsing
+        if start_idx_of_next_word > 0:
+            censored_text = text[:start_idx_of_next_word]
+            text = text[start_idx_of_next_word:]
+
+        for index, char in enumerate(text):
+            if index < skip_index:
+                continue
+            if char in allowed_characters:
+                cur_word += char
+                continue
+
+            # Skip continuous non-allowed characters
+            if cur_word.strip() == "":
+                censored_text += char
+                cur_word = ""
+                continue
+
+            # Check whether the next words combined with the current one form
+            # a swear word
+            next_words_indices = self._update_next_words_indices(
+                text, next_words_indices, index
+            )
+            contains_swear_word, end_index = self._next_words_form_swear_word(
+                cur_word, next_words_indices
+            )
+            if contains_swear_word:
+                cur_word = replacement
+                skip_index = end_index
+                char = ""
+                next_words_indices = []
+
+            if cur_word.lower() in self.words:
+                cur_word = replacement
+
+            censored_text += cur_word + char
+            cur_word = ""
+
+        # Final check
+        if cur_word != "" and skip_index < len(text) - 1:
+            if cur_word.lower() in self.words:
+                cur_word = replacement
+            censored_text += cur_word
+        return censored_text
+
+    def _update_next_words_indices(self, text, words_indices, start_idx):
+        if not words_indices:
+            words_indices = _next_words(
+                text, start_idx, self.allowed_characters, self.max_number_combinations
+            )
+        else:
+            del words_indices[:2]
+            if words_indices and words_indices[-1][0] != "":
+                words_indices += _next_words(
+                    text, words_indices[-1][1], self.allowed_characters, 1
+                )
+        return words_indices
+
+    def _next_words_form_swear_word(self, cur_word, words_indices):
+        full_word = cur_word.lower()
+        full_word_with_separators = cur_word.lower()
+
+        # Check both words in the pairs
+        for index in range(0, len(words_indices), 2):
+            single_word, end_index = words_indices[index]
+            word_with_separators, _ = words_indices[index + 1]
+            if single_word == "":
+                continue
+
+            full_word += single_word.lower()
+            full_word_with_separators += word_with_separators.lower()
+            if full_word in self.words or full_word_with_separators in self.words:
+                return True, end_index
+        return False, -1
+
+
+def _start_of_next_word(text, start_idx, allowed_characters):
+    for index in range(start_idx, len(text)):
+        if text[index] in allowed_characters:
+            return index
+    return len(text)
+
+
+def _next_word_and_end_index(text, start_idx, allowed_characters):
+    next_word = ""
+    index = start_idx
+    for index in range(start_idx, len(text)):
+        char = text[index]
+        if char in allowed_characters:
+            next_word += char
+            continue
+        break
+    return next_word, index
+
+
+def _next_words(text, start_idx, allowed_characters, num_of_next_words=1):
+    """
+    Pairs of the next words, alone and with the separators before them, with
+    their end indices. For example, "hand_job" gives "job" and "_job".
+    """
+    start_idx_of_next_word = _start_of_next_word(text, start_idx, allowed_characters)
+
+    if start_idx_of_next_word >= len(text) - 1:
+        return [("", start_idx_of_next_word), ("", start_idx_of_next_word)]
+
+    next_word, end_index = _next_word_and_end_index(
+        text, start_idx_of_next_word, allowed_characters
+    )
+    words = [
+        (next_word, end_index),
+        (text[start_idx:start_idx_of_next_word] + next_word, end_index),
+    ]
+    if num_of_next_words > 1:
+        words.extend(_next_words(text, end_index, allowed_characters, num_of_next_words - 1))
+    return words
@@ -0,0 +1,460 @@
+import bisect
+import logging
+import secrets
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.utils import timezone
+from .models import ContainerLevel, ContainerTaskCount, UserBadge, UserContainerProgress
+
+# Leaderboards of users by current streak, longest streak, completed courses
+# and badges.
+#
+# Each board is a SortedSet kept in the cache (settings.LEADERBOARD_CACHE, the
+# default cache unless set), standing in for a Redis sorted set: its members
+# are user ids ordered by score, highest first, ties by id. Users scoring 0
+# are left out. The members live in blocks of up to 2 * BLOCK_SIZE sorted
+# entries, listed with their first entry in one meta key, so a rank or a page
+# costs two or three cache reads and a binary search, and an update rewrites
+# one block. Every member's score is also kept in one of SCORE_BUCKETS dicts,
+# which is how an update finds the entry to move.
+#
+# The boards are maintained incrementally without adding queries to the
+# writes: a change (a badge awarded, a task completed, a streak extended)
+# only marks its user dirty once the transaction commits, and the next read
+# of the board re-scores the dirty users in one query. Changes that can move
+# many users at once (a course gaining a task, the nightly streak reset, bulk
+# loads) invalidate the board, which is then rebuilt from the database on its
+# next read. So is a board any of whose keys the cache evicted.
+#
+# Writers are serialized by a lock taken with cache.add(), so the cache must
+# be shared by every process and its add() atomic (Redis, Memcached or the
+# database cache; check_cache() refuses the others outside DEBUG). A reader
+# that can't get the lock serves the board as it is, or gives up with Busy
+# when there is nothing to serve; it never writes without the lock.
+
+BLOCK_SIZE = 512
+SCORE_BUCKETS = 16
+
+# How long a writer may hold a board, and how long others wait for it
+LOCK_TIMEOUT = 10
+LOCK_WAIT = 5
+
+
+logger = logging.getLogger(__name__)
+
+
+class Evicted(Exception):
+    """A key of the sorted set is missing from the cache."""
+
+
+class Busy(Exception):
+    """The lock of a sorted set could not be taken in time."""
+
+
+def leaderboard_cache():
+    return caches[getattr(settings, "LEADERBOARD_CACHE", "default")]
+
+
+def check_cache():
+    """Refuses a cache that the boards' lock can't rely on, outside DEBUG."""
+    if settings.DEBUG:
+        return
+    cache = leaderboard_cache()
+    if isinstance(cache, (LocMemCache, FileBasedCache)):
+        raise ImproperlyConfigured(
+            f"LEADERBOARD_CACHE uses {type(cache).__name__}, which is not shared by every "
+            "process or has no atomic add(); use Redis, Memcached or the database cache."
+        )
+
+
+class SortedSet:
+    """Integer members with integer scores, highest score first."""
+
+    def __init__(self, name, cache=None, block_size=BLOCK_SIZE):
+        self.prefix = f"leaderboard:{name}"
+        self.cache = cache or leaderboard_cache()
+        self.block_size = block_size
+
+    # --- Keys ---
+
+    @property
+    def meta_key(self):
+        return f"{self.prefix}:meta"
+
+    def _block_key(self, meta, block_id):
+        return f"{self.prefix}:{meta['generation']}:block:{block_id}"
+
+    def _bucket_key(self, meta, member):
+        return f"{self.prefix}:{meta['generation']}:scores:{member % SCORE_BUCKETS}"
+
+    @contextmanager
+    def lock(self):
+        """
+        Serializes the writers of this set, across processes given a shared
+        cache with an atomic add() (see check_cache).
+
+        @raise Busy: After LOCK_WAIT seconds without the lock.
+        """
+        key, token = f"{self.prefix}:lock", secrets.token_hex(8)
+        deadline = time.monotonic() + LOCK_WAIT
+        while not self.cache.add(key, token, LOCK_TIMEOUT):
+            if time.monotonic() > deadline:
+                raise Busy(key)
+            time.sleep(0.005)
+        try:
+            yield
+        finally:
+            if self.cache.get(key) == token:
+                self.cache.delete(key)
+
+    # --- Reading ---
+
+    def meta(self):
+        return self.cache.get(self.meta_key)
+
+    def _get(self, key):
+        value = self.cache.get(key)
+        if value is None:
+            raise Evicted(key)
+        return value
+
+    def _require_meta(self):
+        meta = self.meta()
+        if meta is None:
+            raise Evicted(self.meta_key)
+        return meta
+
+    def _find(self, meta, entry):
+        """Index of the block an entry belongs in."""
+        firsts = [first for first, _, _ in meta["blocks"]]
+        return max(bisect.bisect_right(firsts, entry) - 1, 0)
+
+    def __len__(self):
+        return sum(size for _, _, size in self._require_meta()["blocks"])
+
+    def scores(self, members):
+        """{member: score} of the given members; 0 for non-members."""
+        meta = self._require_meta()
+        keys = {member: self._bucket_key(meta, member) for member in members}
+        buckets = self.cache.get_many(set(keys.values()))
+        if len(buckets) < len(set(keys.values())):
+            raise Evicted(self.prefix)
+        return {member: buckets[key].get(member, 0) for member, key in keys.items()}
+
+    def rank(self, member):
+        """(1-based rank, score) of a member, or (None, 0)."""
+        meta = self._require_meta()
+        score = self._get(self._bucket_key(meta, member)).get(member)
+        if score is None:
+            return None, 0
+        entry = (-score, member)
+        i = self._find(meta, entry)
+        block = self._get(self._block_key(meta, meta["blocks"][i][1]))
+        before = sum(size for _, _, size in meta["blocks"][:i])
+        return before + bisect.bisect_left(block, entry) + 1, score
+
+    def range(self, offset, limit):
+        """[(rank, member, score)] of the members ranked offset + 1 onwards."""
+        meta = self._require_meta()
+        wanted, start = [], 0
+        for _, block_id, size in meta["blocks"]:
+            if start + size > offset and start < offset + limit:
+                wanted.append((start, self._block_key(meta, block_id)))
+            start += size
+        blocks = self.cache.get_many([key for _, key in wanted])
+        if len(blocks) < len(wanted):
+            raise Evicted(self.prefix)
+
+        results = []
+        for start, key in wanted:
+            for i, (score, member) in enumerate(blocks[key], start=start):
+                if offset <= i < offset + limit:
+                    results.append((i + 1, member, -score))
+        return results
+
+    # --- Writing (under lock()) ---
+
+    def replace(self, scores):
+        """Replaces every member and score at once."""
+        old = self.meta()
+        meta = {"generation": time.time_ns(), "blocks": [], "next": 0}
+        entries = sorted((-score, member) for member, score in scores.items() if score > 0)
+        values = {}
+        for start in range(0, len(entries), self.block_size):
+            block = entries[start : start + self.block_size]
+            values[self._block_key(meta, meta["next"])] = block
+            meta["blocks"].append([block[0], meta["next"], len(block)])
+            meta["next"] += 1
+        buckets = {self._bucket_key(meta, i): {} for i in range(SCORE_BUCKETS)}
+        for score, member in entries:
+            buckets[self._bucket_key(meta, member)][member] = -score
+        values.update(buckets)
+        self.cache.set_many(values, timeout=None)
+        self.cache.set(self.meta_key, meta, timeout=None)
+        if old is not None:
+            self._delete_generation(old)
+
+    def _delete_generation(self, meta):
+        self.cache.delete_many(
+            [self._block_key(meta, block_id) for _, block_id, _ in meta["blocks"]]
+            + [self._bucket_key(meta, i) for i in range(SCORE_BUCKETS)]
+        )
+
+    def clear(self):
+        meta = self.meta()
+        self.cache.delete(self.meta_key)
+        if meta is not None:
+            self._delete_generation(meta)
+
+    def update(self, scores):
+        """Sets the score of each member; a score of 0 or less removes it."""
+        meta = self._require_meta()
+        bucket_keys = {self._bucket_key(meta, member) for member in scores}
+        buckets = self.cache.get_many(bucket_keys)
+        if len(buckets) < len(bucket_keys):
+            raise Evicted(self.prefix)
+        blocks, changed = {}, set()
+
+        def block(i):
+            block_id = meta["blocks"][i][1]
+            if block_id not in blocks:
+                blocks[block_id] = self._get(self._block_key(meta, block_id))
+            return blocks[block_id]
+
+        for member, score in scores.items():
+            bucket_key = self._bucket_key(meta, member)
+            old = buckets[bucket_key].get(member)
+            if old == score or (old is None and score <= 0):
+                continue
+            if old is not None:
+                self._remove(meta, block, (-old, member))
+                del buckets[bucket_key][member]
+            if score > 0:
+                self._insert(meta, block, blocks, (-score, member))
+                buckets[bucket_key][member] = score
+            changed.add(bucket_key)
+
+        live = {block_id for _, block_id, _ in meta["blocks"]}
+        values = {key: buckets[key] for key in changed}
+        values.update(
+            {self._block_key(meta, block_id): value for block_id, value in blocks.items() if block_id in live}
+        )
+        self.cache.set_many(values, timeout=None)
+        self.cache.set(self.meta_key, meta, timeout=None)
+        self.cache.delete_many(
+            [self._block_key(meta, block_id) for block_id in blocks if block_id not in live]
+        )
+
+    def _remove(self, meta, block, entry):
+        i = self._find(meta, entry)
+        entries = block(i)
+        j = bisect.bisect_left(entries, entry)
+        if j == len(entries) or entries[j] != entry:
+            raise Evicted(self.prefix)  # Out of step with its score buckets
+        del entries[j]
+        if entries:
+            meta["blocks"][i][0] = entries[0]
+            meta["blocks"][i][2] = len(entries)
+        else:
+            del meta["blocks"][i]
+
+    def _insert(self, meta, block, blocks, entry):
+        if not meta["blocks"]:
+            blocks[meta["next"]] = [entry]
+            meta["blocks"].append([entry, meta["next"], 1])
+            meta["next"] += 1
+            return
+        i = self._find(meta, entry)
+        entries = block(i)
+        bisect.insort(entries, entry)
+        meta["blocks"][i][0] = entries[0]
+        meta["blocks"][i][2] = len(entries)
+        if len(entries) > 2 * self.block_size:
+            # Split in two, the second half going to a new block
+            half = entries[self.block_size :]
+            del entries[self.block_size :]
+            blocks[meta["next"]] = half
+            meta["blocks"][i][2] = len(entries)
+            meta["blocks"].insert(i + 1, [half[0], meta["next"], len(half)])
+            meta["next"] += 1
+
+
+# --- Scores, from the database ---
+
+def _filtered(queryset, user_ids, field="user_id"):
+    return queryset if user_ids is None else queryset.filter(**{f"{field}__in": user_ids})
+
+
+def streak_scores(user_ids=None):
+    # Streaks broken since the last reset (see accounts/streaks.py) count as 0
+    yesterday = timezone.localdate() - timedelta(days=1)
+    users = get_user_model().objects.filter(streak__gt=0, last_activity__gte=yesterday)
+    return dict(_filtered(users, user_ids, "id").values_list("id", "streak"))
+
+
+def longest_streak_scores(user_ids=None):
+    users = get_user_model().objects.filter(longest_streak__gt=0)
+    return dict(_filtered(users, user_ids, "id").values_list("id", "longest_streak"))
+
+
+def completed_course_scores(user_ids=None):
+    # The same completion test as progress.is_complete, over the counters
+    totals = ContainerTaskCount.objects.filter(
+        level=ContainerLevel.COURSE, container_id=OuterRef("container_id")
+    ).values("total_tasks")[:1]
+    completed = (
+        UserContainerProgress.objects.filter(level=ContainerLevel.COURSE, completed_tasks__gt=0)
+        .annotate(total_tasks=Subquery(totals))
+        .filter(total_tasks__gt=0, completed_tasks__gte=F("total_tasks"))
+    )
+    return dict(
+        _filtered(completed, user_ids).values_list("user_id").annotate(n=Count("id")).order_by()
+    )
+
+
+def badge_scores(user_ids=None):
+    return dict(
+        _filtered(UserBadge.objects.all(), user_ids)
+        .values_list("user_id")
+        .annotate(n=Count("id"))
+        .order_by()
+    )
+
+
+BOARDS = {
+    "streak": streak_scores,
+    "longest_streak": longest_streak_scores,
+    "courses": completed_course_scores,
+    "badges": badge_scores,
+}
+
+
+# --- Boards ---
+
+def _dirty_key(board):
+    return f"leaderboard:{board}:dirty"
+
+
+def _sync(board, sorted_set):
+    """Brings a board up to date: rebuilt if missing, dirty users re-scored."""
+    cache = sorted_set.cache
+    if sorted_set.meta() is not None and not cache.get(_dirty_key(board)):
+        return
+    with sorted_set.lock():
+        dirty = cache.get(_dirty_key(board))
+        cache.delete(_dirty_key(board))
+        try:
+            if sorted_set.meta() is None:
+                raise Evicted(sorted_set.meta_key)
+            if dirty:
+                scores = BOARDS[board](dirty)
+                sorted_set.update({user_id: scores.get(user_id, 0) for user_id in dirty})
+        except Evicted:
+            sorted_set.replace(BOARDS[board]())
+
+
+def _read(board, read):
+    """
+    @raise Busy: The board needs rebuilding and another process holds it.
+    """
+    sorted_set = SortedSet(board)
+    for _ in range(2):
+        try:
+            _sync(board, sorted_set)
+        except Busy:
+            pass  # Serve it as it is; the dirty users are re-scored later
+        try:
+            return read(sorted_set)
+        except Evicted:
+            # Lost some keys to the cache; rebuild and read again
+            invalidate(board)
+    try:
+        return read(sorted_set)
+    except Evicted:
+        raise Busy(sorted_set.meta_key)
+
+
+def top(board, offset=0, limit=20):
+    """[(rank, user_id, score)] of a page of the board."""
+    return _read(board, lambda s: s.range(offset, limit))
+
+
+def rank(board, user_id):
+    """(rank, score) of a user, or (None, 0) when they score nothing."""
+    return _read(board, lambda s: s.rank(user_id))
+
+
+def size(board):
+    return _read(board, len)
+
+
+def scores(board, user_ids):
+    """{user_id: score} of the given users."""
+    return _read(board, lambda s: s.scores(user_ids))
+
+
+def score(board, user_id):
+    return scores(board, [user_id])[user_id]
+
+
+def friends(board, user):
+    """[(rank, user_id, score)] of the user and their friends, ranked among themselves."""
+    from apps.accounts import graph
+
+    user_ids = [user.pk, *sorted(graph.friend_ids(user))]
+    found = scores(board, user_ids)
+    ordered = sorted(user_ids, key=lambda user_id: (-found[user_id], user_id))
+    return [(i, user_id, found[user_id]) for i, user_id in enumerate(ordered, start=1)]
+
+
+def _add_dirty(board, user_ids):
+    sorted_set = SortedSet(board)
+    if sorted_set.meta() is None:
+        return  # It will be rebuilt with everything anyway
+    try:
+        with sorted_set.lock():
+            key = _dirty_key(board)
+            sorted_set.cache.set(key, (sorted_set.cache.get(key) or set()) | set(user_ids), timeout=None)
+    except Busy:
+        _drop(board, sorted_set)
+
+
+def mark_changed(boards, user_ids):
+    """Re-scores the users on the given boards once the transaction commits."""
+    user_ids = {user_id for user_id in user_ids if user_id is not None}
+    if not user_ids:
+        return
+    for board in [boards] if isinstance(boards, str) else boards:
+        transaction.on_commit(lambda board=board: _add_dirty(board, user_ids))
+
+
+def _drop(board, sorted_set):
+    # Without the lock, only the meta key goes: the board is rebuilt on its
+    # next read, unless the lock holder writes it back first
+    logger.warning("Leaderboard %s stayed locked; dropping it for a rebuild.", board)
+    sorted_set.cache.delete(sorted_set.meta_key)
+
+
+def invalidate(*boards):
+    """Rebuilds the given boards (every board by default) on their next read."""
+    for board in boards or BOARDS:
+        sorted_set = SortedSet(board)
+        try:
+            with sorted_set.lock():
+                sorted_set.clear()
+                sorted_set.cache.delete(_dirty_key(board))
+        except Busy:
+            _drop(board, sorted_set)
+
+
+def invalidate_on_commit(*boards):
+    transaction.on_commit(lambda: invalidate(*boards))
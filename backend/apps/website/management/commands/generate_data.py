@@ -0,0 +1,71 @@
+import time
+from dataclasses import fields, replace
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from apps.website.synthetic import PRESETS, generate
+
+
+class Command(BaseCommand):
+    help = (
+        "Generates a synthetic dataset (courses, tasks, users, friendships, badges, "
+        "progress and dictionary entries) with bulk inserts, for scale testing."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--scale",
+            choices=PRESETS,
+            default="small",
+            help="Preset to start from; the options below override its fields.",
+        )
+        for field in fields(next(iter(PRESETS.values()))):
+            parser.add_argument(f"--{field.name}", type=int, help=f"Override the preset's {field.name}.")
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=5000,
+            help="Number of rows written per insert.",
+        )
+        parser.add_argument(
+            "--seed",
+            type=int,
+            default=0,
+            help="Seed of the random choices; the same seed gives the same dataset.",
+        )
+        parser.add_argument(
+            "--prefix",
+            default="synthetic",
+            help="Prefix of the generated usernames, badge titles and tag names.",
+        )
+
+    def handle(self, *args, **options):
+        scale = PRESETS[options["scale"]]
+        scale = replace(
+            scale,
+            **{
+                field.name: options[field.name]
+                for field in fields(scale)
+                if options[field.name] is not None
+            },
+        )
+        if get_user_model().objects.filter(username=f"{options['prefix']}0").exists():
+            raise CommandError(
+                f"Users named {options['prefix']}N exist already; pass another --prefix."
+            )
+
+        self.stdout.write(f"Generating {scale}")
+        start = time.perf_counter()
+        with transaction.atomic():
+            counts = generate(
+                scale,
+                batch_size=options["batch_size"],
+                seed=options["seed"],
+                prefix=options["prefix"],
+                log=lambda line: self.stdout.write(f"  {line}"),
+            )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Wrote {sum(counts.values())} rows in {time.perf_counter() - start:.1f}s."
+            )
+        )
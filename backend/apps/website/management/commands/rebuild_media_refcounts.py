@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from apps.website.media import rebuild_media_refcounts
+
+
+class Command(BaseCommand):
+    help = (
+        "Recounts the references to every deduplicated image blob and deletes the "
+        "blobs nothing references. Run it before cleanup_unused_media."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--keep-unused",
+            action="store_true",
+            help="Only recount; leave unreferenced blobs in place.",
+        )
+
+    def handle(self, *args, **options):
+        referenced, deleted = rebuild_media_refcounts(delete_unused=not options["keep_unused"])
+        self.stdout.write(
+            self.style.SUCCESS(f"{referenced} blobs referenced, {deleted} unused blobs deleted.")
+        )
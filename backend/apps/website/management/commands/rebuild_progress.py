@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from apps.website.progress import rebuild_progress
+
+
+class Command(BaseCommand):
+    help = "Recomputes the course/section/room progress counters from the task and progress tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of counter rows written per insert.",
+        )
+
+    def handle(self, *args, **options):
+        containers, users = rebuild_progress(batch_size=options["batch_size"])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Wrote {containers} container counters and {users} user counters."
+            )
+        )
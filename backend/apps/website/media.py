@@ -0,0 +1,125 @@
+from collections import Counter
+from contextlib import contextmanager
+from django.apps import apps
+from django.db import transaction
+from django.db.models import F, FileField
+from .models import MediaBlob
+from .storage import dedup_storage, is_blob
+
+# Reference counts of the deduplicated image blobs (see storage.py).
+#
+# MediaBlob.refcount is the number of image fields, across every model, that
+# reference a blob. The signals in signals.py retain the new blob and release
+# the old one when such a field changes, and release it when the row is
+# deleted. A blob released for the last time is deleted once the transaction
+# commits. Writes that skip signals (queryset.update(), bulk operations) are
+# caught up by rebuild_media_refcounts().
+#
+# The same content can be uploaded again while its blob waits to be deleted,
+# and the new reference is only counted after the upload. So every upload
+# bumps MediaBlob.uploads under the row lock before it checks for the file,
+# and the deletion (also under the row lock) only goes ahead when no upload
+# came after the release. Otherwise the upload either finds the file in
+# place, or waits for the deletion to finish and writes the file again.
+
+
+def tracked_fields():
+    """The file fields stored in DedupStorage, apart from MediaBlob's own."""
+    return [
+        field
+        for model in apps.get_models()
+        if model is not MediaBlob
+        for field in model._meta.get_fields()
+        if isinstance(field, FileField) and field.storage is dedup_storage
+    ]
+
+
+def field_name(value):
+    """The stored name of a file field value (a FieldFile or a plain name)."""
+    return getattr(value, "name", value) or None
+
+
+def retain(name):
+    """Counts one more reference to a blob."""
+    if not is_blob(name):
+        return
+    if not MediaBlob.objects.filter(file=name).update(refcount=F("refcount") + 1):
+        # Insert at zero and increment, so a concurrent insert can't lose either
+        MediaBlob.objects.bulk_create([MediaBlob(file=name)], ignore_conflicts=True)
+        MediaBlob.objects.filter(file=name).update(refcount=F("refcount") + 1)
+
+
+@contextmanager
+def claim(name):
+    """Holds off the deletion of a blob while its content is being uploaded."""
+    with transaction.atomic():
+        while not MediaBlob.objects.filter(file=name).update(uploads=F("uploads") + 1):
+            # The row may be deleted between these two, hence the loop
+            MediaBlob.objects.bulk_create([MediaBlob(file=name)], ignore_conflicts=True)
+        yield
+
+
+def release(name):
+    """Counts one reference less to a blob, deleting it after the last one."""
+    if not is_blob(name):
+        return
+    MediaBlob.objects.filter(file=name).update(refcount=F("refcount") - 1)
+    uploads = MediaBlob.objects.filter(file=name).values_list("uploads", flat=True).first()
+    if uploads is not None:
+        transaction.on_commit(lambda: _collect(name, uploads))
+
+
+def _collect(name, uploads=None):
+    """
+    Deletes an unreferenced blob, file first, holding its row throughout.
+
+    @param uploads: The blob's upload count when it was released; it is kept
+                    if it was uploaded again since.
+    """
+    blobs = MediaBlob.objects.select_for_update().filter(file=name, refcount__lte=0)
+    if uploads is not None:
+        blobs = blobs.filter(uploads=uploads)
+    with transaction.atomic():
+        blob = blobs.first()
+        if blob is None:
+            return False
+        dedup_storage.delete(name)
+        MediaBlob.objects.filter(pk=blob.pk).delete()
+    return True
+
+
+def rebuild_media_refcounts(delete_unused=True):
+    """
+    Recounts every blob's references from the tracked fields.
+
+    @param delete_unused: Also delete the blobs nothing references any more.
+    @return: The number of (referenced blobs, deleted blobs).
+    """
+    counts = Counter()
+    for field in tracked_fields():
+        for name in (
+            field.model._base_manager.exclude(**{field.name: ""})
+            .exclude(**{f"{field.name}__isnull": True})
+            .values_list(field.name, flat=True)
+            .iterator()
+        ):
+            if is_blob(name):
+                counts[name] += 1
+
+    with transaction.atomic():
+        existing = {
+            name: (refcount, uploads)
+            for name, refcount, uploads in MediaBlob.objects.values_list("file", "refcount", "uploads")
+        }
+        MediaBlob.objects.bulk_create(
+            [MediaBlob(file=name) for name in counts.keys() - existing.keys()],
+            ignore_conflicts=True,
+        )
+        for name, count in counts.items():
+            if existing.get(name, (None,))[0] != count:
+                MediaBlob.objects.filter(file=name).update(refcount=count)
+        unused = [name for name in existing if name not in counts]
+        MediaBlob.objects.filter(file__in=unused).update(refcount=0)
+
+    deleted = sum(_collect(name, existing[name][1]) for name in unused) if delete_unused else 0
+    return len(counts), deleted
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.6 on 2026-10-18 14:10
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('website', '0008_alter_course_visibility_alter_room_visibility_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='usercourseaccesslevel',
+            index=models.Index(fields=['user', 'course'], name='website_use_user_id_f9262f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userroomaccesslevel',
+            index=models.Index(fields=['user', 'room'], name='website_use_user_id_c0fc6b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='usersectionaccesslevel',
+            index=models.Index(fields=['user', 'section'], name='website_use_user_id_3dce35_idx'),
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.6 on 2026-10-18 14:14
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def populate_progress(apps, schema_editor):
+    from apps.website.progress import rebuild_progress
+
+    rebuild_progress(
+        models=(
+            apps.get_model("website", "ContainerTaskCount"),
+            apps.get_model("website", "UserContainerProgress"),
+            apps.get_model("website", "Task"),
+            apps.get_model("website", "ProgressOfTask"),
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('website', '0009_access_level_user_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContainerTaskCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('level', models.CharField(choices=[('COURSE', 'COURSE'), ('SECTION', 'SECTION'), ('ROOM', 'ROOM')], max_length=10)),
+                ('container_id', models.BigIntegerField()),
+                ('total_tasks', models.IntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('level', 'container_id'), name='unique_container_task_count')],
+            },
+        ),
+        migrations.CreateModel(
+            name='UserContainerProgress',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('level', models.CharField(choices=[('COURSE', 'COURSE'), ('SECTION', 'SECTION'), ('ROOM', 'ROOM')], max_length=10)),
+                ('container_id', models.BigIntegerField()),
+                ('completed_tasks', models.IntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['level', 'container_id'], name='website_use_level_4ef450_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'level', 'container_id'), name='unique_user_container_progress')],
+            },
+        ),
+        migrations.RunPython(populate_progress, migrations.RunPython.noop),
+    ]
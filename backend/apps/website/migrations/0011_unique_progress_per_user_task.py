@@ -0,0 +1,58 @@
+# Generated by Django 5.2.6 on 2026-10-18 14:17
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def merge_duplicate_progress(apps, schema_editor):
+    """
+    Keeps one progress row per (user, task) before the constraint goes on:
+    a completed one if there is any, otherwise the oldest.
+    """
+    from apps.website.progress import rebuild_progress
+
+    ProgressOfTask = apps.get_model("website", "ProgressOfTask")
+    duplicated = list(
+        ProgressOfTask.objects.filter(user__isnull=False, task__isnull=False)
+        .values_list("user_id", "task_id")
+        .annotate(n=models.Count("id"))
+        .filter(n__gt=1)
+        .order_by()
+    )
+    if not duplicated:
+        return
+
+    doomed = []
+    for user_id, task_id, _ in duplicated:
+        rows = ProgressOfTask.objects.filter(user_id=user_id, task_id=task_id).values_list(
+            "id", "status"
+        )
+        keep = min(rows, key=lambda row: (row[1] != "COMPLE", row[0]))
+        doomed.extend(row_id for row_id, _ in rows if row_id != keep[0])
+    ProgressOfTask.objects.filter(id__in=doomed).delete()
+
+    # Historical models send no signals, so the counters are recomputed
+    rebuild_progress(
+        models=(
+            apps.get_model("website", "ContainerTaskCount"),
+            apps.get_model("website", "UserContainerProgress"),
+            apps.get_model("website", "Task"),
+            ProgressOfTask,
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('website', '0010_progress_counters'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_progress, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='progressoftask',
+            constraint=models.UniqueConstraint(fields=('user', 'task'), name='unique_progress_per_user_task'),
+        ),
+    ]
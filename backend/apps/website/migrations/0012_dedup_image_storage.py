@@ -0,0 +1,43 @@
+# Generated by Django 5.2.6 on 2026-10-18 14:42
+
+import apps.website.models
+import apps.website.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('website', '0011_unique_progress_per_user_task'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file', models.FileField(max_length=255, storage=apps.website.storage.image_storage, unique=True, upload_to='')),
+                ('refcount', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='badge',
+            name='image',
+            field=models.ImageField(default=apps.website.models.default_badge_image, storage=apps.website.storage.image_storage, upload_to='Images/'),
+        ),
+        migrations.AlterField(
+            model_name='course',
+            name='image',
+            field=models.ImageField(blank=True, storage=apps.website.storage.image_storage, upload_to='Images/'),
+        ),
+        migrations.AlterField(
+            model_name='room',
+            name='image',
+            field=models.ImageField(blank=True, storage=apps.website.storage.image_storage, upload_to='Images/'),
+        ),
+        migrations.AlterField(
+            model_name='section',
+            name='image',
+            field=models.ImageField(blank=True, storage=apps.website.storage.image_storage, upload_to='Images/'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 15:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('website', '0012_dedup_image_storage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mediablob',
+            name='uploads',
+            field=models.IntegerField(default=0),
+        ),
+    ]
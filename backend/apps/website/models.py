@@ -2,7 +2,10 @@ from django.db import models
 from django.utils.translation import gettext_lazy as _
 from django.conf import settings
 from ordered_model.models import F, OrderedModel
-from django.db.models import Q, Case, Value, When
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q, Case, Subquery, Value, When
+from django.db.models.functions import Coalesce
+from .storage import image_storage
 from .utils import censor_json, censor_with_xxxx
 
 # | Visibility  | AccessLevel  | can_view  | can_edit   |
@@ -27,6 +30,47 @@ class VisibilityLevel(models.TextChoices):
     PRIVATE = "PRI", _("PRIVATE")
 
 
+def _view_conditions(user, AccessModel, field_name, prefix=""):
+    """
+    Q for the containers reached through `prefix` that `user` can view:
+
+    A. the user is the creator;
+    B. the container is PUBLIC and published;
+    C. the container is PRIVATE and the user has an access row for it.
+    """
+    pk = f"{prefix}pk" if prefix else "pk"
+    return (
+        Q(**{f"{prefix}creator": user})
+        | Q(**{f"{prefix}visibility": VisibilityLevel.PUBLIC, f"{prefix}is_published": True})
+        | Q(
+            Exists(AccessModel.objects.filter(user=user, **{field_name: OuterRef(pk)})),
+            **{f"{prefix}visibility": VisibilityLevel.PRIVATE},
+        )
+    )
+
+
+def _annotate_progress(queryset, user, level):
+    """
+    Annotates total_tasks, completed_tasks and progress_percent for `user`
+    from the denormalized counters (see progress.py): two indexed lookups per
+    container instead of counting tasks and progress rows through the joins.
+    """
+    totals = ContainerTaskCount.objects.filter(level=level, container_id=OuterRef("pk"))
+    completed = UserContainerProgress.objects.filter(
+        level=level, container_id=OuterRef("pk"), user=user
+    )
+    return queryset.annotate(
+        total_tasks=Coalesce(Subquery(totals.values("total_tasks")[:1]), 0),
+        completed_tasks=Coalesce(Subquery(completed.values("completed_tasks")[:1]), 0),
+    ).annotate(
+        progress_percent=Case(
+            When(total_tasks=0, then=Value(0)),
+            default=100.0 * F("completed_tasks") / F("total_tasks"),
+            output_field=models.FloatField(),
+        )
+    )
+
+
 class CourseQuerySet(models.QuerySet):
     """Custom QuerySet for the Course model to handle access filtering."""
 
@@ -46,45 +90,13 @@ class CourseQuerySet(models.QuerySet):
         if user.is_superuser or user.is_staff:
             return self.all()
 
-        # 2. General View Logic (Combined Q objects)
-        # Combine all conditions where a regular authenticated user can view the course:
-        view_conditions = (
-            Q(
-                # Condition A: The user is the creator (creator can always view)
-                creator=user
-            )
-            | Q(
-                # Condition B: The course is Public AND published
-                visibility=VisibilityLevel.PUBLIC,
-                is_published=True,
-            )
-            | Q(visibility=VisibilityLevel.PRIVATE, access_users=user)
-        )
-
-        # Note: Private courses are covered only by Condition A (creator=user).
-
-        # 3. Apply the combined filter
-        return self.filter(view_conditions).distinct()
+        # 2. General View Logic: one flat predicate; the access-row check is a
+        # correlated EXISTS, so no M2M join and no DISTINCT are needed
+        return self.filter(_view_conditions(user, UserCourseAccessLevel, "course"))
 
     # used to sum the progress of all tasks as a percentage
     def user_progress_percent(self, user):
-        return self.annotate(
-            total_tasks=models.Count("sections__rooms__tasks", distinct=True),
-            completed_tasks=models.Count(
-                "sections__rooms__tasks__progressoftask",
-                filter=models.Q(
-                    sections__rooms__tasks__progressoftask__user=user,
-                    sections__rooms__tasks__progressoftask__status=Status.COMPLE,
-                ),
-                distinct=True,
-            ),
-        ).annotate(
-            progress_percent=Case(
-                When(total_tasks=0, then=Value(0)),
-                default=100.0 * F("completed_tasks") / F("total_tasks"),
-                output_field=models.FloatField(),
-            )
-        )
+        return _annotate_progress(self, user, ContainerLevel.COURSE)
 
 
 class SectionQuerySet(models.QuerySet):
@@ -99,51 +111,16 @@ class SectionQuerySet(models.QuerySet):
             return self.all()
 
         # --- Hierarchy Rule: The user must have VIEW access to the parent Course. ---
-        # Get the Course queryset that the user can view (using the CourseQuerySet logic)
-        viewable_courses = Course.objects.filter_by_user_access(user)
-
-        # Start with all sections belonging to courses the user can view.
-        base_filter = Q(course__in=viewable_courses)
-
-        # --- Section-Specific Visibility Rules ---
-        # The user can view the section if they meet the hierarchy rule AND:
-        section_view_conditions = (
-            Q(
-                # Condition A: The user is the section creator
-                creator=user
-            )
-            | Q(
-                # Condition B: The section is Public AND published
-                visibility=VisibilityLevel.PUBLIC,
-                is_published=True,
-            )
-            | Q(visibility=VisibilityLevel.PRIVATE, access_users=user)
+        # The course rules are applied through the section's FK (a plain join),
+        # together with the section's own rules.
+        return self.filter(
+            _view_conditions(user, UserCourseAccessLevel, "course", prefix="course__")
+            & _view_conditions(user, UserSectionAccessLevel, "section")
         )
 
-        # Combine the base filter with the section-specific rules.
-        final_filter = base_filter & section_view_conditions
-
-        return self.filter(final_filter).distinct()
-
     # used to sum the progress of all tasks as a percentage
     def user_progress_percent(self, user):
-        return self.annotate(
-            total_tasks=models.Count("rooms__tasks", distinct=True),
-            completed_tasks=models.Count(
-                "rooms__tasks__progressoftask",
-                filter=models.Q(
-                    rooms__tasks__progressoftask__user=user,
-                    rooms__tasks__progressoftask__status=Status.COMPLE,
-                ),
-                distinct=True,
-            ),
-        ).annotate(
-            progress_percent=Case(
-                When(total_tasks=0, then=Value(0)),
-                default=100.0 * F("completed_tasks") / F("total_tasks"),
-                output_field=models.FloatField(),
-            )
-        )
+        return _annotate_progress(self, user, ContainerLevel.SECTION)
 
 
 class RoomQuerySet(models.QuerySet):
@@ -157,65 +134,75 @@ class RoomQuerySet(models.QuerySet):
         if user.is_superuser or user.is_staff:
             return self.all()
 
-        # --- Hierarchy Rule: The user must have VIEW access to the parent Section. ---
-        # Get the Section queryset that the user can view (using the SectionQuerySet logic)
-        # Note: self.model.objects.filter_by_user_access(user) creates recursion,
-        # so we must call the method on the manager of the parent model.
-        viewable_sections = Section.objects.filter_by_user_access(user)
-
-        # Start with all rooms belonging to sections the user can view.
-        base_filter = Q(section__in=viewable_sections)
-
-        # --- Room-Specific Visibility Rules ---
-        # The user can view the room if they meet the hierarchy rule AND:
-        room_view_conditions = (
-            Q(
-                # Condition A: The user is the room creator
-                creator=user
-            )
-            | Q(
-                # Condition B: The room is Public AND published
-                visibility=VisibilityLevel.PUBLIC,
-                is_published=True,
+        # --- Hierarchy Rule: The user must have VIEW access to the parent Section
+        # (and so to the section's Course). ---
+        return self.filter(
+            _view_conditions(
+                user, UserCourseAccessLevel, "course", prefix="section__course__"
             )
-            | Q(visibility=VisibilityLevel.PRIVATE, access_users=user)
+            & _view_conditions(user, UserSectionAccessLevel, "section", prefix="section__")
+            & _view_conditions(user, UserRoomAccessLevel, "room")
         )
 
-        # Combine the base filter with the room-specific rules.
-        final_filter = base_filter & room_view_conditions
-
-        return self.filter(final_filter).distinct()
-
     # used to sum the progress of all tasks as a percentage
     def user_progress_percent(self, user):
-        return self.annotate(
-            total_tasks=models.Count("tasks", distinct=True),
-            completed_tasks=models.Count(
-                "tasks__progressoftask",
-                filter=models.Q(
-                    tasks__progressoftask__user=user,
-                    tasks__progressoftask__status=Status.COMPLE,
-                ),
-                distinct=True,
-            ),
-        ).annotate(
-            progress_percent=Case(
-                When(total_tasks=0, then=Value(0)),
-                default=100.0 * F("completed_tasks") / F("total_tasks"),
-                output_field=models.FloatField(),
-            )
+        return _annotate_progress(self, user, ContainerLevel.ROOM)
+
+    def prefetch_details(self):
+        """
+        Loads everything RoomSerializer reads (creator, badge, and the tasks
+        with their components and tags) in a fixed number of queries,
+        however many tasks and components the rooms have.
+        """
+        return self.select_related("creator", "badge").prefetch_related(
+            "tasks", "tasks__components", "tasks__tags"
         )
 
 
+# Censors text fields on save, skipping the ones unchanged since the object was
+# loaded: those were censored when they were stored.
+class CensoredFieldsMixin:
+    censored_fields = ()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._stored_censored = {
+            field: instance.__dict__[field]
+            for field in cls.censored_fields
+            if field in instance.__dict__  # deferred fields aren't loaded
+        }
+        return instance
+
+    def censor_fields(self, update_fields=None):
+        stored = getattr(self, "_stored_censored", {})
+        for field in self.censored_fields:
+            if update_fields is not None and field not in update_fields:
+                continue
+            if field not in self.__dict__:
+                continue
+            value = self.__dict__[field]
+            if field in stored and stored[field] == value:
+                continue
+            value = censor_with_xxxx(value)
+            setattr(self, field, value)
+            stored[field] = value
+        self._stored_censored = stored
+
+
 def default_badge_image():
     return "Images/default.png"  # change to whatever the path is to the image, rn theres no actual image here
 
 
-class Badge(models.Model):
-    image = models.ImageField(upload_to="Images/", default=default_badge_image)
+class Badge(CensoredFieldsMixin, models.Model):
+    image = models.ImageField(
+        upload_to="Images/", storage=image_storage, default=default_badge_image
+    )
     title = models.CharField(max_length=100, unique=True)
     description = models.CharField(max_length=200, blank=True)
 
+    censored_fields = ("title",)
+
     def __str__(self):
         return self.title
 
@@ -232,7 +219,7 @@ class Badge(models.Model):
         if not has_image:
             self.image = default_badge_image()
         
-        self.title = censor_with_xxxx(self.title)
+        self.censor_fields(kwargs.get("update_fields"))
 
         super().save(*args, **kwargs)
 
@@ -281,7 +268,7 @@ class PublishableMixin(models.Model):
     def reject_publish(self):
         self.delete()
 
-class Course(PublishableMixin, models.Model):
+class Course(CensoredFieldsMixin, PublishableMixin, models.Model):
     badge = models.OneToOneField(
         Badge, on_delete=models.SET_NULL, null=True, blank=True, related_name="course"
     )
@@ -308,20 +295,21 @@ class Course(PublishableMixin, models.Model):
     created_on = models.DateTimeField(auto_now_add=True)
     last_updated = models.DateTimeField(auto_now=True)
     is_published = models.BooleanField(default=False)
-    image = models.ImageField(upload_to="Images/", blank=True)  # no default
+    image = models.ImageField(upload_to="Images/", storage=image_storage, blank=True)  # no default
+
+    censored_fields = ("title", "description")
 
     def __str__(self):
         return self.title
 
     def save(self, *args, **kwargs):
-        self.title = censor_with_xxxx(self.title)
-        self.description = censor_with_xxxx(self.description)
+        self.censor_fields(kwargs.get("update_fields"))
         super().save(*args, **kwargs)
 
     objects = CourseQuerySet.as_manager()
 
 
-class Section(PublishableMixin, models.Model):
+class Section(CensoredFieldsMixin, PublishableMixin, models.Model):
     badge = models.OneToOneField(
         Badge, on_delete=models.SET_NULL, null=True, related_name="section"
     )
@@ -351,20 +339,21 @@ class Section(PublishableMixin, models.Model):
     created_on = models.DateTimeField(auto_now_add=True)
     last_updated = models.DateTimeField(auto_now=True)
     is_published = models.BooleanField(default=False)
-    image = models.ImageField(upload_to="Images/", blank=True)  # no default
+    image = models.ImageField(upload_to="Images/", storage=image_storage, blank=True)  # no default
+
+    censored_fields = ("title", "description")
 
     def __str__(self):
         return f"{self.course.title if self.course else 'No Course'} - {self.title}"
     
     def save(self, *args, **kwargs):
-        self.title = censor_with_xxxx(self.title)
-        self.description = censor_with_xxxx(self.description)
+        self.censor_fields(kwargs.get("update_fields"))
         super().save(*args, **kwargs)
 
     objects = SectionQuerySet.as_manager()
 
 
-class Room(PublishableMixin, models.Model):
+class Room(CensoredFieldsMixin, PublishableMixin, models.Model):
     badge = models.OneToOneField(
         Badge, on_delete=models.SET_NULL, null=True, blank=True, related_name="room"
     )
@@ -393,24 +382,27 @@ class Room(PublishableMixin, models.Model):
     created_on = models.DateTimeField(auto_now_add=True)
     last_updated = models.DateTimeField(auto_now=True)
     is_published = models.BooleanField(default=False)
-    image = models.ImageField(upload_to="Images/", blank=True)  # no default
+    image = models.ImageField(upload_to="Images/", storage=image_storage, blank=True)  # no default
+
+    censored_fields = ("title", "description")
 
     def __str__(self):
         return f"{self.course.title if self.course else 'No Course'} - {self.title}"
     
     def save(self, *args, **kwargs):
-        self.title = censor_with_xxxx(self.title)
-        self.description = censor_with_xxxx(self.description)
+        self.censor_fields(kwargs.get("update_fields"))
         super().save(*args, **kwargs)
 
     objects = RoomQuerySet.as_manager()
 
 
-class Tag(models.Model):
+class Tag(CensoredFieldsMixin, models.Model):
     name = models.CharField(max_length=100, unique=True)
 
+    censored_fields = ("name",)
+
     def save(self, *args, **kwargs):
-        self.name = censor_with_xxxx(self.name)
+        self.censor_fields(kwargs.get("update_fields"))
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -431,6 +423,11 @@ class Task(OrderedModel):
     def __str__(self):
         return f"{self.room.title if self.room else 'No Room'} - {self.pk}"
 
+    def save(self, *args, **kwargs):
+        # The task counters (progress.py) are updated by post_save; commit both together
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
 
 class TaskComponentType(models.TextChoices):
     OPTION = "OPTION", _("MULTIPLE CHOICE OPTION")
@@ -461,7 +458,9 @@ class TaskComponent(OrderedModel):
     
     def save(self, *args, **kwargs):
         # Censor all string values inside the JSON
-        self.content = censor_json(self.content)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is None or "content" in update_fields:
+            self.content = censor_json(self.content)
         super().save(*args, **kwargs)
 
 
@@ -474,6 +473,10 @@ class UserCourseAccessLevel(models.Model):
         max_length=50, choices=AccessLevel, default=AccessLevel.VISITOR
     )
 
+    class Meta:
+        # Serves the EXISTS probes in filter_by_user_access and the access resolver
+        indexes = [models.Index(fields=["user", "course"])]
+
     def __str__(self):
         return f"{self.user.username if self.user else 'Unknown'} → {self.course.title if self.course else 'No Course'} ({self.access_level})"
 
@@ -487,6 +490,9 @@ class UserSectionAccessLevel(models.Model):
         max_length=50, choices=AccessLevel, default=AccessLevel.VISITOR
     )
 
+    class Meta:
+        indexes = [models.Index(fields=["user", "section"])]
+
     def __str__(self):
         return f"{self.user.username if self.user else 'Unknown'} → {self.section.title if self.section else 'No Section'} ({self.access_level})"
 
@@ -500,6 +506,9 @@ class UserRoomAccessLevel(models.Model):
         max_length=50, choices=AccessLevel, default=AccessLevel.VISITOR
     )
 
+    class Meta:
+        indexes = [models.Index(fields=["user", "room"])]
+
     def __str__(self):
         return f"{self.user.username if self.user else 'Unknown'} → {self.room.title if self.room else 'No Room'} ({self.access_level})"
 
@@ -523,6 +532,12 @@ class ProgressOfTask(models.Model):
     attempts = models.IntegerField(default=0)
     metadata = models.JSONField(default=dict, blank=True)
 
+    class Meta:
+        # One row per user and task, so progress can be upserted
+        constraints = [
+            models.UniqueConstraint(fields=["user", "task"], name="unique_progress_per_user_task")
+        ]
+
     def __str__(self):
         # Safely resolve room title from task if available
         room_title = "No Room"
@@ -538,6 +553,68 @@ class ProgressOfTask(models.Model):
 
         return f"{self.user.username if self.user else 'Unknown'} → {room_title} ({self.status})"
 
+    def save(self, *args, **kwargs):
+        # The progress counters (progress.py) are updated by post_save; commit both together
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+
+class ContainerLevel(models.TextChoices):
+    COURSE = "COURSE", _("COURSE")
+    SECTION = "SECTION", _("SECTION")
+    ROOM = "ROOM", _("ROOM")
+
+
+# Denormalized task counts behind user_progress_percent, maintained by
+# progress.py and rebuilt from scratch by `manage.py rebuild_progress`.
+# A container only has a row once it has tasks (or the user has completed some).
+class ContainerTaskCount(models.Model):
+    level = models.CharField(max_length=10, choices=ContainerLevel)
+    container_id = models.BigIntegerField()
+    total_tasks = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["level", "container_id"], name="unique_container_task_count"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.level} {self.container_id}: {self.total_tasks} tasks"
+
+
+class UserContainerProgress(models.Model):
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    level = models.CharField(max_length=10, choices=ContainerLevel)
+    container_id = models.BigIntegerField()
+    completed_tasks = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "level", "container_id"],
+                name="unique_user_container_progress",
+            )
+        ]
+        indexes = [models.Index(fields=["level", "container_id"])]
+
+    def __str__(self):
+        return f"{self.user} → {self.level} {self.container_id}: {self.completed_tasks} completed"
+
+
+# An uploaded image stored once by content (see storage.py), with the number of
+# image fields that reference it (see media.py). Being a FileField, the blob
+# also counts as used media for django_unused_media's cleanup.
+class MediaBlob(models.Model):
+    file = models.FileField(storage=image_storage, max_length=255, unique=True)
+    refcount = models.IntegerField(default=0)
+    # Bumped by every upload of the content (see media.py)
+    uploads = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.file.name} ({self.refcount} references)"
+
 
 class SavedTask(models.Model):
     user = models.ForeignKey(
@@ -1,3 +1,4 @@
+from django.db.models import Value
 from .models import (
     Room,
     Course,
@@ -16,6 +17,16 @@ CONTAINER_ACCESS_MAP = {
     Room: (UserRoomAccessLevel, "room_id"),
 }
 
+# Bumped (see signals.py) whenever a container or access row changes, which
+# drops every per-user memo built before the change
+_access_generation = 0
+
+
+def invalidate_access_cache():
+    global _access_generation
+    _access_generation += 1
+
+
 def _get_access_precedence(level):
     """Returns an integer precedence for AccessLevel for comparison."""
     if level == AccessLevel.EDITOR:
@@ -24,59 +35,227 @@ def _get_access_precedence(level):
         return 1
     return 0 # No access
 
-def get_effective_access_level(container, user, _visited=None):
+
+class _Node:
+    """The fields of a Course/Section/Room that access resolution reads."""
+
+    __slots__ = ("model", "id", "visibility", "creator_id", "parent")
+
+    def __init__(self, model, id, visibility, creator_id, parent=None):
+        self.model = model
+        self.id = id
+        self.visibility = visibility
+        self.creator_id = creator_id
+        self.parent = parent  # (model, id) or None
+
+
+class AccessResolver:
+    """
+    Computes effective access levels for one user, with the exact semantics of
+    the visibility/access table in models.py:
+
+    - superusers, staff and the container's creator are EDITORs;
+    - anyone else is a VISITOR of a PUBLIC container, otherwise gets the level
+      of their access row for it (if any);
+    - the parent's effective level (Room -> Section -> Course) wins when it
+      ranks higher.
+
+    Parents and access rows for a whole batch of containers are loaded
+    together (one query for the parents, one for the access rows of all three
+    levels) and memoized, so repeated checks in a request are free.
     """
-    Recursively determines the highest effective AccessLevel a user has for a
-    container by checking the container itself and its parent hierarchy.
+
+    def __init__(self, user):
+        self.user = user
+        self.generation = _access_generation
+        self._nodes = {}  # (model, id) -> _Node, parents loaded from the DB
+        self._access = {}  # (model, id) -> access_level or None
+
+    # --- Loading ---
+
+    def _node_for(self, container):
+        model = container.__class__
+        parent = None
+        if model is Room:
+            parent = (Section, container.section_id)
+            if Room.section.is_cached(container) and container.section is not None:
+                self._nodes.setdefault(parent, self._node_for(container.section))
+        elif model is Section:
+            parent = (Course, container.course_id)
+            if Section.course.is_cached(container) and container.course is not None:
+                self._nodes.setdefault(parent, self._node_for(container.course))
+        return _Node(
+            model,
+            container.id,
+            getattr(container, "visibility", VisibilityLevel.PRIVATE),
+            container.creator_id,
+            parent,
+        )
+
+    def _load_parents(self, nodes):
+        missing_sections = set()
+        missing_courses = set()
+        pending = list(nodes)
+        while pending:
+            node = pending.pop()
+            if node.parent is None or node.parent[1] is None:
+                continue
+            parent = self._nodes.get(node.parent)
+            if parent is not None:
+                pending.append(parent)
+            elif node.parent[0] is Section:
+                missing_sections.add(node.parent[1])
+            else:
+                missing_courses.add(node.parent[1])
+
+        if missing_sections:
+            # Each section comes back with its course in the same row
+            rows = Section.objects.filter(id__in=missing_sections).values_list(
+                "id", "visibility", "creator_id", "course_id",
+                "course__visibility", "course__creator_id",
+            )
+            for id, visibility, creator_id, course_id, c_visibility, c_creator_id in rows:
+                self._nodes[(Section, id)] = _Node(
+                    Section, id, visibility, creator_id, (Course, course_id)
+                )
+                self._nodes.setdefault(
+                    (Course, course_id), _Node(Course, course_id, c_visibility, c_creator_id)
+                )
+            missing_courses -= {key[1] for key in self._nodes if key[0] is Course}
+
+        if missing_courses:
+            rows = Course.objects.filter(id__in=missing_courses).values_list(
+                "id", "visibility", "creator_id"
+            )
+            for id, visibility, creator_id in rows:
+                self._nodes[(Course, id)] = _Node(Course, id, visibility, creator_id)
+
+    def _load_access(self, nodes):
+        wanted = {}
+        for node in self._walk(nodes):
+            key = (node.model, node.id)
+            if (
+                node.visibility != VisibilityLevel.PUBLIC
+                and node.creator_id != self.user.pk
+                and key not in self._access
+            ):
+                wanted.setdefault(node.model, set()).add(node.id)
+        if not wanted:
+            return
+
+        queries = []
+        for model, ids in wanted.items():
+            AccessModel, id_field_name = CONTAINER_ACCESS_MAP[model]
+            queries.append(
+                AccessModel.objects.filter(user=self.user, **{f"{id_field_name}__in": ids})
+                .annotate(level=Value(model.__name__))
+                .values_list("level", id_field_name, "id", "access_level")
+                .order_by()
+            )
+        rows = queries[0].union(*queries[1:], all=True) if len(queries) > 1 else queries[0]
+
+        by_name = {model.__name__: model for model in wanted}
+        first_rows = {}
+        for name, container_id, row_id, access_level in rows:
+            key = (by_name[name], container_id)
+            # Same row as .first() picked: the lowest primary key
+            if key not in first_rows or row_id < first_rows[key][0]:
+                first_rows[key] = (row_id, access_level)
+
+        for model, ids in wanted.items():
+            for container_id in ids:
+                row = first_rows.get((model, container_id))
+                self._access[(model, container_id)] = row[1] if row else None
+
+    def _walk(self, nodes):
+        seen = set()
+        for node in nodes:
+            while node is not None and (node.model, node.id) not in seen:
+                seen.add((node.model, node.id))
+                yield node
+                node = self._nodes.get(node.parent) if node.parent else None
+
+    # --- Resolution ---
+
+    def _level(self, node, _visited):
+        if node.creator_id is not None and node.creator_id == self.user.pk:
+            return AccessLevel.EDITOR
+
+        key = (node.model, node.id)
+        if key in _visited:
+            return None
+        _visited.add(key)
+
+        if node.visibility == VisibilityLevel.PUBLIC:
+            highest_access = AccessLevel.VISITOR
+        else:
+            highest_access = self._access.get(key)
+
+        parent = self._nodes.get(node.parent) if node.parent else None
+        if parent is not None:
+            parent_access = self._level(parent, _visited)
+            if parent_access:
+                if highest_access is None or _get_access_precedence(parent_access) > _get_access_precedence(highest_access):
+                    highest_access = parent_access
+
+        return highest_access
+
+    def resolve_many(self, containers):
+        """
+        Effective AccessLevel (EDITOR, VISITOR, or None) for each container,
+        in the order given.
+        """
+        containers = list(containers)
+        user = self.user
+        if not user or not user.is_authenticated:
+            return [None] * len(containers)
+        if user.is_superuser or user.is_staff:
+            return [AccessLevel.EDITOR] * len(containers)
+
+        nodes = [
+            self._node_for(c) if c.__class__ in CONTAINER_ACCESS_MAP else None
+            for c in containers
+        ]
+        known = [node for node in nodes if node is not None]
+        self._load_parents(known)
+        self._load_access(known)
+        return [self._level(node, set()) if node else None for node in nodes]
+
+    def resolve(self, container):
+        return self.resolve_many([container])[0]
+
+
+def get_access_resolver(user):
+    """
+    Returns the resolver memoized on this user object. Request users live for
+    one request, so this is a per-request memo; it is also discarded as soon
+    as any container or access row changes.
+    """
+    resolver = getattr(user, "_access_resolver", None)
+    if resolver is None or resolver.generation != _access_generation:
+        resolver = AccessResolver(user)
+        if user is not None:
+            user._access_resolver = resolver
+    return resolver
+
+
+def resolve_many(user, containers):
+    """
+    Effective AccessLevel for each of a list of Courses/Sections/Rooms, in
+    the order given, using a handful of queries for the whole list.
+    """
+    return get_access_resolver(user).resolve_many(containers)
+
+
+def get_effective_access_level(container, user):
+    """
+    Determines the highest effective AccessLevel a user has for a container
+    by checking the container itself and its parent hierarchy.
 
     Returns:
         AccessLevel (EDITOR, VISITOR), or None if no access.
     """
-    # --- Base auth (Highest Access) ---
-    if not user or not user.is_authenticated:
-        return None
-    if user.is_superuser or user.is_staff or user == getattr(container, "creator", None):
-        return AccessLevel.EDITOR
-
-    # --- Recursion guard ---
-    if _visited is None:
-        _visited = set()
-    if id(container) in _visited:
-        return None
-    _visited.add(id(container))
-
-    # --- 1. Determine local access level and visibility ---
-    mapping = CONTAINER_ACCESS_MAP.get(container.__class__)
-    if not mapping:
-        return None
-
-    AccessModel, id_field_name = mapping
-    visibility = getattr(container, "visibility", VisibilityLevel.PRIVATE)
-    container_id = container.id
-    highest_access = None
-
-    # --- PUBLIC ---
-    if visibility == VisibilityLevel.PUBLIC:
-        # Staff/creator already covered in Base Auth. Anyone else gets VIEW access.
-        highest_access = AccessLevel.VISITOR
-    # --- PRIVATE ---
-    else:
-        access_filter = {"user": user, id_field_name: container_id}
-        user_access = AccessModel.objects.filter(**access_filter).first()
-        if user_access:
-            highest_access = user_access.access_level
-
-    # --- 2. Parent hierarchy check (Recursion) ---
-    parent = getattr(container, "section", None) or getattr(container, "course", None)
-    if parent:
-        parent_access = get_effective_access_level(parent, user, _visited=_visited)
-
-        # Compare and take the highest access level from the hierarchy
-        if parent_access:
-            if highest_access is None or _get_access_precedence(parent_access) > _get_access_precedence(highest_access):
-                highest_access = parent_access
-
-    return highest_access
+    return resolve_many(user, [container])[0]
 
 
 def user_has_access(container, user, *, edit=False):
@@ -92,9 +271,9 @@ def user_has_access(container, user, *, edit=False):
 
     if effective_access is None:
         return False
-    
+
     # Required access level (view requires VISITOR, edit requires EDITOR)
     required_precedence = _get_access_precedence(AccessLevel.EDITOR) if edit else _get_access_precedence(AccessLevel.VISITOR)
-    
+
     # Check if the user's effective access is high enough
-    return _get_access_precedence(effective_access) >= required_precedence
\ No newline at end of file
+    return _get_access_precedence(effective_access) >= required_precedence
@@ -0,0 +1,305 @@
+from collections import defaultdict
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from . import leaderboards
+from .models import (
+    ContainerLevel,
+    ContainerTaskCount,
+    Course,
+    ProgressOfTask,
+    Room,
+    Status,
+    Task,
+    UserContainerProgress,
+)
+
+# Maintenance of the denormalized progress counters.
+#
+# ContainerTaskCount holds the number of tasks under each room, section and
+# course; UserContainerProgress the number of those a user has completed. They
+# count exactly what user_progress_percent used to count through the joins:
+# tasks reach a section and course through room -> section -> course, and every
+# COMPLE progress row with a user counts once.
+#
+# The signals in signals.py apply a delta for each saved or deleted task and
+# progress row, inside the same transaction as the write. The containers a
+# deleted row counted towards are looked up in pre_delete, as a cascade may
+# delete the task or room first (their foreign keys are nullable). Moving a
+# task, room or section re-counts the containers involved, and
+# rebuild_progress() recomputes everything from scratch. Changes to the course
+# counters are passed on to the completed-courses leaderboard (leaderboards.py).
+
+# Path from a Task to the container id of each level, room first
+TASK_PATHS = {
+    ContainerLevel.ROOM: "room_id",
+    ContainerLevel.SECTION: "room__section_id",
+    ContainerLevel.COURSE: "room__section__course_id",
+}
+
+
+def _chain(row):
+    chain = {}
+    for level, container_id in zip(TASK_PATHS, row or ()):
+        if container_id is None:
+            break
+        chain[level] = container_id
+    return chain
+
+
+def room_chain(room_id):
+    """{level: container_id} for a room and the section and course above it."""
+    if room_id is None:
+        return {}
+    return _chain(
+        Room.objects.filter(id=room_id)
+        .values_list("id", "section_id", "section__course_id")
+        .first()
+    )
+
+
+def task_chain(task_id):
+    """{level: container_id} for the room, section and course of a task."""
+    if task_id is None:
+        return {}
+    return _chain(Task.objects.filter(id=task_id).values_list(*TASK_PATHS.values()).first())
+
+
+def loaded_task_chain(task):
+    """
+    task_chain() for a task whose room and section are already loaded
+    (select_related("room__section")), without a query; None if they aren't.
+    """
+    if not Task.room.is_cached(task):
+        return None
+    room = task.room
+    if room is None:
+        return {}
+    if not Room.section.is_cached(room):
+        return None
+    return _chain((room.id, room.section_id, room.section.course_id))
+
+
+def _containers_q(containers):
+    """Q matching any of the given (level, container_id) pairs."""
+    q = Q()
+    for level, container_id in containers:
+        q |= Q(level=level, container_id=container_id)
+    return q
+
+
+def _bump(model, field, containers, delta, **key):
+    """Adds `delta` to `field` of the counter row of each (level, container_id)."""
+    containers = set(containers)
+    if not containers or not delta:
+        return
+    rows = model.objects.filter(_containers_q(containers), **key)
+    updated = rows.update(**{field: F(field) + delta})
+    if updated == len(containers) or delta < 0:
+        # A missing row when decrementing means there was nothing to take from
+        return
+
+    missing = containers - set(rows.values_list("level", "container_id"))
+    # Insert at zero and increment, so a concurrent insert of the same row
+    # can't lose either write
+    model.objects.bulk_create(
+        [model(level=level, container_id=container_id, **key) for level, container_id in missing],
+        ignore_conflicts=True,
+    )
+    model.objects.filter(_containers_q(missing), **key).update(**{field: F(field) + delta})
+
+
+def add_tasks(chain, delta=1):
+    """Counts `delta` tasks added to (or, if negative, removed from) a room chain."""
+    _bump(ContainerTaskCount, "total_tasks", chain.items(), delta)
+    if delta and ContainerLevel.COURSE in chain:
+        # Everyone who completed the course may have stopped, or started, counting it
+        leaderboards.invalidate_on_commit("courses")
+
+
+def add_completed(user_id, chain, delta=1):
+    """Counts `delta` more (or fewer) completed tasks in a room chain for a user."""
+    if user_id is None:
+        return
+    _bump(UserContainerProgress, "completed_tasks", chain.items(), delta, user_id=user_id)
+    if delta and ContainerLevel.COURSE in chain:
+        leaderboards.mark_changed("courses", [user_id])
+
+
+def add_completed_many(user_id, deltas):
+    """
+    Applies a batch of completed-task changes for a user.
+
+    @param deltas: {(level, container_id): delta}.
+    """
+    by_delta = defaultdict(list)
+    for container, delta in deltas.items():
+        by_delta[delta].append(container)
+    for delta, containers in by_delta.items():
+        _bump(UserContainerProgress, "completed_tasks", containers, delta, user_id=user_id)
+    if any(level == ContainerLevel.COURSE for level, _ in deltas):
+        leaderboards.mark_changed("courses", [user_id])
+
+
+def counts(user, containers):
+    """
+    Task totals and a user's completed counts, read from the counters in one
+    query.
+
+    @param containers: {level: container_id} or (level, container_id) pairs.
+    @return: {(level, container_id): (total_tasks, completed_tasks)}.
+    """
+    pairs = list(containers.items() if isinstance(containers, dict) else containers)
+    if not pairs:
+        return {}
+    completed = UserContainerProgress.objects.filter(
+        user=user, level=OuterRef("level"), container_id=OuterRef("container_id")
+    )
+    rows = (
+        ContainerTaskCount.objects.filter(_containers_q(pairs))
+        .annotate(completed=Coalesce(Subquery(completed.values("completed_tasks")[:1]), 0))
+        .values_list("level", "container_id", "total_tasks", "completed")
+    )
+    found = {(level, container_id): (total, n) for level, container_id, total, n in rows}
+    return {pair: found.get(pair, (0, 0)) for pair in pairs}
+
+
+def is_complete(total_tasks, completed_tasks):
+    # Same test as progress_percent == 100
+    return total_tasks > 0 and 100.0 * completed_tasks / total_tasks == 100
+
+
+def completion(user, containers):
+    """
+    Whether `user` has completed every task of each container (one query).
+
+    @param containers: {level: container_id}.
+    @return: {level: bool}; containers without tasks are not completed.
+    """
+    found = counts(user, containers)
+    return {
+        level: is_complete(*found[(level, container_id)])
+        for level, container_id in containers.items()
+    }
+
+
+def completed_courses(user):
+    """
+    Number of courses `user` can view and has completed every task of, read
+    from the counters in one query.
+    """
+    total = ContainerTaskCount.objects.filter(
+        level=ContainerLevel.COURSE, container_id=OuterRef("container_id")
+    ).values("total_tasks")[:1]
+    return (
+        UserContainerProgress.objects.filter(
+            user=user,
+            level=ContainerLevel.COURSE,
+            completed_tasks__gt=0,
+            container_id__in=Course.objects.filter_by_user_access(user).values("id"),
+        )
+        .annotate(total_tasks=Subquery(total))
+        .filter(completed_tasks__gte=F("total_tasks"))
+        .count()
+    )
+
+
+# --- Re-counting ---
+
+def _count_rows(ContainerTaskCount, UserContainerProgress, Task, ProgressOfTask, level, ids=None):
+    path = TASK_PATHS[level]
+    tasks = Task.objects.filter(**{f"{path}__isnull": False})
+    progress = ProgressOfTask.objects.filter(
+        status=Status.COMPLE, user__isnull=False, **{f"task__{path}__isnull": False}
+    )
+    if ids is not None:
+        tasks = tasks.filter(**{f"{path}__in": ids})
+        progress = progress.filter(**{f"task__{path}__in": ids})
+
+    totals = (
+        ContainerTaskCount(level=level, container_id=container_id, total_tasks=n)
+        for container_id, n in tasks.values_list(path).annotate(n=Count("id")).order_by()
+    )
+    completed = (
+        UserContainerProgress(
+            user_id=user_id, level=level, container_id=container_id, completed_tasks=n
+        )
+        for user_id, container_id, n in (
+            progress.values_list("user_id", f"task__{path}").annotate(n=Count("id")).order_by()
+        )
+    )
+    return totals, completed
+
+
+def _write(model, rows, batch_size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            model.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        model.objects.bulk_create(batch)
+
+
+def recount(containers, batch_size=1000):
+    """
+    Recomputes the counters of the given containers from the task and
+    progress tables.
+
+    @param containers: {level: iterable of container ids}.
+    """
+    with transaction.atomic():
+        for level, ids in containers.items():
+            ids = {container_id for container_id in ids if container_id is not None}
+            if not ids:
+                continue
+            ContainerTaskCount.objects.filter(level=level, container_id__in=ids).delete()
+            UserContainerProgress.objects.filter(level=level, container_id__in=ids).delete()
+            totals, completed = _count_rows(
+                ContainerTaskCount, UserContainerProgress, Task, ProgressOfTask, level, ids
+            )
+            _write(ContainerTaskCount, totals, batch_size)
+            _write(UserContainerProgress, completed, batch_size)
+        if containers.get(ContainerLevel.COURSE):
+            leaderboards.invalidate_on_commit("courses")
+
+
+def forget_container(level, container_id):
+    """Drops the counters of a deleted container."""
+    ContainerTaskCount.objects.filter(level=level, container_id=container_id).delete()
+    UserContainerProgress.objects.filter(level=level, container_id=container_id).delete()
+    if level == ContainerLevel.COURSE:
+        leaderboards.invalidate_on_commit("courses")
+
+
+def rebuild_progress(batch_size=1000, models=None):
+    """
+    Recomputes every progress counter from scratch.
+
+    @param batch_size: Counter rows written per insert.
+    @param models: Optional (ContainerTaskCount, UserContainerProgress, Task,
+                   ProgressOfTask) tuple, used by migrations to pass their
+                   historical models.
+    @return: The number of (container rows, user rows) written.
+    """
+    if models is None:
+        models = (ContainerTaskCount, UserContainerProgress, Task, ProgressOfTask)
+    TaskCount, UserProgress = models[:2]
+
+    written = [0, 0]
+
+    def counted(rows, index):
+        for row in rows:
+            written[index] += 1
+            yield row
+
+    with transaction.atomic():
+        TaskCount.objects.all().delete()
+        UserProgress.objects.all().delete()
+        for level in TASK_PATHS:
+            totals, completed = _count_rows(*models, level)
+            _write(TaskCount, counted(totals, 0), batch_size)
+            _write(UserProgress, counted(completed, 1), batch_size)
+        leaderboards.invalidate_on_commit("courses")
+    return tuple(written)
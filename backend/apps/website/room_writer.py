@@ -0,0 +1,165 @@
+from collections import defaultdict
+from . import progress
+from .models import Tag, Task, TaskComponent, TaskComponentType
+from .utils import censor_json, censor_with_xxxx
+
+# Diff-based writer for the tasks of a room, used by save_room.
+#
+# The incoming tasks replace the room's tasks: listed tasks are updated in the
+# order given, unlisted ones are deleted, and the same goes for the components
+# of each listed task. Everything the room has is loaded up front in a few
+# queries, the differences are worked out in memory, and only those are written,
+# with bulk inserts/updates/deletes. Order values are assigned here rather than
+# by OrderedModel, which would look up the current maximum for every insert.
+
+
+class RoomWriteError(ValueError):
+    """The incoming tasks could not be applied."""
+
+
+def _id(data, key):
+    """The id under `key` as an int (None if absent), accepting digit strings."""
+    value = data.get(key)
+    if value is None or (isinstance(value, int) and not isinstance(value, bool)):
+        return value
+    if isinstance(value, str) and value.isdigit():
+        return int(value)
+    raise RoomWriteError(f"Invalid {key}: {value!r}")
+
+
+def _validate(tasks_data):
+    """
+    Checks the shape of `tasks_data` and returns a copy with the task and
+    component ids as ints, so they match the stored ones.
+
+    @raise RoomWriteError: The tasks, components or ids are malformed.
+    """
+    if not isinstance(tasks_data, list) or not all(isinstance(t, dict) for t in tasks_data):
+        raise RoomWriteError("Tasks must be a list of objects")
+    tasks = []
+    for data in tasks_data:
+        data = {**data, "task_id": _id(data, "task_id")}
+        if "components" in data:
+            components = data["components"] or []
+            if not isinstance(components, list) or not all(isinstance(c, dict) for c in components):
+                raise RoomWriteError("Components must be a list of objects")
+            for comp in components:
+                if comp.get("type") not in TaskComponentType.values:
+                    raise RoomWriteError(f"Invalid component type: {comp.get('type')!r}")
+            data["components"] = [
+                {**comp, "task_component_id": _id(comp, "task_component_id")}
+                for comp in components
+            ]
+        tasks.append(data)
+    return tasks
+
+
+def _tag_ids(names):
+    """Ids of the tags with these (censored) names, creating missing ones."""
+    tag_ids = dict(Tag.objects.filter(name__in=names).values_list("name", "id"))
+    missing = names - tag_ids.keys()
+    if missing:
+        # bulk_create skips Tag.save(), but the names are censored already
+        Tag.objects.bulk_create([Tag(name=name) for name in missing], ignore_conflicts=True)
+        tag_ids.update(Tag.objects.filter(name__in=missing).values_list("name", "id"))
+    return tag_ids
+
+
+def write_tasks(room, tasks_data):
+    """
+    Makes the room's tasks match `tasks_data`, the "tasks" list save_room receives.
+
+    Each task is {"task_id"?, "tags": [names], "components": [{"task_component_id"?,
+    "type", "content"}]}. A task_id/task_component_id that doesn't belong to
+    the room/task is treated as new. A task without "components" keeps its
+    components; a task without "tags" has its tags cleared.
+    """
+    tasks_data = _validate(tasks_data)
+
+    # --- Load what the room has ---
+    existing_tasks = {task.id: task for task in Task.objects.filter(room=room)}
+    existing_components = defaultdict(dict)
+    for comp in TaskComponent.objects.filter(task__room=room):
+        existing_components[comp.task_id][comp.id] = comp
+    TaskTag = Task.tags.through
+    existing_tags = defaultdict(dict)
+    for row_id, task_id, tag_id in TaskTag.objects.filter(task__room=room).values_list(
+        "id", "task_id", "tag_id"
+    ):
+        existing_tags[task_id][tag_id] = row_id
+
+    # --- Tasks ---
+    plan = []
+    new_tasks, moved_tasks = [], []
+    for order, data in enumerate(tasks_data):
+        task = existing_tasks.pop(data.get("task_id"), None)
+        if task is None:
+            task = Task(room=room, order=order)
+            new_tasks.append(task)
+        elif task.order != order:
+            task.order = order
+            moved_tasks.append(task)
+        plan.append((task, data))
+
+    if existing_tasks:
+        # A real delete, so progress rows and components cascade (and the
+        # progress counters follow through their signals)
+        Task.objects.filter(id__in=list(existing_tasks)).delete()
+    Task.objects.bulk_update(moved_tasks, ["order"])
+    Task.objects.bulk_create(new_tasks)
+    if new_tasks:
+        # bulk_create sends no post_save, so the new tasks are counted here
+        progress.add_tasks(progress.room_chain(room.id), len(new_tasks))
+
+    # --- Components ---
+    new_components, changed_components, removed_components = [], [], []
+    changed_fields = set()
+    for task, data in plan:
+        if "components" not in data:
+            continue
+        current = existing_components.pop(task.id, {})
+        for order, comp in enumerate(data["components"] or []):
+            component_type, content = comp["type"], comp.get("content") or ""
+            component = current.pop(comp.get("task_component_id"), None)
+            if component is None:
+                new_components.append(
+                    TaskComponent(
+                        task=task, order=order, type=component_type, content=censor_json(content)
+                    )
+                )
+                continue
+
+            # Unchanged content is already stored censored, so it is only
+            # censored again when it differs
+            if content != component.content:
+                content = censor_json(content)
+            changes = {"type": component_type, "content": content, "order": order}
+            changes = {f: v for f, v in changes.items() if getattr(component, f) != v}
+            if changes:
+                for field, value in changes.items():
+                    setattr(component, field, value)
+                changed_components.append(component)
+                changed_fields.update(changes)
+        removed_components.extend(current)
+
+    if removed_components:
+        TaskComponent.objects.filter(id__in=removed_components).delete()
+    if changed_components:
+        TaskComponent.objects.bulk_update(changed_components, sorted(changed_fields))
+    TaskComponent.objects.bulk_create(new_components)
+
+    # --- Tags ---
+    wanted = [
+        (task, {censor_with_xxxx(name) for name in data.get("tags") or []})
+        for task, data in plan
+    ]
+    tag_ids = _tag_ids(set().union(*(names for _, names in wanted)))
+    added, removed = [], []
+    for task, names in wanted:
+        current = existing_tags.get(task.id, {})
+        target = {tag_ids[name] for name in names}
+        added.extend(TaskTag(task_id=task.id, tag_id=tag_id) for tag_id in target - current.keys())
+        removed.extend(row_id for tag_id, row_id in current.items() if tag_id not in target)
+    if removed:
+        TaskTag.objects.filter(id__in=removed).delete()
+    TaskTag.objects.bulk_create(added)
@@ -1,6 +1,8 @@
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
 from django.db import transaction
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import extend_schema_field
 from .models import (
     Badge,
     ProgressOfTask,
@@ -19,6 +21,18 @@ from .models import (
     UserCourseAccessLevel,
     UserSectionAccessLevel
 )
+from .thumbnails import variant_urls
+
+# -------------------------------
+# Image variants
+# -------------------------------
+@extend_schema_field(OpenApiTypes.OBJECT)
+class ImageVariantsField(serializers.ReadOnlyField):
+    """{variant: {format: url}} of the resized copies of an image (see thumbnails.py)."""
+
+    def to_representation(self, value):
+        return variant_urls(value, self.context.get("request"))
+
 
 # -------------------------------
 # Tag Serializer
@@ -147,12 +161,13 @@ class TaskSerializer(serializers.ModelSerializer):
 class BadgeSerializer(serializers.ModelSerializer):
     badge_id = serializers.IntegerField(source="id", read_only=True)
     image = serializers.ImageField()
+    image_variants = ImageVariantsField(source="image")
     title = serializers.CharField()
     description = serializers.CharField()
 
     class Meta:
         model = Badge
-        fields = ["badge_id", "image", "title", "description"]
+        fields = ["badge_id", "image", "image_variants", "title", "description"]
         read_only_fields = ["badge_id"]
 
 
@@ -170,6 +185,18 @@ class UserBadgeSerializer(serializers.ModelSerializer):
         read_only_fields = ["userbadge_id", "user", "badge", "awarded_at"]
 
 
+# -------------------------------
+# Leaderboard Serializer
+# -------------------------------
+class LeaderboardEntrySerializer(serializers.Serializer):
+    rank = serializers.IntegerField()
+    score = serializers.IntegerField()
+    user_id = serializers.IntegerField(source="user.id")
+    username = serializers.CharField(source="user.username")
+    profile_pic = serializers.ImageField(source="user.profile_pic")
+    profile_pic_variants = ImageVariantsField(source="user.profile_pic")
+
+
 # -------------------------------
 # ProgressOfTask Serializer
 # -------------------------------
@@ -199,6 +226,18 @@ class ProgressOfTaskSerializer(serializers.ModelSerializer):
         read_only_fields = ["progress_id", "task_id", "task_title", "room_title"]
 
 
+# One update in a bulk progress submission; omitted fields keep their value
+class BulkProgressItemSerializer(serializers.Serializer):
+    task_id = serializers.IntegerField()
+    status = serializers.ChoiceField(choices=Status.choices, required=False)
+    attempts = serializers.IntegerField(required=False)
+    metadata = serializers.JSONField(required=False)
+
+
+class BulkProgressSerializer(serializers.Serializer):
+    updates = BulkProgressItemSerializer(many=True, allow_empty=False, max_length=500)
+
+
 # -------------------------------
 # Room Serializer
 # -------------------------------
@@ -211,6 +250,7 @@ class RoomSerializer(serializers.ModelSerializer):
     created_on = serializers.DateTimeField(read_only=True)
     last_updated = serializers.DateTimeField(required=False)
     image = serializers.ImageField(required=False, allow_null=True)
+    image_variants = ImageVariantsField(source="image")
 
     # Write-only field to set badge via ID
     badge_id = serializers.PrimaryKeyRelatedField(
@@ -236,6 +276,7 @@ class RoomSerializer(serializers.ModelSerializer):
             "created_on",
             "last_updated",
             "image",
+            "image_variants",
             "badge",
             "badge_id",
         ]
@@ -323,6 +364,7 @@ class SectionSerializer(serializers.ModelSerializer):
     creator = serializers.StringRelatedField(read_only=True)
     created_on = serializers.DateTimeField(read_only=True)
     image = serializers.ImageField()
+    image_variants = ImageVariantsField(source="image")
     is_published = serializers.BooleanField(default=True)
 
     badge_id = serializers.PrimaryKeyRelatedField(
@@ -343,6 +385,7 @@ class SectionSerializer(serializers.ModelSerializer):
             "creator",
             "created_on",
             "image",
+            "image_variants",
             "badge",
             "badge_id",
         ]
@@ -392,6 +435,7 @@ class CourseSerializer(serializers.ModelSerializer):
     creator = serializers.StringRelatedField(read_only=True)
     created_on = serializers.DateTimeField(read_only=True)
     image = serializers.ImageField()
+    image_variants = ImageVariantsField(source="image")
     is_published = serializers.BooleanField(default=False)
     visibility = serializers.ChoiceField(choices=VisibilityLevel.choices, default=VisibilityLevel.PRIVATE)
 
@@ -412,6 +456,7 @@ class CourseSerializer(serializers.ModelSerializer):
             "creator",
             "created_on",
             "image",
+            "image_variants",
             "badge",
             "badge_id",
         ]
@@ -0,0 +1,248 @@
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_init,
+    post_save,
+    pre_delete,
+)
+from collections import defaultdict
+from django.conf import settings
+from django.dispatch import receiver
+from . import leaderboards, media, progress
+from .models import (
+    ContainerLevel,
+    Course,
+    ProgressOfTask,
+    Room,
+    Section,
+    Status,
+    Task,
+    UserBadge,
+    UserCourseAccessLevel,
+    UserRoomAccessLevel,
+    UserSectionAccessLevel,
+)
+from .permissions import invalidate_access_cache
+
+ACCESS_MODELS = (
+    Course,
+    Section,
+    Room,
+    UserCourseAccessLevel,
+    UserSectionAccessLevel,
+    UserRoomAccessLevel,
+)
+
+
+def _invalidate_access(sender, **kwargs):
+    invalidate_access_cache()
+
+
+for model in ACCESS_MODELS:
+    post_save.connect(_invalidate_access, sender=model, dispatch_uid=f"access_save_{model.__name__}")
+    post_delete.connect(_invalidate_access, sender=model, dispatch_uid=f"access_delete_{model.__name__}")
+
+
+@receiver(m2m_changed, sender=Course.access_users.through)
+@receiver(m2m_changed, sender=Section.access_users.through)
+@receiver(m2m_changed, sender=Room.access_users.through)
+def invalidate_access_on_m2m(sender, **kwargs):
+    invalidate_access_cache()
+
+
+# --- Progress counters (see progress.py) ---
+#
+# post_init remembers what each loaded row counted towards, so a save or
+# delete can take exactly that back. __dict__ is read directly so deferred
+# fields are not loaded just for this.
+
+def _counted_progress(instance):
+    values = instance.__dict__
+    if values.get("status") != Status.COMPLE or values.get("user_id") is None:
+        return None
+    return (values["user_id"], values.get("task_id"))
+
+
+@receiver(post_init, sender=ProgressOfTask)
+def remember_counted_progress(sender, instance, **kwargs):
+    instance._counted_progress = _counted_progress(instance)
+
+
+def _progress_chain(instance, task_id):
+    # The task the view already loaded, if it is this one, saves a query
+    if ProgressOfTask.task.is_cached(instance) and instance.task is not None:
+        if instance.task.pk == task_id:
+            chain = progress.loaded_task_chain(instance.task)
+            if chain is not None:
+                return chain
+    return progress.task_chain(task_id)
+
+
+@receiver(post_save, sender=ProgressOfTask)
+def count_progress(sender, instance, created, **kwargs):
+    previous = None if created else instance._counted_progress
+    current = _counted_progress(instance)
+    if previous != current:
+        if previous:
+            progress.add_completed(previous[0], _progress_chain(instance, previous[1]), -1)
+        if current:
+            progress.add_completed(current[0], _progress_chain(instance, current[1]), 1)
+    instance._counted_progress = current
+
+
+@receiver(pre_delete, sender=ProgressOfTask)
+def find_counted_progress(sender, instance, **kwargs):
+    previous = instance._counted_progress
+    instance._counted_chain = _progress_chain(instance, previous[1]) if previous else {}
+
+
+@receiver(post_delete, sender=ProgressOfTask)
+def uncount_progress(sender, instance, **kwargs):
+    if instance._counted_chain:
+        progress.add_completed(instance._counted_progress[0], instance._counted_chain, -1)
+
+
+@receiver(post_init, sender=Task)
+def remember_task_room(sender, instance, **kwargs):
+    instance._counted_room_id = instance.__dict__.get("room_id")
+
+
+@receiver(post_save, sender=Task)
+def count_task(sender, instance, created, **kwargs):
+    if created:
+        progress.add_tasks(progress.room_chain(instance.room_id))
+    elif instance._counted_room_id != instance.room_id:
+        # Its completions move too, so re-count both rooms and their parents
+        chains = [
+            progress.room_chain(instance._counted_room_id),
+            progress.room_chain(instance.room_id),
+        ]
+        progress.recount(
+            {level: [chain.get(level) for chain in chains] for level in ContainerLevel}
+        )
+    instance._counted_room_id = instance.room_id
+
+
+@receiver(pre_delete, sender=Task)
+def find_task_room(sender, instance, **kwargs):
+    instance._counted_chain = progress.room_chain(instance._counted_room_id)
+
+
+@receiver(post_delete, sender=Task)
+def uncount_task(sender, instance, **kwargs):
+    progress.add_tasks(instance._counted_chain, -1)
+
+
+@receiver(post_init, sender=Room)
+@receiver(post_init, sender=Section)
+def remember_parent(sender, instance, **kwargs):
+    field = "section_id" if sender is Room else "course_id"
+    instance._counted_parent_id = instance.__dict__.get(field)
+
+
+@receiver(post_save, sender=Room)
+def recount_moved_room(sender, instance, created, **kwargs):
+    previous = instance._counted_parent_id
+    if not created and previous != instance.section_id:
+        courses = Section.objects.filter(id__in=[previous, instance.section_id]).values_list(
+            "course_id", flat=True
+        )
+        progress.recount(
+            {
+                ContainerLevel.SECTION: [previous, instance.section_id],
+                ContainerLevel.COURSE: list(courses),
+            }
+        )
+    instance._counted_parent_id = instance.section_id
+
+
+@receiver(post_save, sender=Section)
+def recount_moved_section(sender, instance, created, **kwargs):
+    previous = instance._counted_parent_id
+    if not created and previous != instance.course_id:
+        progress.recount(
+            {
+                ContainerLevel.COURSE: [previous, instance.course_id],
+            }
+        )
+    instance._counted_parent_id = instance.course_id
+
+
+CONTAINER_LEVELS = {
+    Course: ContainerLevel.COURSE,
+    Section: ContainerLevel.SECTION,
+    Room: ContainerLevel.ROOM,
+}
+
+
+def _forget_container(sender, instance, **kwargs):
+    progress.forget_container(CONTAINER_LEVELS[sender], instance.pk)
+
+
+for model in CONTAINER_LEVELS:
+    post_delete.connect(
+        _forget_container, sender=model, dispatch_uid=f"progress_delete_{model.__name__}"
+    )
+
+
+# --- Image blob references (see media.py) ---
+#
+# post_init remembers the blob each image field referenced when loaded, so a
+# save can tell whether it changed.
+
+def _remember_images(sender, instance, **kwargs):
+    values = instance.__dict__
+    instance._stored_images = {
+        field.attname: media.field_name(values.get(field.attname))
+        for field in MEDIA_FIELDS[sender]
+        if field.attname in values
+    }
+
+
+def _count_images(sender, instance, created, **kwargs):
+    stored = instance.__dict__.setdefault("_stored_images", {})
+    for field in MEDIA_FIELDS[sender]:
+        if field.attname not in instance.__dict__:
+            continue  # deferred, so not saved either
+        name = media.field_name(instance.__dict__[field.attname])
+        old = None if created else stored.get(field.attname)
+        if name != old:
+            media.retain(name)
+            media.release(old)
+            stored[field.attname] = name
+
+
+def _release_images(sender, instance, **kwargs):
+    for field in MEDIA_FIELDS[sender]:
+        media.release(media.field_name(instance.__dict__.get(field.attname)))
+
+
+MEDIA_FIELDS = defaultdict(list)
+for field in media.tracked_fields():
+    MEDIA_FIELDS[field.model].append(field)
+
+for model in MEDIA_FIELDS:
+    post_init.connect(_remember_images, sender=model, dispatch_uid=f"media_init_{model.__name__}")
+    post_save.connect(_count_images, sender=model, dispatch_uid=f"media_save_{model.__name__}")
+    post_delete.connect(_release_images, sender=model, dispatch_uid=f"media_delete_{model.__name__}")
+
+
+# --- Leaderboards (see leaderboards.py) ---
+#
+# The progress counters and streaks pass their changes on themselves; badges
+# and deleted users are caught here.
+
+@receiver(post_save, sender=UserBadge)
+def count_badge(sender, instance, created, **kwargs):
+    if created:
+        leaderboards.mark_changed("badges", [instance.user_id])
+
+
+@receiver(post_delete, sender=UserBadge)
+def uncount_badge(sender, instance, **kwargs):
+    leaderboards.mark_changed("badges", [instance.user_id])
+
+
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def forget_ranked_user(sender, instance, **kwargs):
+    leaderboards.mark_changed(leaderboards.BOARDS, [instance.pk])
@@ -0,0 +1,103 @@
+import hashlib
+import os
+import re
+from django.core.files import File
+from django.core.files.storage import Storage, default_storage
+
+# Content-addressed storage for uploaded images.
+#
+# DedupStorage wraps default_storage (FileSystemStorage in dev, GCS in prod)
+# and names every upload after the sha256 of its content, in the directory
+# upload_to gives it: Images/<sha256>.png. The same picture uploaded again maps
+# to the same name, so it is neither sent to storage nor stored a second time.
+# Blobs are shared by every row that references them; media.py counts those
+# references and deletes a blob with the last one.
+
+BLOB_RE = re.compile(r"(?:.+/)?[0-9a-f]{64}(?:\.[a-z0-9]+)?")
+
+
+def is_blob(name):
+    """Whether a stored name was given by DedupStorage."""
+    return bool(name) and BLOB_RE.fullmatch(name) is not None
+
+
+def content_hash(content):
+    digest = hashlib.sha256()
+    if hasattr(content, "seek"):
+        content.seek(0)
+    for chunk in content.chunks():
+        digest.update(chunk)
+    if hasattr(content, "seek"):
+        content.seek(0)
+    return digest.hexdigest()
+
+
+def claim_blob(name):
+    from .media import claim
+
+    return claim(name)
+
+
+class DedupStorage(Storage):
+    def __init__(self, storage=default_storage):
+        self.storage = storage
+
+    def blob_name(self, name, content):
+        directory = os.path.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        blob = f"{content_hash(content)}{extension}"
+        return f"{directory}/{blob}" if directory else blob
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, "chunks"):
+            content = File(content, name)
+        name = self.blob_name(self.generate_filename(name), content)
+        with claim_blob(name):
+            if not self.storage.exists(name):
+                saved = self.storage.save(name, content, max_length=max_length)
+                if saved != name:
+                    # The same content was stored meanwhile under this name
+                    self.storage.delete(saved)
+        return name
+
+    # --- Everything else is the wrapped storage's ---
+
+    def _open(self, name, mode="rb"):
+        return self.storage.open(name, mode)
+
+    def delete(self, name):
+        self.storage.delete(name)
+
+    def exists(self, name):
+        return self.storage.exists(name)
+
+    def listdir(self, path):
+        return self.storage.listdir(path)
+
+    def size(self, name):
+        return self.storage.size(name)
+
+    def url(self, name):
+        return self.storage.url(name)
+
+    def path(self, name):
+        return self.storage.path(name)
+
+    def get_accessed_time(self, name):
+        return self.storage.get_accessed_time(name)
+
+    def get_created_time(self, name):
+        return self.storage.get_created_time(name)
+
+    def get_modified_time(self, name):
+        return self.storage.get_modified_time(name)
+
+
+dedup_storage = DedupStorage()
+
+
+def image_storage():
+    # A callable, so migrations reference it instead of serializing the storage
+    return dedup_storage
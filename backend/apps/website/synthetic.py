@@ -0,0 +1,483 @@
+import random
+import time
+import unicodedata
+from dataclasses import dataclass
+from datetime import timedelta
+from itertools import islice
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.utils import timezone
+from friendship.models import Friend, FriendshipRequest
+from apps.accounts.models import DailyActivity
+from apps.accounts.streaks import streaks_from_days
+from apps.accounts.utils import avatar_key, avatar_name
+from dictionary.bulk import HISTORY_SKIP, import_records
+from .models import (
+    Badge,
+    Course,
+    ProgressOfTask,
+    Room,
+    Section,
+    Status,
+    Tag,
+    Task,
+    TaskComponent,
+    TaskComponentType,
+    UserBadge,
+    VisibilityLevel,
+)
+from . import leaderboards
+from .progress import rebuild_progress
+
+# Synthetic datasets for local scale testing.
+#
+# generate() writes a course catalogue (courses -> sections -> rooms -> ordered
+# tasks -> ordered components of every TaskComponentType), users with streaks
+# and the activity log behind them, friendships, badges and task progress, and
+# a dictionary with homographs and accented variants. Everything goes through
+# bulk_create, so none of the per-row side effects run: no censoring, no
+# avatar rendering, no auditlog or simple_history rows, no progress or media
+# signals. What those signals maintain is rebuilt once at the end
+# (rebuild_progress, and the leaderboards on their next read), and users point
+# to their shared default avatar without rendering it (store_default_avatars
+# does, if the pictures are needed).
+#
+# Containers are written one chunk of courses at a time, taking the primary
+# keys back from the inserts, so memory stays flat however large the scale.
+# The output only depends on the scale and the seed.
+
+PASSWORD = "synthetic"
+
+# Kouri-Vini-ish syllables; the accented ones give the dictionary its variants
+SYLLABLES = ["ba", "bon", "jou", "frè", "la", "mo", "ti", "kay", "zan", "pè", "lò", "ké", "cho", "dlo"]
+ACCENTS = {"a": "à", "e": "é", "o": "ò", "u": "ù"}
+
+# Shares of the generated rows; the rest of each is the common case
+ACTIVE_USERS = 0.4  # users with a running streak
+INCOMPLETE_PROGRESS = 0.2  # progress rows not completed yet
+PENDING_REQUESTS = 0.2  # users with an unanswered friend request
+HOMOGRAPHS = 0.1  # dictionary entries repeating an earlier headword
+PRIVATE_CONTAINERS = 0.1  # rooms not visible to everyone
+
+TAGS = 20
+
+
+@dataclass
+class Scale:
+    courses: int
+    sections: int  # per course
+    rooms: int  # per section
+    tasks: int  # per room
+    components: int  # per task
+    users: int
+    progress: int  # progress rows per user
+    friends: int  # friends per user, on average
+    badges: int  # badges, each user holding a few
+    entries: int  # dictionary entries
+
+
+PRESETS = {
+    "small": Scale(2, 2, 2, 5, 3, users=20, progress=20, friends=4, badges=5, entries=200),
+    "medium": Scale(10, 4, 4, 10, 4, users=200, progress=100, friends=10, badges=20, entries=2000),
+    "large": Scale(50, 5, 5, 20, 5, users=1000, progress=300, friends=20, badges=50, entries=20000),
+    # About 2.5 million rows
+    "xlarge": Scale(200, 5, 5, 20, 5, users=10000, progress=150, friends=30, badges=100, entries=100000),
+}
+
+
+def word(n):
+    """A pronounceable word of its own for every n >= 0."""
+    syllables = []
+    while True:
+        n, i = divmod(n, len(SYLLABLES))
+        syllables.append(SYLLABLES[i])
+        if not n:
+            return "".join(reversed(syllables))
+        n -= 1
+
+
+def strip_accents(text):
+    return "".join(
+        c for c in unicodedata.normalize("NFD", text) if not unicodedata.combining(c)
+    )
+
+
+def accented_variant(text, rng):
+    """The same word spelled with or without its accents."""
+    plain = strip_accents(text)
+    if plain != text:
+        return plain
+    vowels = [i for i, c in enumerate(text) if c in ACCENTS]
+    if not vowels:
+        return None
+    i = rng.choice(vowels)
+    return text[:i] + ACCENTS[text[i]] + text[i + 1 :]
+
+
+def _phrase(rng, words=4):
+    return " ".join(word(rng.randrange(5000)) for _ in range(words))
+
+
+def component_content(kind, rng):
+    """Content in the shape the editor saves for each component type."""
+    if kind == TaskComponentType.TEXT:
+        return {"text": _phrase(rng, rng.randint(5, 30))}
+    if kind == TaskComponentType.VIDEO:
+        return {"url": f"https://www.youtube.com/watch?v={rng.getrandbits(44):011x}"}
+    if kind == TaskComponentType.IMAGE:
+        return {
+            "src": f"https://example.com/images/{rng.randrange(10**6)}.jpg",
+            "alt": _phrase(rng, 3),
+            "image_type": "url",
+        }
+    if kind == TaskComponentType.OPTION:
+        correct = rng.randrange(4)
+        return {
+            "choiceArray": [
+                {"id": key, "text": _phrase(rng, 2), "correct": i == correct}
+                for i, key in enumerate("abcd")
+            ],
+            "number_of_chances": rng.randint(1, 3),
+            "hint": "",
+        }
+    if kind == TaskComponentType.FILL:
+        return {
+            "text": f"{_phrase(rng, 3)} ___ {_phrase(rng, 2)}",
+            "answer": word(rng.randrange(5000)),
+            "number_of_chances": rng.randint(1, 3),
+            "hint": _phrase(rng, 2),
+        }
+    if kind == TaskComponentType.MATCH:
+        pairs = rng.randint(3, 6)
+        return {
+            "terms": [word(rng.randrange(5000)) for _ in range(pairs)],
+            "answers": [_phrase(rng, 2) for _ in range(pairs)],
+            "number_of_chances": rng.randint(1, 3),
+            "hint": "",
+        }
+    raise ValueError(f"Unknown component type {kind}")
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def _bulk(model, rows, batch_size):
+    """Inserts rows in chunks and returns how many were written."""
+    written = 0
+    for chunk in _chunks(rows, batch_size):
+        model.objects.bulk_create(chunk, batch_size=batch_size)
+        written += len(chunk)
+    return written
+
+
+# --- 1. Users ---
+
+def _run(last_day, length):
+    return [last_day - timedelta(days=i) for i in range(length)]
+
+
+def _user(username, password, rng, today):
+    """A user, and the logged days their streak columns follow from."""
+    days = []
+    if rng.random() < ACTIVE_USERS:
+        days = _run(today - timedelta(days=rng.randint(0, 1)), min(int(rng.expovariate(1 / 20)) + 1, 365))
+    elif rng.random() < 0.8:
+        days = _run(today - timedelta(days=rng.randint(2, 400)), int(rng.expovariate(1 / 5)) + 1)
+    if days and rng.random() < 0.5:
+        # An earlier streak, ended by a few missed days
+        days += _run(days[-1] - timedelta(days=rng.randint(2, 30)), int(rng.expovariate(1 / 10)) + 1)
+    days.reverse()
+    streak, longest = streaks_from_days(days, today)
+    user = get_user_model()(
+        username=username,
+        email=f"{username}@example.com",
+        password=password,
+        description="No description",
+        # The shared default avatar, without rendering it
+        profile_pic=avatar_name(*avatar_key(username)),
+        streak=streak,
+        longest_streak=longest,
+        last_activity=days[-1] if days else None,
+    )
+    return user, days
+
+
+def generate_users(scale, prefix, rng, batch_size):
+    User = get_user_model()
+    password = make_password(PASSWORD)
+    today = timezone.localdate()
+    user_ids, activity = [], 0
+    for chunk in _chunks((_user(f"{prefix}{i}", password, rng, today) for i in range(scale.users)), batch_size):
+        users = User.objects.bulk_create([user for user, _ in chunk], batch_size=batch_size)
+        user_ids.extend(user.pk for user in users)
+        activity += _bulk(
+            DailyActivity,
+            (
+                DailyActivity(user_id=user.pk, day=day)
+                for user, (_, days) in zip(users, chunk)
+                for day in days
+            ),
+            batch_size,
+        )
+    return user_ids, {"users": len(user_ids), "daily_activity": activity}
+
+
+def generate_friendships(scale, user_ids, rng, batch_size):
+    """Mutual friendships (two Friend rows each) and some pending requests."""
+    if len(user_ids) < 2:
+        return {"friends": 0, "friendship_requests": 0}
+    pairs = set()
+    # Capped at half of all possible pairs, so the sampling below stays quick
+    target = min(scale.friends * len(user_ids) // 2, len(user_ids) * (len(user_ids) - 1) // 4)
+    while len(pairs) < target:
+        a, b = rng.sample(user_ids, 2)
+        pairs.add((min(a, b), max(a, b)))
+
+    friends = _bulk(
+        Friend,
+        (
+            Friend(from_user_id=from_id, to_user_id=to_id)
+            for a, b in sorted(pairs)
+            for from_id, to_id in ((a, b), (b, a))
+        ),
+        batch_size,
+    )
+
+    requests = {}
+    for from_id in user_ids:
+        if rng.random() < PENDING_REQUESTS:
+            to_id = rng.choice(user_ids)
+            pair = (min(from_id, to_id), max(from_id, to_id))
+            if to_id != from_id and pair not in pairs and pair not in requests:
+                requests[pair] = FriendshipRequest(from_user_id=from_id, to_user_id=to_id, message="")
+    FriendshipRequest.objects.bulk_create(requests.values(), batch_size=batch_size)
+    return {"friends": friends, "friendship_requests": len(requests)}
+
+
+def generate_badges(scale, user_ids, prefix, rng, batch_size):
+    badges = Badge.objects.bulk_create(
+        [
+            Badge(title=f"{prefix} badge {i}", description=_phrase(rng, 6))
+            for i in range(scale.badges)
+        ],
+        batch_size=batch_size,
+    )
+    badge_ids = [badge.pk for badge in badges]
+    awarded = _bulk(
+        UserBadge,
+        (
+            UserBadge(user_id=user_id, badge_id=badge_id)
+            for user_id in user_ids
+            for badge_id in rng.sample(badge_ids, min(len(badge_ids), rng.randint(0, 5)))
+        ),
+        batch_size,
+    )
+    return {"badges": len(badges), "user_badges": awarded}
+
+
+# --- 2. Containers, tasks and components ---
+
+def _visibility(rng):
+    return VisibilityLevel.PRIVATE if rng.random() < PRIVATE_CONTAINERS else VisibilityLevel.PUBLIC
+
+
+def generate_courses(scale, user_ids, prefix, rng, batch_size):
+    """
+    Writes the containers and their tasks, one chunk of courses at a time.
+
+    @return: (task ids, row counts)
+    """
+    # A few users write everything, as on the real site
+    authors = user_ids[: max(1, len(user_ids) // 50)]
+    types = TaskComponentType.values
+    tags = Tag.objects.bulk_create([Tag(name=f"{prefix} tag {i}") for i in range(TAGS)])
+    TaskTag = Task.tags.through
+
+    tasks_per_course = max(1, scale.sections * scale.rooms * scale.tasks)
+    courses_per_chunk = max(1, batch_size // tasks_per_course)
+    task_ids = []
+    counts = dict.fromkeys(["courses", "sections", "rooms", "tasks", "components", "task_tags"], 0)
+
+    for start in range(0, scale.courses, courses_per_chunk):
+        # The first course is public, so there is always something to browse
+        courses = Course.objects.bulk_create(
+            [
+                Course(
+                    title=f"Course {c}: {_phrase(rng, 2)}",
+                    description=_phrase(rng, 12),
+                    creator_id=rng.choice(authors),
+                    visibility=VisibilityLevel.PUBLIC if c == 0 else _visibility(rng),
+                )
+                for c in range(start, min(start + courses_per_chunk, scale.courses))
+            ],
+            batch_size=batch_size,
+        )
+        sections = Section.objects.bulk_create(
+            [
+                Section(
+                    course_id=course.pk,
+                    title=f"Section {s}: {_phrase(rng, 2)}",
+                    description=_phrase(rng, 12),
+                    creator_id=course.creator_id,
+                    visibility=course.visibility,
+                )
+                for course in courses
+                for s in range(scale.sections)
+            ],
+            batch_size=batch_size,
+        )
+        rooms = Room.objects.bulk_create(
+            [
+                Room(
+                    course_id=section.course_id,
+                    section_id=section.pk,
+                    title=f"Room {r}: {_phrase(rng, 2)}",
+                    description=_phrase(rng, 12),
+                    creator_id=section.creator_id,
+                    visibility=section.visibility,
+                )
+                for section in sections
+                for r in range(scale.rooms)
+            ],
+            batch_size=batch_size,
+        )
+        tasks = Task.objects.bulk_create(
+            [Task(room_id=room.pk, order=t) for room in rooms for t in range(scale.tasks)],
+            batch_size=batch_size,
+        )
+        # Rotating the types gives every task a different mix, and every type a row
+        counts["components"] += _bulk(
+            TaskComponent,
+            (
+                TaskComponent(
+                    task_id=task.pk,
+                    order=n,
+                    type=(kind := types[(i + n) % len(types)]),
+                    content=component_content(kind, rng),
+                )
+                for i, task in enumerate(tasks)
+                for n in range(scale.components)
+            ),
+            batch_size,
+        )
+        counts["task_tags"] += _bulk(
+            TaskTag,
+            (
+                TaskTag(task_id=task.pk, tag_id=tag.pk)
+                for task in tasks
+                for tag in rng.sample(tags, 2)
+            ),
+            batch_size,
+        )
+        task_ids.extend(task.pk for task in tasks)
+        counts["courses"] += len(courses)
+        counts["sections"] += len(sections)
+        counts["rooms"] += len(rooms)
+        counts["tasks"] += len(tasks)
+    return task_ids, counts
+
+
+def _progress(user_id, task_id, rng):
+    if rng.random() < INCOMPLETE_PROGRESS:
+        return ProgressOfTask(user_id=user_id, task_id=task_id, status=Status.INCOMP, attempts=rng.randint(1, 5))
+    return ProgressOfTask(user_id=user_id, task_id=task_id, status=Status.COMPLE, attempts=rng.randint(1, 3))
+
+
+def generate_progress(scale, user_ids, task_ids, rng, batch_size):
+    per_user = min(scale.progress, len(task_ids))
+    return {
+        "progress": _bulk(
+            ProgressOfTask,
+            (
+                _progress(user_id, task_id, rng)
+                for user_id in user_ids
+                for task_id in rng.sample(task_ids, per_user)
+            ),
+            batch_size,
+        )
+    }
+
+
+# --- 3. Dictionary ---
+
+def dictionary_records(count, rng):
+    """
+    Records for dictionary.bulk.import_records. Some repeat an earlier headword
+    (homographs), and most have a variant spelled with or without accents.
+    """
+    headwords = []
+    for i in range(count):
+        if headwords and rng.random() < HOMOGRAPHS:
+            headword = rng.choice(headwords[-1000:])
+        else:
+            headword = word(i + len(SYLLABLES))  # skips the one-syllable words
+            headwords.append(headword)
+        variant = accented_variant(headword, rng)
+        yield {
+            "headword": headword,
+            "variants": [{"text": variant, "sources": ["LA"]}] if variant else [],
+            "definitions": [
+                {
+                    "def_number": n,
+                    "gloss": _phrase(rng, rng.randint(1, 4)),
+                    "examples": f"{headword} {_phrase(rng, 3)}",
+                }
+                for n in range(1, rng.randint(1, 3) + 1)
+            ],
+            "parts_of_speech": [rng.choice(["n.", "v.", "adj.", "adv.", "int."])],
+            "sources": ["LA"],
+        }
+
+
+def generate_counters(batch_size):
+    containers, users = rebuild_progress(batch_size=batch_size)
+    return {"container_counters": containers, "user_counters": users}
+
+
+def generate_dictionary(scale, rng, batch_size):
+    entries = import_records(
+        dictionary_records(scale.entries, rng), batch_size=batch_size, history=HISTORY_SKIP
+    )
+    return {"entries": entries}
+
+
+# --- 4. Everything ---
+
+def generate(scale, batch_size=5000, seed=0, prefix="synthetic", log=None):
+    """
+    Writes a dataset of the given scale.
+
+    @param scale: A Scale (see PRESETS).
+    @param batch_size: Rows per insert; containers are generated this many
+                       tasks at a time.
+    @param seed: Seed of the random choices, for repeatable datasets.
+    @param prefix: Prefix of the usernames, badge titles and tag names, which
+                   must not be taken yet.
+    @param log: Optional callable, given a line after each step.
+    @return: The number of rows written, per kind.
+    """
+    rng = random.Random(seed)
+    counts = {}
+
+    def step(name, function, *args):
+        start = time.perf_counter()
+        result = function(*args)
+        rows = result[-1] if isinstance(result, tuple) else result
+        counts.update(rows)
+        if log is not None:
+            log(f"{name}: {sum(rows.values())} rows in {time.perf_counter() - start:.1f}s")
+        return result
+
+    user_ids, _ = step("users", generate_users, scale, prefix, rng, batch_size)
+    step("friendships", generate_friendships, scale, user_ids, rng, batch_size)
+    step("badges", generate_badges, scale, user_ids, prefix, rng, batch_size)
+    task_ids, _ = step("courses", generate_courses, scale, user_ids, prefix, rng, batch_size)
+    step("progress", generate_progress, scale, user_ids, task_ids, rng, batch_size)
+    # bulk_create sends no signals, so the counters are computed once here
+    step("progress counters", generate_counters, batch_size)
+    step("dictionary", generate_dictionary, scale, rng, batch_size)
+    leaderboards.invalidate_on_commit()
+    return counts
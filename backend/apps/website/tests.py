@@ -1,3 +1,981 @@
-from django.test import TestCase
+import io
+import random
+import tempfile
+from unittest import mock
+from django.core.exceptions import ImproperlyConfigured
+from auditlog.models import LogEntry
+from better_profanity import profanity
+from PIL import Image
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db.models import Count, F, Q
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from friendship.models import Friend
+from rest_framework.test import APIClient
+from .models import (
+    AccessLevel,
+    Badge,
+    ContainerLevel,
+    ContainerTaskCount,
+    Course,
+    MediaBlob,
+    ProgressOfTask,
+    Room,
+    Section,
+    Status,
+    Tag,
+    Task,
+    TaskComponent,
+    TaskComponentType,
+    UserBadge,
+    UserContainerProgress,
+    UserCourseAccessLevel,
+    UserRoomAccessLevel,
+    UserSectionAccessLevel,
+    VisibilityLevel,
+)
+from apps.accounts.streaks import rebuild_streaks
+from dictionary.models import Entry, Variant
+from heritage_project_backend.instrumentation import METRICS
+from . import leaderboards, progress, thumbnails
+from .censor import Censor
+from .permissions import get_effective_access_level, resolve_many, user_has_access
+from .serializers import BadgeSerializer
+from .storage import dedup_storage
 
-# Create your tests here.
+User = get_user_model()
+
+
+class WebsiteTestCase(TestCase):
+    def setUp(self):
+        self.creator = User.objects.create_user(username="creator", password="pass")
+        self.user = User.objects.create_user(username="learner", password="pass")
+
+        self.course = self.make(Course, visibility=VisibilityLevel.PRIVATE)
+        self.section = self.make(Section, course=self.course, visibility=VisibilityLevel.PRIVATE)
+        self.room = self.make_room(self.section)
+
+    def make(self, model, **fields):
+        return model.objects.create(
+            title=model.__name__, description="", creator=self.creator, **fields
+        )
+
+    def make_room(self, section, **fields):
+        fields.setdefault("visibility", VisibilityLevel.PRIVATE)
+        return self.make(Room, course=section.course, section=section, **fields)
+
+    def fresh(self, container):
+        # A new user object, as a new request would have
+        return get_effective_access_level(
+            container.__class__.objects.get(pk=container.pk),
+            User.objects.get(pk=self.user.pk),
+        )
+
+
+class AccessResolverTests(WebsiteTestCase):
+    def test_private_without_access(self):
+        self.assertIsNone(self.fresh(self.room))
+        self.assertFalse(user_has_access(self.room, self.user))
+
+    def test_access_is_inherited_from_parents(self):
+        UserCourseAccessLevel.objects.create(
+            user=self.user, course=self.course, access_level=AccessLevel.VISITOR
+        )
+        UserRoomAccessLevel.objects.create(
+            user=self.user, room=self.room, access_level=AccessLevel.EDITOR
+        )
+        self.assertEqual(self.fresh(self.course), AccessLevel.VISITOR)
+        self.assertEqual(self.fresh(self.section), AccessLevel.VISITOR)
+        self.assertEqual(self.fresh(self.room), AccessLevel.EDITOR)
+
+        UserSectionAccessLevel.objects.create(
+            user=self.user, section=self.section, access_level=AccessLevel.EDITOR
+        )
+        other_room = self.make_room(self.section)
+        self.assertEqual(self.fresh(other_room), AccessLevel.EDITOR)
+
+    def test_public_and_creator(self):
+        public_room = self.make_room(self.section, visibility=VisibilityLevel.PUBLIC)
+        self.assertEqual(self.fresh(public_room), AccessLevel.VISITOR)
+        self.assertFalse(user_has_access(public_room, self.user, edit=True))
+
+        self.course.creator = self.user
+        self.course.save()
+        self.assertEqual(self.fresh(self.room), AccessLevel.EDITOR)
+
+    def test_staff_and_anonymous(self):
+        self.user.is_staff = True
+        self.user.save()
+        self.assertEqual(self.fresh(self.room), AccessLevel.EDITOR)
+        self.assertIsNone(get_effective_access_level(self.room, AnonymousUser()))
+
+    def test_first_access_row_wins(self):
+        # Rows saved with the label rather than the value rank below VISITOR
+        UserCourseAccessLevel.objects.create(user=self.user, course=self.course, access_level="EDITOR")
+        UserCourseAccessLevel.objects.create(
+            user=self.user, course=self.course, access_level=AccessLevel.EDITOR
+        )
+        self.assertEqual(self.fresh(self.room), "EDITOR")
+        self.assertFalse(user_has_access(self.room, self.user))
+
+    def test_resolve_many_batches_queries(self):
+        other_section = self.make(Section, course=self.course, visibility=VisibilityLevel.PRIVATE)
+        rooms = [self.make_room(s) for s in (self.section, other_section) for _ in range(3)]
+        UserSectionAccessLevel.objects.create(
+            user=self.user, section=other_section, access_level=AccessLevel.VISITOR
+        )
+
+        user = User.objects.get(pk=self.user.pk)
+        rooms = list(Room.objects.filter(pk__in=[r.pk for r in rooms]).order_by("pk"))
+        with self.assertNumQueries(2):
+            levels = resolve_many(user, rooms)
+        self.assertEqual(levels, [None] * 3 + [AccessLevel.VISITOR] * 3)
+
+        # Memoized for the rest of the request ...
+        with self.assertNumQueries(0):
+            self.assertTrue(user_has_access(rooms[-1], user))
+
+        # ... until access changes
+        UserCourseAccessLevel.objects.create(
+            user=self.user, course=self.course, access_level=AccessLevel.VISITOR
+        )
+        self.assertTrue(user_has_access(rooms[0], user))
+
+
+class FilterByUserAccessTests(WebsiteTestCase):
+    def test_hierarchy_and_access_rows(self):
+        published = self.make(Course, visibility=VisibilityLevel.PUBLIC, is_published=True)
+        open_section = self.make(
+            Section, course=published, visibility=VisibilityLevel.PUBLIC, is_published=True
+        )
+        open_room = self.make_room(open_section, visibility=VisibilityLevel.PUBLIC, is_published=True)
+        self.make_room(open_section)  # private, no access row
+
+        self.assertEqual(list(Course.objects.filter_by_user_access(self.user)), [published])
+        self.assertEqual(list(Room.objects.filter_by_user_access(self.user)), [open_room])
+
+        # Several access rows must not duplicate the container
+        for _ in range(2):
+            UserCourseAccessLevel.objects.create(user=self.user, course=self.course)
+            UserSectionAccessLevel.objects.create(user=self.user, section=self.section)
+            UserRoomAccessLevel.objects.create(user=self.user, room=self.room)
+        rooms = Room.objects.filter_by_user_access(self.user).order_by("pk")
+        self.assertEqual(list(rooms), [self.room, open_room])
+        self.assertNotIn("DISTINCT", str(rooms.query))
+
+
+class ProgressCounterTests(WebsiteTestCase):
+    def setUp(self):
+        super().setUp()
+        self.other_room = self.make_room(self.section)
+        self.tasks = [Task.objects.create(room=room) for room in (self.room, self.room, self.other_room)]
+
+    def complete(self, task, user=None, status=Status.COMPLE):
+        return ProgressOfTask.objects.create(user=user or self.user, task=task, status=status)
+
+    def joined_counts(self, model, path):
+        # What user_progress_percent counted before the counters existed
+        return {
+            c.pk: (c.total_tasks, c.completed_tasks)
+            for c in model.objects.annotate(
+                total_tasks=Count(path, distinct=True),
+                completed_tasks=Count(
+                    f"{path}__progressoftask",
+                    filter=Q(
+                        **{
+                            f"{path}__progressoftask__user": self.user,
+                            f"{path}__progressoftask__status": Status.COMPLE,
+                        }
+                    ),
+                    distinct=True,
+                ),
+            )
+        }
+
+    def assertCountsMatchJoins(self):
+        for model, path in (
+            (Course, "sections__rooms__tasks"),
+            (Section, "rooms__tasks"),
+            (Room, "tasks"),
+        ):
+            counted = {
+                c.pk: (c.total_tasks, c.completed_tasks)
+                for c in model.objects.user_progress_percent(self.user)
+            }
+            self.assertEqual(counted, self.joined_counts(model, path), model.__name__)
+
+    def test_counters_follow_tasks_and_progress(self):
+        self.assertCountsMatchJoins()
+        progress = self.complete(self.tasks[0])
+        self.complete(self.tasks[2], status=Status.INCOMP)
+        self.assertCountsMatchJoins()
+
+        room = Room.objects.user_progress_percent(self.user).get(pk=self.room.pk)
+        self.assertEqual((room.completed_tasks, room.total_tasks, room.progress_percent), (1, 2, 50.0))
+
+        progress.status = Status.INCOMP
+        progress.save()
+
+        self.assertCountsMatchJoins()
+        progress.status = Status.COMPLE
+        progress.save()
+
+        self.tasks[0].delete()  # cascades to its progress
+        self.assertCountsMatchJoins()
+        self.other_room.delete()
+        self.assertCountsMatchJoins()
+        self.assertFalse(
+            ContainerTaskCount.objects.filter(container_id=self.other_room.pk, level="ROOM").exists()
+        )
+
+    def test_moving_a_task_recounts_both_rooms(self):
+        self.complete(self.tasks[0])
+        other_section = self.make(Section, course=self.course)
+        moved_room = self.make_room(other_section)
+
+        task = Task.objects.get(pk=self.tasks[0].pk)
+        task.room = moved_room
+        task.save()
+        self.assertCountsMatchJoins()
+
+        moved_room.section = self.section
+        moved_room.save()
+        self.assertCountsMatchJoins()
+
+    def test_completed_courses(self):
+        def joined():
+            return (
+                Course.objects.filter_by_user_access(self.user)
+                .user_progress_percent(self.user)
+                .filter(progress_percent=100)
+                .count()
+            )
+
+        UserCourseAccessLevel.objects.create(
+            user=self.user, course=self.course, access_level=AccessLevel.VISITOR
+        )
+        for task in self.tasks[:2]:
+            self.complete(task)
+        with self.assertNumQueries(1):
+            self.assertEqual(progress.completed_courses(self.user), 0)
+
+        self.complete(self.tasks[2])
+        self.assertEqual(progress.completed_courses(self.user), joined())
+        self.assertEqual(progress.completed_courses(self.user), 1)
+
+        # Only courses the user can still view count
+        UserCourseAccessLevel.objects.filter(user=self.user).delete()
+        self.assertEqual(progress.completed_courses(self.user), joined())
+        self.assertEqual(progress.completed_courses(self.user), 0)
+
+    def test_rebuild(self):
+        self.complete(self.tasks[1])
+        self.complete(self.tasks[2])
+        ContainerTaskCount.objects.all().delete()
+        UserContainerProgress.objects.update(completed_tasks=0)
+
+        out = io.StringIO()
+        call_command("rebuild_progress", stdout=out)
+        self.assertIn("Wrote 4 container counters and 4 user counters.", out.getvalue())
+        self.assertCountsMatchJoins()
+
+
+class UpdateTaskProgressTests(WebsiteTestCase):
+    def setUp(self):
+        super().setUp()
+        self.tasks = [Task.objects.create(room=self.room) for _ in range(2)]
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def answer(self, task, **data):
+        return self.client.put(
+            f"/website/tasks/{task.pk}/update_progress/", data, format="json"
+        )
+
+    def test_completion_flags(self):
+        response = self.answer(self.tasks[0], status=Status.COMPLE, attempts=1)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["status"], Status.COMPLE)
+        self.assertFalse(response.data["room_completed"])
+
+        # Completing the last task completes the room and everything above it
+        response = self.answer(self.tasks[1], status=Status.COMPLE)
+        self.assertTrue(
+            response.data["room_completed"]
+            and response.data["section_completed"]
+            and response.data["course_completed"]
+        )
+
+        # Answering again updates the same row
+        response = self.answer(self.tasks[1], status=Status.INCOMP, attempts=3)
+        self.assertFalse(response.data["course_completed"])
+        self.assertEqual(ProgressOfTask.objects.filter(user=self.user).count(), 2)
+        self.assertEqual(ProgressOfTask.objects.get(task=self.tasks[1]).attempts, 3)
+
+    def test_invalid_status(self):
+        response = self.answer(self.tasks[0], status="DONE")
+        self.assertEqual(response.status_code, 400)
+
+    def test_query_count(self):
+        self.answer(self.tasks[0], status=Status.COMPLE)
+        self.answer(self.tasks[0], status=Status.INCOMP)
+        # Task with room and section, locked row, update, one counter update
+        # and the completion read, plus two savepoints
+        with self.assertNumQueries(9):
+            self.answer(self.tasks[0], status=Status.COMPLE)
+
+
+class BulkProgressTests(WebsiteTestCase):
+    url = "/website/tasks/update_progress/"
+
+    def setUp(self):
+        super().setUp()
+        UserSectionAccessLevel.objects.create(user=self.user, section=self.section)
+        self.other_room = self.make_room(self.section)
+        self.tasks = [
+            Task.objects.create(room=room) for room in (self.room, self.room, self.other_room)
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def submit(self, *updates):
+        return self.client.post(self.url, {"updates": list(updates)}, format="json")
+
+    def test_upserts_and_reports_deltas(self):
+        ProgressOfTask.objects.create(
+            user=self.user, task=self.tasks[0], status=Status.INCOMP, attempts=2, metadata={"a": 1}
+        )
+        response = self.submit(
+            {"task_id": self.tasks[0].pk, "status": Status.COMPLE},
+            {"task_id": self.tasks[1].pk, "status": Status.INCOMP},
+            {"task_id": self.tasks[1].pk, "status": Status.COMPLE, "attempts": 1},
+            {"task_id": self.tasks[2].pk, "attempts": 4},
+        )
+        self.assertEqual(response.status_code, 200)
+
+        rows = {p.task_id: p for p in ProgressOfTask.objects.filter(user=self.user)}
+        self.assertEqual(len(rows), 3)
+        self.assertEqual((rows[self.tasks[0].pk].attempts, rows[self.tasks[0].pk].metadata), (2, {"a": 1}))
+        self.assertEqual(rows[self.tasks[1].pk].status, Status.COMPLE)
+        self.assertEqual(rows[self.tasks[2].pk].status, Status.NOSTAR)
+
+        containers = {(c["level"], c["container_id"]): c for c in response.data["containers"]}
+        room = containers[("ROOM", self.room.pk)]
+        self.assertEqual((room["completed_delta"], room["total_tasks"]), (2, 2))
+        self.assertTrue(room["newly_completed"])
+        course = containers[("COURSE", self.course.pk)]
+        self.assertEqual((course["completed_tasks"], course["completed"]), (2, False))
+
+        # The counters agree with a full recount
+        course = Course.objects.user_progress_percent(self.user).get(pk=self.course.pk)
+        self.assertEqual((course.completed_tasks, course.total_tasks), (2, 3))
+
+    def test_rejects_whole_batch(self):
+        private_room = self.make_room(
+            self.make(Section, course=self.course, visibility=VisibilityLevel.PRIVATE)
+        )
+        hidden = Task.objects.create(room=private_room)
+        response = self.submit(
+            {"task_id": self.tasks[0].pk, "status": Status.COMPLE},
+            {"task_id": hidden.pk, "status": Status.COMPLE},
+        )
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(ProgressOfTask.objects.exists())
+
+        response = self.submit({"task_id": 999999, "status": Status.COMPLE})
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(self.submit().status_code, 400)
+
+
+class CensorTests(WebsiteTestCase):
+    TEXTS = [
+        "",
+        "a",
+        "   ",
+        "A perfectly clean title",
+        "what the fuck is this",
+        "f u c k",
+        "sh1t happens, @ss",
+        "hand_job and hand job and hand-job",
+        "FuCk!!! shit... ",
+        "Scunthorpe classic assignment",
+        "naïve b!tch über bitch",
+        "XXXX already censored",
+    ]
+
+    def test_same_output_as_better_profanity(self):
+        censor = Censor(profanity)
+        for text in self.TEXTS:
+            for censor_char in ("X", "*"):
+                with self.subTest(text=text, censor_char=censor_char):
+                    self.assertEqual(
+                        censor.censor(text, censor_char), profanity.censor(text, censor_char)
+                    )
+
+    def test_censors_on_save(self):
+        room = Room.objects.get(pk=self.room.pk)
+        room.title, room.description = "shit room", "fuck"
+        room.save()
+        room.refresh_from_db()
+        self.assertEqual((room.title, room.description), ("XXXX room", "XXXX"))
+
+    def test_unchanged_fields_are_not_censored_again(self):
+        room = Room.objects.get(pk=self.room.pk)
+        with mock.patch("apps.website.models.censor_with_xxxx", side_effect=lambda t: t) as censor:
+            room.can_edit = False
+            room.save()
+            censor.assert_not_called()
+
+            room.description = "changed"
+            room.save()
+            censor.assert_called_once_with("changed")
+
+            room.title = "changed too"
+            room.save(update_fields=["can_edit"])
+            censor.assert_called_once()
+
+
+class SaveRoomTests(WebsiteTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(self.creator)
+
+    def save(self, tasks, **fields):
+        return self.client.patch(
+            f"/website/rooms/{self.room.pk}/save/", {"tasks": tasks, **fields}, format="json"
+        )
+
+    def stored(self):
+        return [
+            (
+                [tag.name for tag in task.tags.order_by("name")],
+                [(c.type, c.content) for c in task.components.order_by("order")],
+            )
+            for task in Task.objects.filter(room=self.room).order_by("order")
+        ]
+
+    def payload(self):
+        return [
+            {
+                "task_id": task.pk,
+                "tags": [tag.name for tag in task.tags.all()],
+                "components": [
+                    {"task_component_id": c.pk, "type": c.type, "content": c.content}
+                    for c in task.components.order_by("order")
+                ],
+            }
+            for task in Task.objects.filter(room=self.room).order_by("order")
+        ]
+
+    def test_diff(self):
+        response = self.save(
+            [
+                {"tags": ["a", "b"], "components": [{"type": "TEXT", "content": {"text": "one"}}]},
+                {"tags": [], "components": [
+                    {"type": "TEXT", "content": {"text": "two"}},
+                    {"type": "OPTION", "content": {"text": "three"}},
+                ]},
+            ],
+            title="Renamed",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Room.objects.get(pk=self.room.pk).title, "Renamed")
+        self.assertEqual(
+            self.stored(),
+            [
+                (["a", "b"], [("TEXT", {"text": "one"})]),
+                ([], [("TEXT", {"text": "two"}), ("OPTION", {"text": "three"})]),
+            ],
+        )
+
+        # Swap the tasks, drop a component and a tag, edit and add others
+        first, second = self.payload()
+        second["components"] = second["components"][1:]
+        second["components"][0]["content"] = {"text": "edited"}
+        second["components"].append({"type": "FILL", "content": {"text": "new"}})
+        first["tags"] = ["b", "c"]
+        self.assertEqual(self.save([second, first]).status_code, 200)
+        self.assertEqual(
+            self.stored(),
+            [
+                ([], [("OPTION", {"text": "edited"}), ("FILL", {"text": "new"})]),
+                (["b", "c"], [("TEXT", {"text": "one"})]),
+            ],
+        )
+        self.assertEqual(TaskComponent.objects.count(), 3)
+
+        # Tasks left out are deleted, with their progress
+        ProgressOfTask.objects.create(user=self.user, task_id=second["task_id"], status=Status.COMPLE)
+        self.assertEqual(self.save([first]).status_code, 200)
+        self.assertEqual(self.stored(), [(["b", "c"], [("TEXT", {"text": "one"})])])
+        room = Room.objects.user_progress_percent(self.user).get(pk=self.room.pk)
+        self.assertEqual((room.total_tasks, room.completed_tasks), (1, 0))
+
+    def test_invalid_component_changes_nothing(self):
+        self.save([{"components": [{"type": "TEXT", "content": "kept"}]}])
+        response = self.save([{"components": [{"type": "NOPE"}]}])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.stored(), [([], [("TEXT", "kept")])])
+
+    def test_string_ids_keep_tasks_and_progress(self):
+        self.save([{"components": [{"type": "TEXT", "content": "kept"}]}] * 2)
+        tasks = list(Task.objects.filter(room=self.room).order_by("order"))
+        for task in tasks:
+            ProgressOfTask.objects.create(user=self.user, task=task, status=Status.COMPLE)
+
+        payload = self.payload()
+        for task in payload:
+            task["task_id"] = str(task["task_id"])
+            for comp in task["components"]:
+                comp["task_component_id"] = str(comp["task_component_id"])
+        self.assertEqual(self.save(payload).status_code, 200)
+        self.assertEqual(list(Task.objects.filter(room=self.room).order_by("order")), tasks)
+        self.assertEqual(TaskComponent.objects.filter(task__room=self.room).count(), 2)
+        self.assertEqual(ProgressOfTask.objects.filter(task__in=tasks).count(), 2)
+
+        for bad in ([1], "one", True):
+            payload[0]["task_id"] = bad
+            self.assertEqual(self.save(payload).status_code, 400)
+        self.assertEqual(list(Task.objects.filter(room=self.room).order_by("order")), tasks)
+
+    def test_unchanged_save_is_constant_queries(self):
+        tasks = [
+            {"tags": ["t"], "components": [{"type": "TEXT", "content": {"n": i}}] * 3}
+            for i in range(20)
+        ]
+        # Room, access, tasks, components, task tags, tags, room update, savepoints
+        for count in (10, 20):
+            self.save(tasks[:count])
+            payload = self.payload()
+            with self.assertNumQueries(9):
+                self.save(payload)
+
+
+class RoomReadQueryTests(WebsiteTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(self.creator)
+        self.tags = [Tag.objects.create(name=f"tag{i}") for i in range(3)]
+
+    def add_tasks(self, room, count):
+        for _ in range(count):
+            task = Task.objects.create(room=room)
+            task.tags.set(self.tags)
+            for kind in ("TEXT", "OPTION"):
+                TaskComponent.objects.create(task=task, type=kind, content={"text": kind})
+
+    def assertConstantQueries(self, url, room):
+        self.add_tasks(room, 1)
+        self.client.get(url)  # warms the per-user access memo
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(url)
+
+        self.add_tasks(room, 5)
+        with self.assertNumQueries(len(small.captured_queries)):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_get_room(self):
+        response = self.assertConstantQueries(f"/website/rooms/{self.room.pk}/", self.room)
+        self.assertEqual(len(response.data["tasks"]), 6)
+        self.assertEqual(response.data["tasks"][0]["tags"], ["tag0", "tag1", "tag2"])
+        self.assertEqual(len(response.data["tasks"][0]["components"]), 2)
+
+    def test_get_rooms(self):
+        self.make_room(self.section)
+        response = self.assertConstantQueries(f"/website/sections/{self.section.pk}/rooms/", self.room)
+        self.assertEqual(response.data[0]["total_tasks"], 6)
+
+
+class MediaTestCase(WebsiteTestCase):
+    def setUp(self):
+        super().setUp()
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings = override_settings(MEDIA_ROOT=media.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        cache.clear()
+
+    def upload(self, colour="red"):
+        buffer = io.BytesIO()
+        Image.new("RGBA", (1200, 800), colour).save(buffer, format="PNG")
+        return SimpleUploadedFile("tile.png", buffer.getvalue(), content_type="image/png")
+
+
+class ImageVariantTests(MediaTestCase):
+    def variants(self, badge):
+        return BadgeSerializer(Badge.objects.get(pk=badge.pk)).data["image_variants"]
+
+    def test_rendered_on_first_request(self):
+        badge = Badge.objects.create(title="Tile", image=self.upload())
+        url = self.variants(badge)["thumb"]["webp"]
+        self.assertTrue(url.startswith("/website/images/thumb/webp/?name="))
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 302)
+        digest = thumbnails.ensure_variants(badge.image.name)
+        self.assertEqual(
+            response["Location"],
+            default_storage.url(thumbnails.variant_name(digest, "thumb", "webp")),
+        )
+        with default_storage.open(thumbnails.variant_name(digest, "thumb", "jpeg")) as f:
+            image = Image.open(f)
+            self.assertEqual((image.format, image.size), ("JPEG", (160, 107)))
+
+        # Served straight from storage from now on
+        self.assertEqual(self.variants(badge)["thumb"]["webp"], response["Location"])
+
+    def test_shared_by_content(self):
+        first = Badge.objects.create(title="First", image=self.upload())
+        # Stored before uploads were deduplicated
+        legacy = default_storage.save("Images/legacy.png", self.upload())
+        second = Badge.objects.create(title="Second", image=legacy)
+        other = Badge.objects.create(title="Other", image=self.upload("blue"))
+        self.assertNotEqual(first.image.name, second.image.name)
+        digests = [thumbnails.ensure_variants(b.image.name) for b in (first, second, other)]
+        self.assertEqual(digests[0], digests[1])
+        self.assertNotEqual(digests[0], digests[2])
+
+    def test_unknown(self):
+        badge = Badge.objects.create(title="Tile", image=self.upload())
+        for url in (
+            f"/website/images/huge/webp/?name={badge.image.name}",
+            f"/website/images/thumb/gif/?name={badge.image.name}",
+            "/website/images/thumb/webp/?name=Images/missing.png",
+            "/website/images/thumb/webp/?name=../settings.py",
+        ):
+            self.assertEqual(self.client.get(url).status_code, 404, url)
+
+
+class MediaBlobTests(MediaTestCase):
+    def blob(self, name):
+        return MediaBlob.objects.filter(file=name).values_list("refcount", flat=True).first()
+
+    def test_stored_once(self):
+        first = Badge.objects.create(title="First", image=self.upload())
+        second = Badge.objects.create(title="Second", image=self.upload())
+        name = first.image.name
+        self.assertEqual(second.image.name, name)
+        self.assertRegex(name, r"^Images/[0-9a-f]{64}\.png$")
+        self.assertEqual(len(default_storage.listdir("Images")[1]), 1)
+        self.assertEqual(self.blob(name), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertEqual(self.blob(name), 1)
+        self.assertTrue(default_storage.exists(name))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Badge.objects.get(pk=second.pk).delete()
+        self.assertIsNone(self.blob(name))
+        self.assertFalse(default_storage.exists(name))
+
+    def test_replaced(self):
+        self.course.image = self.upload()
+        self.course.save()
+        old = self.course.image.name
+
+        course = Course.objects.get(pk=self.course.pk)
+        course.image = self.upload("blue")
+        with self.captureOnCommitCallbacks(execute=True):
+            course.save()
+        self.assertEqual(self.blob(course.image.name), 1)
+        self.assertIsNone(self.blob(old))
+        self.assertFalse(default_storage.exists(old))
+
+        # Saving again without changing the image counts nothing
+        Course.objects.get(pk=course.pk).save()
+        self.assertEqual(self.blob(course.image.name), 1)
+
+    def test_uploaded_again_before_deletion(self):
+        badge = Badge.objects.create(title="First", image=self.upload())
+        name = badge.image.name
+        with self.captureOnCommitCallbacks() as callbacks:
+            badge.delete()
+        # The same picture is stored before the released blob is deleted, and
+        # its reference counted after
+        self.assertEqual(dedup_storage.save("Images/tile.png", self.upload()), name)
+        for callback in callbacks:
+            callback()
+        second = Badge.objects.create(title="Second", image=name)
+        self.assertTrue(default_storage.exists(name))
+        self.assertEqual(self.blob(name), 1)
+
+        # Once deleted, it is written again
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(default_storage.exists(name))
+        Badge.objects.create(title="Third", image=self.upload())
+        self.assertTrue(default_storage.exists(name))
+        self.assertEqual(self.blob(name), 1)
+
+    def test_rebuild(self):
+        badge = Badge.objects.create(title="First", image=self.upload())
+        Course.objects.filter(pk=self.course.pk).update(image=badge.image.name)
+        orphan = default_storage.save("Images/" + "0" * 64 + ".png", self.upload())
+        MediaBlob.objects.create(file=orphan, refcount=3)
+
+        out = io.StringIO()
+        call_command("rebuild_media_refcounts", stdout=out)
+        self.assertIn("1 blobs referenced, 1 unused blobs deleted", out.getvalue())
+        self.assertEqual(self.blob(badge.image.name), 2)
+        self.assertFalse(default_storage.exists(orphan))
+
+
+class InstrumentationTests(WebsiteTestCase):
+    def setUp(self):
+        super().setUp()
+        METRICS.reset()
+        self.client = APIClient()
+        self.client.force_authenticate(self.creator)
+        self.url = f"/website/rooms/{self.room.pk}/"
+
+    def test_server_timing(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        timing = response["Server-Timing"]
+        self.assertRegex(timing, r"^total;dur=[\d.]+, db;dur=[\d.]+;desc=\"\d+ queries\", serializer;dur=[\d.]+$")
+        self.assertIn(f'"{len(queries)} queries"', timing)
+
+    def test_metrics_endpoint(self):
+        self.client.get(self.url)
+        self.client.get(self.url)
+        self.assertEqual(self.client.get("/api/metrics/").status_code, 403)
+
+        self.creator.is_staff = True
+        self.creator.save()
+        metrics = self.client.get("/api/metrics/").data["endpoints"]
+        room = metrics["website/rooms/<int:room_id>/"]
+        self.assertEqual((room["count"], room["statuses"]), (2, {200: 2}))
+        self.assertEqual(room["wall_ms"]["buckets"]["+Inf"], 2)
+        self.assertGreater(room["queries"]["sum"], 0)
+        self.assertGreater(room["response_bytes"]["max"], 0)
+
+    @override_settings(SLOW_REQUEST_MS=0, SLOW_REQUEST_TOP_SQL=2)
+    def test_slow_request_log(self):
+        with self.assertLogs("heritage_project_backend.slow_requests", "WARNING") as logs:
+            self.client.get(self.url)
+        message = logs.output[0]
+        self.assertIn(f"GET {self.url} (website/rooms/<int:room_id>/)", message)
+        self.assertEqual(message.count("ms SELECT"), 2)
+
+
+class LeaderboardTests(WebsiteTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.badges = [Badge.objects.create(title=f"Badge {i}") for i in range(3)]
+
+    def award(self, user, count):
+        with self.captureOnCommitCallbacks(execute=True):
+            for badge in self.badges[:count]:
+                UserBadge.objects.create(user=user, badge=badge)
+
+    def test_sorted_set(self):
+        rng = random.Random(0)
+        board = leaderboards.SortedSet("test", block_size=4)
+        board.replace({1: 5, 2: 0, 3: 7})
+        expected = {1: 5, 3: 7}
+        for _ in range(300):
+            changes = {rng.randrange(40): rng.randrange(-2, 10) for _ in range(rng.randint(1, 5))}
+            board.update(changes)
+            for member, score in changes.items():
+                if score > 0:
+                    expected[member] = score
+                else:
+                    expected.pop(member, None)
+
+        ranked = sorted(expected.items(), key=lambda item: (-item[1], item[0]))
+        self.assertEqual(len(board), len(ranked))
+        self.assertEqual(
+            board.range(0, 100),
+            [(i, member, score) for i, (member, score) in enumerate(ranked, start=1)],
+        )
+        self.assertEqual(board.range(5, 3), board.range(0, 100)[5:8])
+        for i, (member, score) in enumerate(ranked, start=1):
+            self.assertEqual(board.rank(member), (i, score))
+        self.assertEqual(board.rank(1000), (None, 0))
+        self.assertGreater(len(board.meta()["blocks"]), 2)
+
+    def test_badges(self):
+        self.award(self.creator, 1)
+        self.assertEqual(leaderboards.top("badges"), [(1, self.creator.pk, 1)])
+
+        # Built once; later awards only re-score their users
+        self.award(self.user, 3)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(
+                leaderboards.top("badges"), [(1, self.user.pk, 3), (2, self.creator.pk, 1)]
+            )
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(leaderboards.rank("badges", self.creator.pk), (2, 1))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            UserBadge.objects.filter(user=self.user).delete()
+        self.assertEqual(leaderboards.top("badges"), [(1, self.creator.pk, 1)])
+        self.assertEqual(leaderboards.rank("badges", self.user.pk), (None, 0))
+
+    def test_completed_courses(self):
+        tasks = [Task.objects.create(room=self.room) for _ in range(2)]
+        self.assertEqual(leaderboards.score("courses", self.user.pk), 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            for task in tasks:
+                ProgressOfTask.objects.create(user=self.user, task=task, status=Status.COMPLE)
+        self.assertEqual(leaderboards.score("courses", self.user.pk), 1)
+
+        # A new task un-completes the course for everyone
+        with self.captureOnCommitCallbacks(execute=True):
+            Task.objects.create(room=self.room)
+        self.assertEqual(leaderboards.top("courses"), [])
+
+    def test_streaks(self):
+        from apps.accounts.streaks import record_activity
+
+        with self.captureOnCommitCallbacks(execute=True):
+            record_activity(self.user)
+        self.assertEqual(leaderboards.rank("streak", self.user.pk), (1, 1))
+        self.assertEqual(leaderboards.rank("longest_streak", self.user.pk), (1, 1))
+
+    def test_rebuilt_after_eviction(self):
+        self.award(self.user, 2)
+        leaderboards.top("badges")
+        board = leaderboards.SortedSet("badges")
+        cache.delete(board._block_key(board.meta(), 0))
+        self.assertEqual(leaderboards.top("badges"), [(1, self.user.pk, 2)])
+
+    @mock.patch.object(leaderboards, "LOCK_WAIT", 0)
+    def test_held_lock(self):
+        self.award(self.user, 2)
+        leaderboards.top("badges")
+        board = leaderboards.SortedSet("badges")
+        self.award(self.creator, 1)
+        cache.add(f"{board.prefix}:lock", "elsewhere", 60)
+
+        # Served as it is while the dirty user waits for the lock
+        self.assertEqual(leaderboards.top("badges"), [(1, self.user.pk, 2)])
+
+        # A change that can't be marked drops the board; with nothing to
+        # serve, nothing is written and the read gives up
+        with self.assertLogs("apps.website.leaderboards", "WARNING"):
+            with self.captureOnCommitCallbacks(execute=True):
+                UserBadge.objects.create(user=self.creator, badge=self.badges[2])
+            with self.assertRaises(leaderboards.Busy):
+                leaderboards.top("badges")
+            self.assertEqual(self.client.get("/website/leaderboards/badges/").status_code, 503)
+        self.assertIsNone(board.meta())
+
+        cache.delete(f"{board.prefix}:lock")
+        self.assertEqual(
+            {(user_id, score) for _, user_id, score in leaderboards.top("badges")},
+            {(self.user.pk, 2), (self.creator.pk, 2)},
+        )
+
+    def test_cache_check(self):
+        with self.assertRaises(ImproperlyConfigured):
+            leaderboards.check_cache()
+        with override_settings(DEBUG=True):
+            leaderboards.check_cache()
+        db_cache = {"default": {"BACKEND": "django.core.cache.backends.db.DatabaseCache", "LOCATION": "cache"}}
+        with override_settings(CACHES=db_cache):
+            leaderboards.check_cache()
+
+    def test_endpoints(self):
+        self.award(self.user, 1)
+        self.award(self.creator, 2)
+        response = self.client.get("/website/leaderboards/badges/?limit=1")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["total"], 2)
+        self.assertEqual(
+            [(e["rank"], e["username"], e["score"]) for e in response.data["results"]],
+            [(1, "creator", 2)],
+        )
+        self.assertEqual(response.data["me"], {"rank": 2, "score": 1})
+
+        response = self.client.get("/website/leaderboards/badges/friends/")
+        self.assertEqual([e["username"] for e in response.data["results"]], ["learner"])
+        Friend.objects.create(from_user=self.creator, to_user=self.user)
+        Friend.objects.create(from_user=self.user, to_user=self.creator)
+        response = self.client.get("/website/leaderboards/badges/friends/")
+        self.assertEqual([e["username"] for e in response.data["results"]], ["creator", "learner"])
+        self.assertEqual(response.data["me"], {"rank": 2, "score": 1})
+
+        self.assertEqual(self.client.get("/website/leaderboards/nope/").status_code, 404)
+        self.assertEqual(self.client.get("/website/leaderboards/badges/?limit=x").status_code, 400)
+
+
+class GenerateDataTests(TestCase):
+    def generate(self, *args):
+        call_command(
+            "generate_data",
+            "--scale=small",
+            "--courses=2",
+            "--users=12",
+            "--entries=300",
+            *args,
+            stdout=io.StringIO(),
+        )
+
+    def test_dataset(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.generate()
+
+        self.assertEqual(Course.objects.count(), 2)
+        self.assertEqual(Task.objects.count(), 2 * 2 * 2 * 5)
+        self.assertEqual(set(TaskComponent.objects.values_list("type", flat=True)), set(TaskComponentType.values))
+        for task in Task.objects.prefetch_related("components"):
+            self.assertEqual([c.order for c in task.components.all()], [0, 1, 2])
+
+        users = User.objects.filter(username__startswith="synthetic")
+        self.assertEqual(users.count(), 12)
+        self.assertTrue(users.filter(streak__gt=0).exists())
+        self.assertFalse(users.filter(longest_streak__lt=F("streak")).exists())
+        # The streak columns follow from the generated activity log
+        columns = list(users.order_by("id").values_list("streak", "longest_streak", "last_activity"))
+        rebuild_streaks()
+        self.assertEqual(list(users.order_by("id").values_list("streak", "longest_streak", "last_activity")), columns)
+        friends = set(Friend.objects.values_list("from_user_id", "to_user_id"))
+        self.assertTrue(friends)
+        self.assertEqual(friends, {(b, a) for a, b in friends})
+        self.assertTrue(UserBadge.objects.exists())
+        self.assertEqual(ProgressOfTask.objects.count(), 12 * 20)
+
+        headwords = list(Entry.objects.values_list("headword", flat=True))
+        self.assertEqual(len(headwords), 300)
+        self.assertLess(len(set(headwords)), len(headwords))
+        self.assertTrue(Variant.objects.exclude(text=F("entry__headword")).exists())
+
+        # Bulk inserts only, with the counters rebuilt once afterwards
+        self.assertLess(len(queries), 200)
+        course = Course.objects.first()
+        self.assertEqual(
+            ContainerTaskCount.objects.get(level=ContainerLevel.COURSE, container_id=course.pk).total_tasks, 20
+        )
+        self.assertFalse(LogEntry.objects.exists())
+        self.assertFalse(Entry.history.exists())
+
+    def test_same_seed_same_dataset(self):
+        self.generate()
+        first = list(TaskComponent.objects.order_by("id").values_list("type", "content"))
+        Course.objects.all().delete()
+        self.generate("--prefix=again")
+        self.assertEqual(list(TaskComponent.objects.order_by("id").values_list("type", "content")), first)
+
+    def test_prefix_taken(self):
+        self.generate()
+        with self.assertRaises(CommandError):
+            self.generate()
@@ -0,0 +1,145 @@
+import hashlib
+import io
+import os
+from PIL import Image, ImageOps, UnidentifiedImageError
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.urls import reverse
+from django.utils.http import urlencode
+from .storage import is_blob
+
+# Resized variants of uploaded images (badge, course, section and room images,
+# profile pictures) for pages that show them small.
+#
+# Variants are stored in default_storage under the hash of the original's
+# content, so an upload shared by several objects (or uploaded twice) is only
+# resized once, and a variant's key always matches its content. Once all the
+# variants of an image are stored, its hash is cached and variant_urls()
+# returns their storage URLs directly; until then it returns the URL of the
+# image_variant view, which renders them on the first request and redirects.
+
+# Variant name -> longest side in pixels; overridable with settings.IMAGE_VARIANTS
+DEFAULT_VARIANTS = {"thumb": 160, "medium": 480}
+
+# Format -> (PIL format, extension, save options); WebP first, JPEG for the rest
+FORMATS = {
+    "webp": ("WEBP", "webp", {"quality": 80, "method": 4}),
+    "jpeg": ("JPEG", "jpg", {"quality": 80, "optimize": True, "progressive": True}),
+}
+
+# No model references the variants, so django_unused_media's cleanup should
+# be run with --exclude "variants/*"
+VARIANT_DIR = "variants"
+
+# Only uploads and generated avatars get variants
+SOURCE_DIRS = ("Images/", "default_avatars/")
+
+# How long the hash of a name is trusted. Storage doesn't overwrite names, but
+# a name freed by deleting unused media can be taken by a new upload.
+HASH_TIMEOUT = 60 * 60 * 24
+
+
+class VariantError(ValueError):
+    """The requested image has no variants."""
+
+
+def variant_sizes():
+    return getattr(settings, "IMAGE_VARIANTS", DEFAULT_VARIANTS)
+
+
+def _hash_key(name):
+    return f"image-variants:{name}"
+
+
+def variant_name(digest, variant, fmt):
+    return f"{VARIANT_DIR}/{digest[:2]}/{digest}/{variant}.{FORMATS[fmt][1]}"
+
+
+def _render(image, size, fmt):
+    pil_format, _, options = FORMATS[fmt]
+    image = image.copy()
+    image.thumbnail((size, size), Image.Resampling.LANCZOS)
+    if fmt == "jpeg" and image.mode != "RGB":
+        # JPEG has no alpha; flatten onto white
+        rgba = image.convert("RGBA")
+        image = Image.new("RGB", rgba.size, "white")
+        image.paste(rgba, mask=rgba.getchannel("A"))
+    elif image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+    buffer = io.BytesIO()
+    image.save(buffer, format=pil_format, **options)
+    return buffer.getvalue()
+
+
+def ensure_variants(name):
+    """
+    Stores every variant of the image `name` that is missing.
+
+    @return: The content hash the variants are stored under.
+    @raise VariantError: If `name` isn't an upload or isn't a readable image.
+    """
+    digest = cache.get(_hash_key(name))
+    if digest is not None:
+        return digest
+    if ".." in name or not name.startswith(SOURCE_DIRS):
+        raise VariantError(name)
+
+    def read():
+        try:
+            with default_storage.open(name, "rb") as original:
+                return original.read()
+        except (FileNotFoundError, OSError):
+            raise VariantError(name)
+
+    # Deduplicated uploads are named after their hash already (see storage.py)
+    data = None
+    if is_blob(name):
+        digest = os.path.splitext(os.path.basename(name))[0][:32]
+    else:
+        data = read()
+        digest = hashlib.sha256(data).hexdigest()[:32]
+
+    image = None
+    for variant, size in variant_sizes().items():
+        for fmt in FORMATS:
+            key = variant_name(digest, variant, fmt)
+            if default_storage.exists(key):
+                continue
+            if image is None:
+                data = read() if data is None else data
+                try:
+                    image = ImageOps.exif_transpose(Image.open(io.BytesIO(data)))
+                except (UnidentifiedImageError, OSError, Image.DecompressionBombError):
+                    raise VariantError(name)
+            saved = default_storage.save(key, ContentFile(_render(image, size, fmt)))
+            if saved != key:
+                # Stored by someone else meanwhile; same content either way
+                default_storage.delete(saved)
+
+    cache.set(_hash_key(name), digest, timeout=HASH_TIMEOUT)
+    return digest
+
+
+def variant_urls(image, request=None):
+    """
+    {variant: {format: url}} for an ImageField value, or None for no image or
+    one that has no variants.
+    """
+    if not image or not image.name.startswith(SOURCE_DIRS):
+        return None
+    digest = cache.get(_hash_key(image.name))
+    urls = {}
+    for variant in variant_sizes():
+        urls[variant] = {}
+        for fmt in FORMATS:
+            if digest is not None:
+                url = default_storage.url(variant_name(digest, variant, fmt))
+            else:
+                url = reverse("image_variant", args=[variant, fmt])
+                url = f"{url}?{urlencode({'name': image.name})}"
+            if request is not None:
+                url = request.build_absolute_uri(url)
+            urls[variant][fmt] = url
+    return urls
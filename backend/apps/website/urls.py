@@ -35,6 +35,7 @@ urlpatterns = [
     
     # task prog apis
     path("tasks/<int:task_id>/update_progress/", views.update_task_progress),
+    path("tasks/update_progress/", views.bulk_update_task_progress),
     path("courses/<int:course_id>/sections/<int:section_id>/rooms/<int:room_id>/task_progress/", views.get_task_progress_for_room,),
     
     # user badges api
@@ -42,6 +43,13 @@ urlpatterns = [
     path("create_badge/", views.create_badge),
     path("another_badges/<str:user_username>", views.get_another_badges),
     path("badges/<int:badge_id>/award_badge/", views.award_badge),
+
+    # Leaderboards
+    path("leaderboards/<str:board>/", views.get_leaderboard),
+    path("leaderboards/<str:board>/friends/", views.get_friends_leaderboard),
+
+    # resized images
+    path("images/<str:variant>/<str:fmt>/", views.image_variant, name="image_variant"),
     path("courses/search/", views.search_courses),
 
     # contribution apis
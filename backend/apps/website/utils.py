@@ -1,13 +1,20 @@
-from better_profanity import profanity
-profanity.load_censor_words()
+from functools import cache
+from .censor import Censor
+
+
+# better_profanity's default word list, compiled on first use (see censor.py)
+# rather than at import, so processes that never censor don't load it
+@cache
+def get_censor():
+    return Censor()
 
 # Make the censor method replace with XXXX instead of ****
 def censor_with_xxxx(text):
-    return profanity.censor(text, censor_char="X")
+    return get_censor().censor(text, censor_char="X")
 
 def censor_json(value):
     if isinstance(value, str):
-        return profanity.censor(value, censor_char="X")
+        return get_censor().censor(value, censor_char="X")
 
     if isinstance(value, list):
         return [censor_json(v) for v in value]
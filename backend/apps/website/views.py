@@ -2,21 +2,36 @@ from django.contrib.auth import get_user_model
 from django.db.models import Q
 from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.exceptions import PermissionDenied
 from django.db import transaction
+from django.core.files.storage import default_storage
+from django.http import Http404, HttpResponseRedirect
 from django.shortcuts import get_object_or_404
+from django.utils.cache import patch_cache_control
 from drf_spectacular.utils import OpenApiResponse, extend_schema
 from drf_spectacular.utils import extend_schema, inline_serializer, OpenApiParameter
 from rest_framework import serializers
 import json
+from collections import defaultdict
 
 # Import the utility function to generate the serializer
 from .serializers import TagSerializer, get_historical_serializer
 
-from .permissions import user_has_access
+from .permissions import invalidate_access_cache, resolve_many, user_has_access
+from .room_writer import RoomWriteError, write_tasks
+from . import leaderboards, thumbnails
+from .progress import (
+    add_completed_many,
+    completion as progress_completion,
+    counts as progress_counts,
+    is_complete,
+    loaded_task_chain as progress_chain,
+)
 from .serializers import (
+    BulkProgressSerializer,
+    LeaderboardEntrySerializer,
     ProgressOfTaskSerializer,
     ReportSerializer,
     RoomSerializer,
@@ -29,6 +44,7 @@ from .serializers import (
 )
 from .models import (
     Badge,
+    ContainerLevel,
     Course,
     ProgressOfTask,
     Report,
@@ -37,7 +53,6 @@ from .models import (
     Status,
     Tag,
     Task,
-    TaskComponent,
     UserBadge,
     UserCourseAccessLevel,
     UserRoomAccessLevel,
@@ -66,34 +81,165 @@ User = get_user_model()
 @permission_classes([IsAuthenticated])
 def update_task_progress(request, task_id):
     user = request.user
-    task = get_object_or_404(Task, id=task_id)
+    # The room and section come along for the completion check and the counters
+    task = get_object_or_404(Task.objects.select_related("room__section"), id=task_id)
+
+    with transaction.atomic():
+        # One row per (user, task): update it in place or insert it. The row is
+        # locked so concurrent answers apply their counter changes one at a time
+        progress, created = ProgressOfTask.objects.select_for_update().get_or_create(
+            user=user, task=task, defaults={"status": Status.NOSTAR, "attempts": 0}
+        )
+        progress.task = task
 
-    progress, created = ProgressOfTask.objects.get_or_create(
-        user=user, task=task, defaults={"status": Status.NOSTAR, "attempts": 0}
+        # Validate and save before computing completion!
+        serializer = ProgressOfTaskSerializer(progress, data=request.data, partial=True)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        serializer.save()
+
+    # Now read completion from the counters the save just updated
+    room = task.room
+    completed = progress_completion(
+        user,
+        {
+            ContainerLevel.ROOM: room.id,
+            ContainerLevel.SECTION: room.section_id,
+            ContainerLevel.COURSE: room.course_id,
+        } if room else {},
+    )
+
+    return Response(
+        {
+            **serializer.data,
+            "room_completed": completed.get(ContainerLevel.ROOM, False),
+            "section_completed": completed.get(ContainerLevel.SECTION, False),
+            "course_completed": completed.get(ContainerLevel.COURSE, False),
+        },
+        status=status.HTTP_200_OK,
     )
 
-    # Validate and save before computing completion!
-    serializer = ProgressOfTaskSerializer(progress, data=request.data, partial=True)
+
+@extend_schema(
+    tags=["Tasks"],
+    summary="Update the progress of many tasks",
+    description="Applies a batch of progress updates for the authenticated user in one transaction, e.g. answers recorded offline. Each update names a task and any of 'status', 'attempts' and 'metadata'; omitted fields keep their current value (or the default for a new row), and a task listed twice takes its last update. The user must be able to view every task's room, otherwise nothing is saved. Returns the saved progress rows and, for each room, section and course touched, its task counts and how many tasks this batch completed (completed_delta).",
+    request=BulkProgressSerializer,
+    responses={
+        200: inline_serializer(
+            name="BulkProgressResponse",
+            fields={
+                "progress": ProgressOfTaskSerializer(many=True),
+                "containers": inline_serializer(
+                    name="BulkProgressContainer",
+                    many=True,
+                    fields={
+                        "level": serializers.CharField(),
+                        "container_id": serializers.IntegerField(),
+                        "total_tasks": serializers.IntegerField(),
+                        "completed_tasks": serializers.IntegerField(),
+                        "completed_delta": serializers.IntegerField(),
+                        "completed": serializers.BooleanField(),
+                        "newly_completed": serializers.BooleanField(),
+                    },
+                ),
+            },
+        ),
+        400: OpenApiResponse(description="Serializer Failed."),
+        403: OpenApiResponse(
+            description="User does not have permission to view some of the tasks."
+        ),
+        404: OpenApiResponse(description="Could not get some of the tasks."),
+    },
+)
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def bulk_update_task_progress(request):
+    user = request.user
+    serializer = BulkProgressSerializer(data=request.data)
     if not serializer.is_valid():
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-    serializer.save()
+    # Later updates of the same task win, as if sent one by one
+    updates = {item["task_id"]: item for item in serializer.validated_data["updates"]}
+
+    tasks = Task.objects.select_related("room__section").in_bulk(list(updates))
+    missing = sorted(set(updates) - set(tasks))
+    if missing:
+        return Response(
+            {"error": "Tasks not found.", "task_ids": missing},
+            status=status.HTTP_404_NOT_FOUND,
+        )
 
-    # Now compute progress using latest data
-    room = Room.objects.filter(id=task.room_id).user_progress_percent(user).first()
-    section = Section.objects.filter(id=task.room.section_id).user_progress_percent(user).first()
-    course = Course.objects.filter(id=task.room.course_id).user_progress_percent(user).first()
+    # Access for every room in the batch is resolved together
+    rooms = {task.room_id: task.room for task in tasks.values() if task.room is not None}
+    levels = dict(zip(rooms, resolve_many(user, rooms.values())))
+    denied = sorted(
+        task_id for task_id, task in tasks.items() if levels.get(task.room_id) is None
+    )
+    if denied:
+        raise PermissionDenied(f"You do not have permission to view tasks {denied}.")
 
-    room_completed = room.progress_percent == 100
-    section_completed = section.progress_percent == 100
-    course_completed = course.progress_percent == 100
+    with transaction.atomic():
+        existing = {
+            row.task_id: row
+            for row in ProgressOfTask.objects.select_for_update().filter(
+                user=user, task_id__in=list(updates)
+            )
+        }
+
+        rows = []
+        deltas = defaultdict(int)
+        for task_id, item in updates.items():
+            previous = existing.get(task_id)
+            row = ProgressOfTask(
+                user=user,
+                task=tasks[task_id],
+                status=previous.status if previous else Status.NOSTAR,
+                attempts=previous.attempts if previous else 0,
+                metadata=previous.metadata if previous else {},
+            )
+            for field in ("status", "attempts", "metadata"):
+                if field in item:
+                    setattr(row, field, item[field])
+            rows.append(row)
+
+            # bulk_create sends no signals, so the counters are updated here
+            change = (row.status == Status.COMPLE) - bool(
+                previous and previous.status == Status.COMPLE
+            )
+            for container in progress_chain(tasks[task_id]).items():
+                deltas[container] += change
+
+        ProgressOfTask.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=["user", "task"],
+            update_fields=["status", "attempts", "metadata"],
+        )
+        add_completed_many(user.pk, {c: d for c, d in deltas.items() if d})
+
+    containers = []
+    for (level, container_id), (total, completed) in progress_counts(user, list(deltas)).items():
+        delta = deltas[(level, container_id)]
+        containers.append(
+            {
+                "level": level,
+                "container_id": container_id,
+                "total_tasks": total,
+                "completed_tasks": completed,
+                "completed_delta": delta,
+                "completed": is_complete(total, completed),
+                "newly_completed": is_complete(total, completed)
+                and not is_complete(total, completed - delta),
+            }
+        )
 
     return Response(
         {
-            **serializer.data,
-            "room_completed": room_completed,
-            "section_completed": section_completed,
-            "course_completed": course_completed,
+            "progress": ProgressOfTaskSerializer(rows, many=True).data,
+            "containers": containers,
         },
         status=status.HTTP_200_OK,
     )
@@ -161,6 +307,127 @@ def get_tags(request):
     return Response(serializer.data, status=status.HTTP_200_OK)
 
 
+# -------------------------------
+# Leaderboard-related API calls
+# -------------------------------
+LeaderboardRank = inline_serializer(
+    name="LeaderboardRank",
+    fields={
+        "rank": serializers.IntegerField(allow_null=True),
+        "score": serializers.IntegerField(),
+    },
+)
+
+
+def _leaderboard_entries(rows, request):
+    # The users of a page, in one query; users deleted meanwhile are skipped
+    users = User.objects.only("id", "username", "profile_pic").in_bulk(
+        [user_id for _, user_id, _ in rows]
+    )
+    entries = [
+        {"rank": rank, "score": score, "user": users[user_id]}
+        for rank, user_id, score in rows
+        if user_id in users
+    ]
+    return LeaderboardEntrySerializer(entries, many=True, context={"request": request}).data
+
+
+def _leaderboard_busy():
+    return Response(
+        {"detail": "The leaderboard is being rebuilt; try again shortly."},
+        status=status.HTTP_503_SERVICE_UNAVAILABLE,
+    )
+
+
+@extend_schema(
+    tags=["Leaderboards"],
+    summary="Get a leaderboard",
+    description="Gets a page of the users ranked by 'streak' (current streak), 'longest_streak', 'courses' (completed courses) or 'badges', highest first, and the rank of the logged in user. Users scoring 0 are not ranked (their rank is null).",
+    parameters=[
+        OpenApiParameter(name="offset", description="Number of ranks to skip", required=False, type=int),
+        OpenApiParameter(name="limit", description="Page size (1 to 100, default 20)", required=False, type=int),
+    ],
+    responses={
+        200: inline_serializer(
+            name="LeaderboardResponse",
+            fields={
+                "board": serializers.CharField(),
+                "total": serializers.IntegerField(),
+                "results": LeaderboardEntrySerializer(many=True),
+                "me": LeaderboardRank,
+            },
+        ),
+        400: OpenApiResponse(description="Invalid offset or limit."),
+        404: OpenApiResponse(description="No such leaderboard."),
+        503: OpenApiResponse(description="The leaderboard is being rebuilt."),
+    },
+)
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def get_leaderboard(request, board):
+    if board not in leaderboards.BOARDS:
+        raise Http404("No such leaderboard.")
+    try:
+        offset = max(int(request.query_params.get("offset", 0)), 0)
+        limit = min(max(int(request.query_params.get("limit", 20)), 1), 100)
+    except ValueError:
+        return Response({"detail": "offset and limit must be integers."}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        rank, score = leaderboards.rank(board, request.user.pk)
+        total = leaderboards.size(board)
+        page = leaderboards.top(board, offset, limit)
+    except leaderboards.Busy:
+        return _leaderboard_busy()
+    return Response(
+        {
+            "board": board,
+            "total": total,
+            "results": _leaderboard_entries(page, request),
+            "me": {"rank": rank, "score": score},
+        },
+        status=status.HTTP_200_OK,
+    )
+
+
+@extend_schema(
+    tags=["Leaderboards"],
+    summary="Get a leaderboard of friends",
+    description="Ranks the logged in user and their friends by 'streak', 'longest_streak', 'courses' or 'badges', highest first.",
+    responses={
+        200: inline_serializer(
+            name="FriendsLeaderboardResponse",
+            fields={
+                "board": serializers.CharField(),
+                "results": LeaderboardEntrySerializer(many=True),
+                "me": LeaderboardRank,
+            },
+        ),
+        404: OpenApiResponse(description="No such leaderboard."),
+        503: OpenApiResponse(description="The leaderboard is being rebuilt."),
+    },
+)
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def get_friends_leaderboard(request, board):
+    if board not in leaderboards.BOARDS:
+        raise Http404("No such leaderboard.")
+
+    try:
+        rows = leaderboards.friends(board, request.user)
+    except leaderboards.Busy:
+        return _leaderboard_busy()
+    me = next((rank, score) for rank, user_id, score in rows if user_id == request.user.pk)
+    return Response(
+        {
+            "board": board,
+            "results": _leaderboard_entries(rows, request),
+            "me": {"rank": me[0], "score": me[1]},
+        },
+        status=status.HTTP_200_OK,
+    )
+
+
 # -------------------------------
 # Badge-related API calls
 # -------------------------------
@@ -282,6 +549,40 @@ def create_badge(request):
 
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+# -------------------------------
+# Image variants
+# -------------------------------
+@extend_schema(
+    tags=["Images"],
+    summary="Get a resized image",
+    description=(
+        "Redirects to a resized variant of an uploaded image, rendering it on first "
+        "use. The serializers' *_variants fields link here until the variants exist."
+    ),
+    parameters=[
+        OpenApiParameter(name="name", description="Storage name of the image", required=True, type=str),
+    ],
+    responses={
+        302: OpenApiResponse(description="Redirect to the variant."),
+        404: OpenApiResponse(description="Unknown variant, format or image."),
+    },
+)
+@api_view(["GET"])
+@permission_classes([AllowAny])  # requested by <img> tags, like the media itself
+def image_variant(request, variant, fmt):
+    name = request.query_params.get("name", "")
+    if variant not in thumbnails.variant_sizes() or fmt not in thumbnails.FORMATS:
+        raise Http404
+    try:
+        digest = thumbnails.ensure_variants(name)
+    except thumbnails.VariantError:
+        raise Http404
+    response = HttpResponseRedirect(
+        default_storage.url(thumbnails.variant_name(digest, variant, fmt))
+    )
+    patch_cache_control(response, public=True, max_age=thumbnails.HASH_TIMEOUT)
+    return response
+
 # -------------------------------
 # Course-related API calls
 # -------------------------------
@@ -464,6 +765,8 @@ def private_course(request, course_id):
         # Cascade privacy to all child sections and rooms
         course.sections.update(visibility=VisibilityLevel.PRIVATE, is_published=False)
         course.rooms.update(visibility=VisibilityLevel.PRIVATE, is_published=False, can_edit=True)
+        # .update() sends no signals
+        invalidate_access_cache()
 
     return Response({"message": "Course and its contents have been made private."}, status=status.HTTP_200_OK)
 
@@ -1074,6 +1377,7 @@ def get_rooms(request, section_id):
         Room.objects.filter(section_id=section_id)
         .filter_by_user_access(user)
         .user_progress_percent(user)
+        .prefetch_details()
     )
 
     if not viewable_rooms_qs.exists():
@@ -1123,19 +1427,21 @@ def get_rooms(request, section_id):
     user = request.user
     get_object_or_404(Section, id=section_id)
 
-    viewable_rooms_qs = (
+    # Evaluated once, with the whole nested serializer prefetched
+    viewable_rooms = list(
         Room.objects.filter(section_id=section_id)
         .filter_by_user_access(user)
         .user_progress_percent(user)
+        .prefetch_details()
     )
 
-    if not viewable_rooms_qs.exists():
+    if not viewable_rooms:
         return Response(status=status.HTTP_204_NO_CONTENT)
 
-    serializer = RoomSerializer(viewable_rooms_qs, many=True)
+    serializer = RoomSerializer(viewable_rooms, many=True)
 
     results = []
-    for serialized, room in zip(serializer.data, viewable_rooms_qs):
+    for serialized, room in zip(serializer.data, viewable_rooms):
         results.append(
             {
                 **serialized,
@@ -1186,19 +1492,21 @@ def get_rooms_by_title(request, section_title):
     user = request.user
     section = get_object_or_404(Section, title=section_title)
 
-    viewable_rooms_qs = (
+    # Evaluated once, with the whole nested serializer prefetched
+    viewable_rooms = list(
         Room.objects.filter(section_id=section.id)
         .filter_by_user_access(user)
         .user_progress_percent(user)
+        .prefetch_details()
     )
 
-    if not viewable_rooms_qs.exists():
+    if not viewable_rooms:
         return Response(status=status.HTTP_204_NO_CONTENT)
 
-    serializer = RoomSerializer(viewable_rooms_qs, many=True)
+    serializer = RoomSerializer(viewable_rooms, many=True)
 
     results = []
-    for serialized, room in zip(serializer.data, viewable_rooms_qs):
+    for serialized, room in zip(serializer.data, viewable_rooms):
         results.append(
             {
                 **serialized,
@@ -1346,7 +1654,7 @@ def get_room_progress(request, room_id):
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
 def get_room(request, room_id):
-    room = get_object_or_404(Room, id=room_id)
+    room = get_object_or_404(Room.objects.prefetch_details(), id=room_id)
 
     if not user_has_access(room, request.user, edit=False):
         raise PermissionDenied("You do not have permission to view this room.")
@@ -1358,7 +1666,7 @@ def get_room(request, room_id):
 @extend_schema(
     tags=["Rooms"],
     summary="Save a room",
-    description="Overwrites an existing room (and its nested components) with new data. Validation and save are atomic. Removed components are cascade-deleted.",
+    description="Overwrites an existing room (and its nested components) with new data. Validation and save are atomic. Tasks are stored in the order sent; tasks missing from 'tasks', and components missing from a task's 'components', are deleted (a task sent without 'components' keeps its components).",
     request=RoomSerializer,
     responses={
         200: OpenApiResponse(description="Room saved successfully."),
@@ -1388,55 +1696,11 @@ def save_room(request, room_id):
                 except json.JSONDecodeError:
                     return Response({"error": "Invalid tasks JSON"}, status=400)
 
-                # Loop through each incoming task
-                for task_data in tasks_list:
-                    task_id = task_data.get("task_id")
-                    tags = task_data.get("tags", [])
-                    components = task_data.get("components", [])
-
-                    # Fetch existing task or create a new one
-                    if task_id:
-                        task_obj, created = Task.objects.get_or_create(
-                            id=task_id, defaults={"room": room}
-                        )
-                    else:
-                        task_obj = Task.objects.create(room=room)
-                        created = True
-
-                    # Ensure task belongs to this room
-                    task_obj.room = room
-
-                    # Handle tags
-                    if isinstance(task_obj.tags, list):  # JSONField
-                        task_obj.tags = tags
-                    else:  # ManyToManyField
-                        tag_objs = []
-                        for tag_name in tags:
-                            tag_obj, _ = Tag.objects.get_or_create(name=tag_name)
-                            tag_objs.append(tag_obj)
-                        task_obj.tags.set(tag_objs)
-
-                    task_obj.save()
-
-                    # Process components individually (update existing, create new)
-                    for comp in components:
-                        comp_id = comp.get("task_component_id")
-                        defaults = {
-                            "type": comp.get("type"),
-                            "content": comp.get("content") or "",
-                        }
-
-                        if comp_id:
-                            # Try to update existing component
-                            updated_count = TaskComponent.objects.filter(
-                                id=comp_id, task=task_obj
-                            ).update(**defaults)
-                            if updated_count == 0:
-                                # Component ID not found, create new
-                                TaskComponent.objects.create(task=task_obj, **defaults)
-                        else:
-                            # Create new component if no ID
-                            TaskComponent.objects.create(task=task_obj, **defaults)
+                # Insert, update and delete only what changed
+                try:
+                    write_tasks(room, tasks_list)
+                except RoomWriteError as e:
+                    return Response({"error": str(e)}, status=400)
             else:
                 # Save normal room fields
                 setattr(room, field, value)
@@ -0,0 +1,88 @@
+"""
+Compares better_profanity's censor() with apps.website.censor.Censor on room-like
+text, checking that both give the same output.
+
+    cd backend && python -m benchmarks.censor [--texts N] [--repeat N]
+"""
+import argparse
+import random
+import time
+from better_profanity import profanity
+from apps.website.censor import Censor
+
+WORDS = (
+    "the history of the old town hall and its market square was rebuilt after "
+    "the fire of 1842 by local masons who carved the stone lions at the gate "
+    "visitors can still see the original clock tower from the river path"
+).split()
+SEPARATORS = [" ", " ", " ", ", ", ". ", "-", "_", "\n"]
+
+
+def corpus(count, seed=0):
+    """Titles, descriptions and component text, with the odd swear word in leetspeak."""
+    rng = random.Random(seed)
+    swear_words = sorted(str(word) for word in profanity.CENSOR_WORDSET)
+    texts = []
+    for _ in range(count):
+        words = []
+        for _ in range(rng.choice((3, 8, 25, 60))):
+            if rng.random() < 0.03:
+                word = rng.choice(swear_words).replace("a", "@").replace("i", "1")
+            else:
+                word = rng.choice(WORDS)
+            words.append(word.capitalize() if rng.random() < 0.1 else word)
+            words.append(rng.choice(SEPARATORS))
+        texts.append("".join(words).strip())
+    return texts
+
+
+def timed(censor, texts, repeat):
+    best, output = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        output = [censor(text, censor_char="X") for text in texts]
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, output
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--texts", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    texts = corpus(args.texts)
+    characters = sum(len(text) for text in texts)
+
+    start = time.perf_counter()
+    profanity.load_censor_words()
+    load_profanity = time.perf_counter() - start
+    start = time.perf_counter()
+    compiled = Censor(profanity)
+    load_compiled = time.perf_counter() - start
+
+    old, expected = timed(profanity.censor, texts, args.repeat)
+    # The first pass also builds the automaton's states; report the warm passes
+    timed(compiled.censor, texts, 1)
+    new, output = timed(compiled.censor, texts, args.repeat)
+
+    mismatches = [text for text, a, b in zip(texts, expected, output) if a != b]
+    if mismatches:
+        raise SystemExit(f"{len(mismatches)} outputs differ, e.g. {mismatches[0]!r}")
+
+    print(f"{len(texts)} texts, {characters} characters, identical output")
+    print(f"{'':16}{'load':>10}{'censor':>12}{'per text':>12}")
+    for name, load, elapsed in (
+        ("better_profanity", load_profanity, old),
+        ("Censor", load_compiled, new),
+    ):
+        print(
+            f"{name:16}{load * 1000:>8.1f}ms{elapsed * 1000:>10.1f}ms"
+            f"{elapsed / len(texts) * 1e6:>10.1f}us"
+        )
+    print(f"speedup: {old / new:.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""
+Synthetic data for the endpoint benchmarks, from the generate_data generator.
+"""
+from django.db.models import Q
+from friendship.models import Friend, FriendshipRequest
+from apps.website.models import Room, Task
+from apps.website.synthetic import PRESETS, Scale, generate  # noqa: F401 (re-exported)
+from dictionary.models import Entry
+
+
+# Incoming friend requests of the benchmark user, so friend_requests lists rows
+PENDING_REQUESTS = 10
+
+
+def seed(scale, batch_size=2000, seed=0):
+    """
+    Creates the dataset and returns what the scenarios need:
+    {"user", "course", "room", "task", "headword"}.
+    """
+    generate(scale, batch_size=batch_size, seed=seed, prefix="bench")
+
+    # The first course is always public; its first room is the one requested
+    room = Room.objects.select_related("course", "creator").order_by("id").first()
+    seed_friend_requests(room.creator)
+    return {
+        "user": room.creator,
+        "course": room.course,
+        "room": room,
+        "task": Task.objects.filter(room=room).order_by("order").first(),
+        "headword": Entry.objects.order_by("id").values_list("headword", flat=True).first(),
+    }
+
+
+def seed_friend_requests(user, count=PENDING_REQUESTS):
+    """Requests to the user from users it has no friendship or request with yet."""
+    related = Q(pk=user.pk) | Q(pk__in=Friend.objects.filter(to_user=user).values("from_user"))
+    related |= Q(pk__in=FriendshipRequest.objects.filter(to_user=user).values("from_user"))
+    related |= Q(pk__in=FriendshipRequest.objects.filter(from_user=user).values("to_user"))
+    senders = type(user).objects.exclude(related).order_by("id")[:count]
+    FriendshipRequest.objects.bulk_create(
+        [FriendshipRequest(from_user=sender, to_user=user, message="") for sender in senders]
+    )
@@ -0,0 +1,64 @@
+"""
+Measures process startup: Django setup and URLconf import, as a worker does on
+boot, with the profanity censor left to load on first use and with it loaded
+up front (what every process paid before it was made lazy).
+
+    cd backend && python -m benchmarks.startup [--runs N]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+BOOT = """
+import time
+start = time.perf_counter()
+import django
+django.setup()
+from django.urls import get_resolver
+get_resolver().url_patterns
+{extra}
+print(time.perf_counter() - start)
+"""
+
+CASES = {
+    "lazy": "",
+    "eager": "from apps.website.utils import get_censor; get_censor()",
+}
+
+
+def boot_time(extra):
+    env = dict(os.environ)
+    env.setdefault("DJANGO_SETTINGS_MODULE", "heritage_project_backend.settings.dev")
+    env.setdefault("SECRET_KEY", "benchmark")
+    result = subprocess.run(
+        [sys.executable, "-c", BOOT.format(extra=extra)],
+        env=env,
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    return float(result.stdout.split()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=15)
+    args = parser.parse_args()
+
+    medians = {}
+    for name, extra in CASES.items():
+        boot_time(extra)  # warm the filesystem and bytecode caches
+        times = sorted(boot_time(extra) for _ in range(args.runs))
+        medians[name] = statistics.median(times)
+        print(
+            f"{name:6} median {medians[name] * 1000:7.1f}ms"
+            f"  min {times[0] * 1000:7.1f}ms  max {times[-1] * 1000:7.1f}ms"
+        )
+    saved = medians["eager"] - medians["lazy"]
+    print(f"saved per process: {saved * 1000:.1f}ms ({saved / medians['eager']:.0%})")
+
+
+if __name__ == "__main__":
+    main()
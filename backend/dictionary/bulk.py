@@ -0,0 +1,314 @@
+import csv
+import json
+from collections import defaultdict
+from itertools import islice
+from auditlog.models import LogEntry
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection, transaction
+from django.utils import timezone
+from .models import POS, Definition, Entry, Source, Variant
+from .cache import bump_version
+from .search import rebuild_indexes
+
+# Bulk loading and dumping of the dictionary tables.
+#
+# A record is one entry with everything hanging off it, in the same shape as
+# EntrySerializer (plus the variant/entry sources it drops):
+#
+#   {"headword": "bonjou",
+#    "variants": [{"text": "bonjour", "sources": ["LA"]}],
+#    "definitions": [{"def_number": 1, "gloss": "hello", "examples": "..."}],
+#    "parts_of_speech": ["int."],
+#    "sources": ["LA"]}
+#
+# JSONL files hold one record per line. CSV files have one column per key,
+# with the list columns JSON-encoded. Both are read and written one batch of
+# records at a time, so memory does not grow with the size of the dictionary.
+
+FORMATS = ("jsonl", "csv")
+CSV_COLUMNS = ["headword", "variants", "definitions", "parts_of_speech", "sources"]
+
+HISTORY_BULK = "bulk"
+HISTORY_SKIP = "skip"
+
+# Children first, so nothing is left pointing at a deleted row
+DELETE_ORDER = (Source, Variant, Definition, POS, Entry)
+
+
+class DictionaryFileError(ValueError):
+    """A record in an import file could not be read."""
+
+
+# --- 1. Records ---
+
+def format_for(path, fmt=None):
+    fmt = fmt or path.rsplit(".", 1)[-1].lower()
+    if fmt not in FORMATS:
+        raise DictionaryFileError(
+            f"Unknown format '{fmt}', expected one of: {', '.join(FORMATS)}."
+        )
+    return fmt
+
+
+def _parse(record, line):
+    headword = record.get("headword")
+    if not isinstance(headword, str) or not headword:
+        raise DictionaryFileError(f"Line {line}: missing headword.")
+    try:
+        return {
+            "headword": headword,
+            "variants": [
+                {"text": v["text"], "sources": list(v.get("sources") or [])}
+                for v in record.get("variants") or []
+            ],
+            "definitions": [
+                {
+                    "def_number": int(d.get("def_number") or n),
+                    "gloss": d.get("gloss") or "",
+                    "examples": d.get("examples"),
+                }
+                for n, d in enumerate(record.get("definitions") or [], start=1)
+            ],
+            "parts_of_speech": list(record.get("parts_of_speech") or []),
+            "sources": list(record.get("sources") or []),
+        }
+    except (KeyError, TypeError, ValueError, AttributeError) as e:
+        raise DictionaryFileError(f"Line {line}: malformed record ({e}).")
+
+
+def read_records(stream, fmt):
+    """Yields parsed records from a JSONL or CSV text stream."""
+    if fmt == "jsonl":
+        for line, text in enumerate(stream, start=1):
+            if not text.strip():
+                continue
+            try:
+                record = json.loads(text)
+            except json.JSONDecodeError as e:
+                raise DictionaryFileError(f"Line {line}: invalid JSON ({e}).")
+            if not isinstance(record, dict):
+                raise DictionaryFileError(f"Line {line}: expected an object.")
+            yield _parse(record, line)
+    else:
+        # Line 1 is the header
+        for line, row in enumerate(csv.DictReader(stream), start=2):
+            record = {"headword": row.get("headword")}
+            try:
+                for column in CSV_COLUMNS[1:]:
+                    record[column] = json.loads(row.get(column) or "[]")
+            except json.JSONDecodeError as e:
+                raise DictionaryFileError(f"Line {line}: invalid JSON in '{column}' ({e}).")
+            yield _parse(record, line)
+
+
+def write_records(stream, fmt, records):
+    """Writes records to a text stream; returns how many were written."""
+    total = 0
+    if fmt == "jsonl":
+        for record in records:
+            stream.write(json.dumps(record, ensure_ascii=False) + "\n")
+            total += 1
+    else:
+        writer = csv.DictWriter(stream, fieldnames=CSV_COLUMNS)
+        writer.writeheader()
+        for record in records:
+            row = {"headword": record["headword"]}
+            for column in CSV_COLUMNS[1:]:
+                row[column] = json.dumps(record[column], ensure_ascii=False)
+            writer.writerow(row)
+            total += 1
+    return total
+
+
+def _batches(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+# --- 2. Export ---
+
+def _group(queryset, *fields):
+    grouped = defaultdict(list)
+    for entry_id, *values in queryset.values_list("entry_id", *fields):
+        grouped[entry_id].append(values)
+    return grouped
+
+
+def export_records(batch_size=1000):
+    """Yields every entry as a record, in id order, one batch in memory at a time."""
+    last_id = 0
+    while True:
+        entries = list(
+            Entry.objects.filter(id__gt=last_id)
+            .order_by("id")
+            .values_list("id", "headword")[:batch_size]
+        )
+        if not entries:
+            return
+        ids = [entry_id for entry_id, _ in entries]
+        last_id = ids[-1]
+
+        # Plain value rows per table; model instances would dominate the run time
+        variants = _group(Variant.objects.filter(entry_id__in=ids).order_by("id"), "id", "text")
+        definitions = _group(
+            Definition.objects.filter(entry_id__in=ids).order_by("def_number", "id"),
+            "def_number", "gloss", "examples",
+        )
+        parts_of_speech = _group(
+            POS.objects.filter(entry_id__in=ids).order_by("id"), "part_of_speech"
+        )
+        entry_sources = _group(
+            Source.objects.filter(entry_id__in=ids, variant__isnull=True).order_by("id"),
+            "text",
+        )
+        variant_sources = defaultdict(list)
+        for variant_id, text in (
+            Source.objects.filter(entry_id__in=ids, variant__isnull=False)
+            .order_by("id")
+            .values_list("variant_id", "text")
+        ):
+            variant_sources[variant_id].append(text)
+
+        for entry_id, headword in entries:
+            yield {
+                "headword": headword,
+                "variants": [
+                    {"text": text, "sources": variant_sources[variant_id]}
+                    for variant_id, text in variants[entry_id]
+                ],
+                "definitions": [
+                    {"def_number": def_number, "gloss": gloss, "examples": examples}
+                    for def_number, gloss, examples in definitions[entry_id]
+                ],
+                "parts_of_speech": [p for p, in parts_of_speech[entry_id]],
+                "sources": [text for text, in entry_sources[entry_id]],
+            }
+
+
+# --- 3. History and audit rows ---
+
+def _record_history(model, objs, history_type, history_date):
+    """Bulk version of what simple_history saves for each object."""
+    History = model.history.model
+    History.objects.bulk_create(
+        [
+            History(
+                history_date=history_date,
+                history_type=history_type,
+                history_change_reason="Bulk dictionary import",
+                **{f.attname: getattr(obj, f.attname) for f in History.tracked_fields},
+            )
+            for obj in objs
+        ]
+    )
+
+
+def _record_audit(model, objs, action):
+    """Bulk version of what auditlog saves for each object."""
+    content_type = ContentType.objects.get_for_model(model)
+    fields = [f for f in model._meta.concrete_fields if not f.primary_key]
+    entries = []
+    for obj in objs:
+        values = {f.name: str(getattr(obj, f.attname)) for f in fields}
+        if action == LogEntry.Action.CREATE:
+            changes = {name: ["None", value] for name, value in values.items()}
+        else:
+            changes = {name: [value, "None"] for name, value in values.items()}
+        entries.append(
+            LogEntry(
+                content_type=content_type,
+                object_pk=str(obj.pk),
+                object_id=obj.pk,
+                object_repr=str(obj),
+                action=action,
+                changes=changes,
+                changes_text="",
+            )
+        )
+    LogEntry.objects.bulk_create(entries)
+
+
+def _create(model, objs, history, history_date):
+    model.objects.bulk_create(objs)
+    if history == HISTORY_BULK and objs:
+        _record_history(model, objs, "+", history_date)
+        _record_audit(model, objs, LogEntry.Action.CREATE)
+
+
+# --- 4. Import ---
+
+def _delete_all(history, batch_size, history_date):
+    for model in DELETE_ORDER:
+        if history == HISTORY_BULK:
+            queryset = model.objects.order_by("pk")
+            if model is not Entry:
+                # object_repr needs the parent headword/variant text
+                queryset = queryset.select_related(
+                    *(["entry", "variant"] if model is Source else ["entry"])
+                )
+            for objs in _batches(queryset.iterator(chunk_size=batch_size), batch_size):
+                _record_history(model, objs, "-", history_date)
+                _record_audit(model, objs, LogEntry.Action.DELETE)
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {connection.ops.quote_name(model._meta.db_table)}")
+
+
+def _import_batch(records, history, history_date):
+    entries = [Entry(headword=r["headword"]) for r in records]
+    _create(Entry, entries, history, history_date)
+
+    variants, definitions, parts_of_speech, sources = [], [], [], []
+    variant_sources = []
+    for entry, record in zip(entries, records):
+        for v in record["variants"]:
+            variant = Variant(entry=entry, text=v["text"])
+            variants.append(variant)
+            variant_sources.append((variant, v["sources"]))
+        definitions.extend(Definition(entry=entry, **d) for d in record["definitions"])
+        parts_of_speech.extend(
+            POS(entry=entry, part_of_speech=p) for p in record["parts_of_speech"]
+        )
+        sources.extend(Source(entry=entry, text=s) for s in record["sources"])
+
+    # Variant ids are needed before their sources can be written
+    _create(Variant, variants, history, history_date)
+    for variant, texts in variant_sources:
+        sources.extend(Source(entry=variant.entry, variant=variant, text=s) for s in texts)
+
+    _create(Definition, definitions, history, history_date)
+    _create(POS, parts_of_speech, history, history_date)
+    _create(Source, sources, history, history_date)
+
+
+def refresh_indexes(batch_size=1000):
+    """
+    Rebuilds every derived dictionary structure once after a bulk change
+    (bulk writes don't send the signals that normally keep them current).
+    """
+    rebuild_indexes(batch_size=batch_size)
+    # Moves every process's suggestion indexes and cached responses on
+    transaction.on_commit(bump_version)
+
+
+def import_records(records, batch_size=1000, history=HISTORY_BULK, replace=False):
+    """
+    Loads records into the dictionary tables in one transaction.
+
+    @param records: Iterable of parsed records (see read_records).
+    @param batch_size: Records written per round of bulk inserts.
+    @param history: HISTORY_BULK to write simple_history and auditlog rows in
+                    bulk, HISTORY_SKIP to write none.
+    @param replace: Delete the existing dictionary first.
+    @return: The number of entries imported.
+    """
+    history_date = timezone.now()
+    total = 0
+    with transaction.atomic():
+        if replace:
+            _delete_all(history, batch_size, history_date)
+        for batch in _batches(records, batch_size):
+            _import_batch(batch, history, history_date)
+            total += len(batch)
+        refresh_indexes(batch_size=batch_size)
+    return total
@@ -0,0 +1,79 @@
+import functools
+import hashlib
+import time
+from django.core.cache import cache
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+
+# Versioned response cache for the read-mostly dictionary endpoints.
+#
+# Every cached response is keyed by the current dictionary version, which is
+# bumped whenever a change to any dictionary row commits (see signals.py) and
+# after a bulk import (bulk.py). The suggestion indexes check it too.
+# Bumping never deletes anything: old keys just stop being read and age out of
+# the cache.
+# The version also makes the ETag, so a client revalidating with
+# If-None-Match costs one cache read and no database query at all.
+
+VERSION_KEY = "dictionary:version"
+RESPONSE_TIMEOUT = 60 * 60 * 24
+CACHED_STATUSES = (status.HTTP_200_OK, status.HTTP_404_NOT_FOUND)
+
+
+def get_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # Start from the clock rather than 1, so a version key evicted from
+        # the cache can't come back as a number old responses were stored under
+        cache.add(VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def bump_version():
+    """
+    Invalidates every cached dictionary response and the suggestion indexes
+    of every process.
+
+    @return: The new version.
+    """
+    try:
+        return cache.incr(VERSION_KEY)
+    except ValueError:
+        # Not set yet (or evicted); any fresh version will do
+        return get_version()
+
+
+def cached_response(view):
+    """
+    Caches a dictionary view's 200/404 responses per URL until the dictionary
+    changes, and answers matching If-None-Match requests with 304.
+    The wrapped view's response must not depend on the requesting user.
+    """
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        version = get_version()
+        digest = hashlib.sha1(
+            f"{view.__name__}:{request.get_full_path()}".encode("utf-8")
+        ).hexdigest()
+        etag = f'"{version}-{digest[:16]}"'
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+        if_none_match = parse_etags(request.headers.get("If-None-Match", ""))
+        if etag in if_none_match or "*" in if_none_match:
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+        key = f"dictionary:response:{version}:{digest}"
+        cached = cache.get(key)
+        if cached is None:
+            response = view(request, *args, **kwargs)
+            if response is None or response.status_code not in CACHED_STATUSES:
+                return response
+            cached = (response.data, response.status_code)
+            cache.set(key, cached, RESPONSE_TIMEOUT)
+
+        data, status_code = cached
+        return Response(data, status=status_code, headers=headers)
+
+    return wrapper
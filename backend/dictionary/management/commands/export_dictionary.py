@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand, CommandError
+from dictionary.bulk import (
+    FORMATS,
+    DictionaryFileError,
+    export_records,
+    format_for,
+    write_records,
+)
+
+
+class Command(BaseCommand):
+    help = "Streams the dictionary tables out to a JSONL or CSV file."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="File to write, or - for stdout.")
+        parser.add_argument(
+            "--format",
+            choices=FORMATS,
+            help="File format; defaults to the file extension.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of entries loaded per batch.",
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        if path == "-" and not options["format"]:
+            raise CommandError("--format is required when writing to stdout.")
+
+        try:
+            fmt = format_for(path, options["format"])
+            records = export_records(batch_size=options["batch_size"])
+            if path == "-":
+                total = write_records(self.stdout, fmt, records)
+            else:
+                with open(path, "w", encoding="utf-8", newline="") as stream:
+                    total = write_records(stream, fmt, records)
+        except (DictionaryFileError, OSError) as e:
+            raise CommandError(str(e))
+
+        if path != "-":
+            self.stdout.write(self.style.SUCCESS(f"Exported {total} entries."))
@@ -0,0 +1,63 @@
+import sys
+from django.core.management.base import BaseCommand, CommandError
+from dictionary.bulk import (
+    FORMATS,
+    HISTORY_BULK,
+    HISTORY_SKIP,
+    DictionaryFileError,
+    format_for,
+    import_records,
+    read_records,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Streams a JSONL or CSV dictionary file into the dictionary tables with "
+        "batched bulk inserts, then rebuilds the search indexes once."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="File to read, or - for stdin.")
+        parser.add_argument(
+            "--format",
+            choices=FORMATS,
+            help="File format; defaults to the file extension.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of entries written per batch.",
+        )
+        parser.add_argument(
+            "--history",
+            choices=(HISTORY_BULK, HISTORY_SKIP),
+            default=HISTORY_BULK,
+            help="Write simple_history and auditlog rows in bulk, or skip them.",
+        )
+        parser.add_argument(
+            "--replace",
+            action="store_true",
+            help="Delete the existing dictionary before importing.",
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        if path == "-" and not options["format"]:
+            raise CommandError("--format is required when reading from stdin.")
+
+        try:
+            fmt = format_for(path, options["format"])
+            stream = sys.stdin if path == "-" else open(path, encoding="utf-8", newline="")
+            with stream:
+                total = import_records(
+                    read_records(stream, fmt),
+                    batch_size=options["batch_size"],
+                    history=options["history"],
+                    replace=options["replace"],
+                )
+        except (DictionaryFileError, OSError) as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(f"Imported {total} entries."))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from dictionary.search import rebuild_indexes
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the normalized dictionary search and term key tables from the dictionary tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of entries loaded and written per batch.",
+        )
+
+    def handle(self, *args, **options):
+        total = rebuild_indexes(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Indexed {total} entries."))
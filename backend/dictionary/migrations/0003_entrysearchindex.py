@@ -0,0 +1,77 @@
+# Generated by Django 5.2.6 on 2026-10-18 13:47
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+SEARCH_COLUMNS = [
+    f"{document}_{form}"
+    for document in ("terms", "glosses", "definitions")
+    for form in ("lower", "folded", "lower_words", "folded_words")
+]
+
+
+def populate_search_index(apps, schema_editor):
+    from dictionary.search import rebuild_search_index
+
+    rebuild_search_index(
+        models=(
+            apps.get_model("dictionary", "Entry"),
+            apps.get_model("dictionary", "EntrySearchIndex"),
+        )
+    )
+
+
+def create_trigram_indexes(apps, schema_editor):
+    # LIKE '%...%' can only use an index on Postgres (pg_trgm); SQLite scans the
+    # narrow search table instead, which is still far cheaper than Python.
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for column in SEARCH_COLUMNS:
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS dictionary_entry_search_{column}_trgm "
+            f"ON dictionary_entry_search USING gin ({column} gin_trgm_ops)"
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for column in SEARCH_COLUMNS:
+        schema_editor.execute(
+            f"DROP INDEX IF EXISTS dictionary_entry_search_{column}_trgm"
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dictionary', '0002_alter_definition_options_alter_entry_options_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EntrySearchIndex',
+            fields=[
+                ('entry', models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_index', serialize=False, to='dictionary.entry')),
+                ('sort_key', models.CharField(db_index=True, max_length=255)),
+                ('terms_lower', models.TextField(blank=True)),
+                ('terms_folded', models.TextField(blank=True)),
+                ('terms_lower_words', models.TextField(blank=True)),
+                ('terms_folded_words', models.TextField(blank=True)),
+                ('glosses_lower', models.TextField(blank=True)),
+                ('glosses_folded', models.TextField(blank=True)),
+                ('glosses_lower_words', models.TextField(blank=True)),
+                ('glosses_folded_words', models.TextField(blank=True)),
+                ('definitions_lower', models.TextField(blank=True)),
+                ('definitions_folded', models.TextField(blank=True)),
+                ('definitions_lower_words', models.TextField(blank=True)),
+                ('definitions_folded_words', models.TextField(blank=True)),
+            ],
+            options={
+                'db_table': 'dictionary_entry_search',
+            },
+        ),
+        migrations.RunPython(populate_search_index, migrations.RunPython.noop),
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
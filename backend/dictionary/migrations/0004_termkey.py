@@ -0,0 +1,38 @@
+# Generated by Django 5.2.6 on 2026-10-18 13:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def populate_term_keys(apps, schema_editor):
+    from dictionary.search import rebuild_term_keys
+
+    rebuild_term_keys(
+        models=(
+            apps.get_model("dictionary", "Entry"),
+            apps.get_model("dictionary", "TermKey"),
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dictionary', '0003_entrysearchindex'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TermKey',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.TextField(db_index=True)),
+                ('entry', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='term_keys', to='dictionary.entry')),
+                ('variant', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='term_keys', to='dictionary.variant')),
+            ],
+            options={
+                'db_table': 'dictionary_term_keys',
+            },
+        ),
+        migrations.RunPython(populate_term_keys, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+from django.db import migrations
+
+
+def rebuild_search_index(apps, schema_editor):
+    # The words columns now keep the separator between a document's pieces
+    from dictionary.search import rebuild_search_index
+
+    rebuild_search_index(
+        models=(
+            apps.get_model("dictionary", "Entry"),
+            apps.get_model("dictionary", "EntrySearchIndex"),
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dictionary', '0004_termkey'),
+    ]
+
+    operations = [
+        migrations.RunPython(rebuild_search_index, migrations.RunPython.noop),
+    ]
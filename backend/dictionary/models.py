@@ -94,3 +94,83 @@ auditlog.register(Source)
 auditlog.register(Definition)
 auditlog.register(Variant)
 auditlog.register(POS)
+
+
+# -----------------------------
+#  Search index (managed by this app)
+# -----------------------------
+class EntrySearchIndex(models.Model):
+    """
+    Lowercased and accent-folded copies of everything get_n_terms searches,
+    one row per Entry. The dictionary tables above are not managed by Django,
+    so the normalized columns live in this side table instead. Rows are kept
+    current by dictionary/signals.py and rebuilt by `rebuild_dictionary_index`.
+
+    The *_words columns hold the same text with every run of non-word
+    characters collapsed to a single space (and padded with spaces), which
+    lets whole-word matching compile to a plain LIKE '% word %'.
+    """
+    entry = models.OneToOneField(
+        Entry,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        db_constraint=False,
+        related_name="search_index",
+    )
+    sort_key = models.CharField(max_length=255, db_index=True)  # lower(headword)
+
+    # headword + variants
+    terms_lower = models.TextField(blank=True)
+    terms_folded = models.TextField(blank=True)
+    terms_lower_words = models.TextField(blank=True)
+    terms_folded_words = models.TextField(blank=True)
+
+    # definition glosses
+    glosses_lower = models.TextField(blank=True)
+    glosses_folded = models.TextField(blank=True)
+    glosses_lower_words = models.TextField(blank=True)
+    glosses_folded_words = models.TextField(blank=True)
+
+    # definition glosses + examples
+    definitions_lower = models.TextField(blank=True)
+    definitions_folded = models.TextField(blank=True)
+    definitions_lower_words = models.TextField(blank=True)
+    definitions_folded_words = models.TextField(blank=True)
+
+    class Meta:
+        db_table = "dictionary_entry_search"
+
+    def __str__(self):
+        return self.sort_key
+
+
+class TermKey(models.Model):
+    """
+    Accent-folded lookup keys for headwords and variants (see
+    utils.term_keys), so get_term_data's accent-insensitive match is an
+    indexed equality probe instead of a regex over both tables. A text has
+    several keys only when it contains characters such as œ or ø that stand
+    for more than one letter. Maintained alongside EntrySearchIndex.
+    """
+    entry = models.ForeignKey(
+        Entry,
+        on_delete=models.CASCADE,
+        db_constraint=False,
+        related_name="term_keys",
+    )
+    # None for keys of the headword itself
+    variant = models.ForeignKey(
+        Variant,
+        on_delete=models.CASCADE,
+        db_constraint=False,
+        null=True,
+        blank=True,
+        related_name="term_keys",
+    )
+    key = models.TextField(db_index=True)
+
+    class Meta:
+        db_table = "dictionary_term_keys"
+
+    def __str__(self):
+        return self.key
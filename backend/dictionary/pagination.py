@@ -0,0 +1,77 @@
+import base64
+import binascii
+import json
+from django.db.models import F, Q
+
+# Keyset pagination over (lower(headword), id). Both columns are indexed on
+# the search table, so every page is an index range scan no matter how deep
+# into the dictionary it is, and the id tiebreaker keeps duplicate headwords
+# from being skipped or repeated at page boundaries.
+
+SORT_KEY = "search_index__sort_key"
+NEXT = "n"
+PREV = "p"
+
+
+def encode_cursor(sort_key, pk, direction):
+    """Packs a position into an opaque, URL-safe cursor string."""
+    raw = json.dumps([sort_key, pk, direction], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor):
+    """
+    Returns (sort_key, pk, direction) for a cursor made by encode_cursor,
+    or None if the string is not one.
+    """
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        sort_key, pk, direction = json.loads(base64.urlsafe_b64decode(padded))
+    except (binascii.Error, ValueError, TypeError, UnicodeDecodeError):
+        return None
+    if not isinstance(sort_key, str) or not isinstance(pk, int) or direction not in (NEXT, PREV):
+        return None
+    return sort_key, pk, direction
+
+
+def paginate(queryset, limit, position=None):
+    """
+    Returns one page of an Entry queryset in (lower(headword), id) order.
+
+    @param queryset: Entry queryset, any filters already applied.
+    @param limit: Maximum number of rows in the page.
+    @param position: Decoded cursor, (sort_key, pk, direction), or None for
+                     the first page.
+    @return: (rows, next_cursor, prev_cursor); a cursor is None when there is
+             nothing further in that direction.
+    """
+    queryset = queryset.annotate(page_sort_key=F(SORT_KEY))
+
+    if position is None:
+        rows = list(queryset.order_by(SORT_KEY, "id")[: limit + 1])
+        has_next, has_prev = len(rows) > limit, False
+        rows = rows[:limit]
+    else:
+        sort_key, pk, direction = position
+        if direction == NEXT:
+            after = Q(**{f"{SORT_KEY}__gt": sort_key}) | Q(**{SORT_KEY: sort_key, "id__gt": pk})
+            rows = list(queryset.filter(after).order_by(SORT_KEY, "id")[: limit + 1])
+            has_next, has_prev = len(rows) > limit, True
+            rows = rows[:limit]
+        else:
+            before = Q(**{f"{SORT_KEY}__lt": sort_key}) | Q(**{SORT_KEY: sort_key, "id__lt": pk})
+            rows = list(
+                queryset.filter(before).order_by(f"-{SORT_KEY}", "-id")[: limit + 1]
+            )
+            has_next, has_prev = True, len(rows) > limit
+            rows = rows[:limit][::-1]
+
+    if not rows:
+        return rows, None, None
+
+    first, last = rows[0], rows[-1]
+    next_cursor = encode_cursor(last.page_sort_key, last.id, NEXT) if has_next else None
+    prev_cursor = encode_cursor(first.page_sort_key, first.id, PREV) if has_prev else None
+    return rows, next_cursor, prev_cursor
@@ -0,0 +1,271 @@
+import re
+from collections import defaultdict
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+from django.db.models.functions import Trim
+from .utils import strip_accents, term_keys
+
+# Searchable documents stored per entry, see EntrySearchIndex
+DOCUMENTS = ("terms", "glosses", "definitions")
+
+# Separator between the pieces of one document (headword, each variant, ...).
+# It is a non-word character, so substring and whole-word matches can't span
+# it. The words forms keep it between the padded pieces (" bon \n jou "), so
+# neither can a ' word ' pattern.
+DOCUMENT_SEPARATOR = "\n"
+
+NON_WORD_RE = re.compile(r"\W+", flags=re.UNICODE)
+
+
+# --- 1. Normalization ---
+
+def fold(text):
+    """Lowercase and strip accents (the match_accents=False form)."""
+    return strip_accents(text or "").lower()
+
+
+def words_form(text):
+    """
+    Collapse every run of non-word characters into one space and pad the
+    result, so ' word ' can be matched with LIKE the way \\b...\\b matches.
+    """
+    words = NON_WORD_RE.sub(" ", text or "").strip()
+    return f" {words} " if words else ""
+
+
+def build_document(pieces):
+    """Returns the lower/folded/words columns for one document."""
+    pieces = [p for p in pieces if p]
+    lower = [p.lower() for p in pieces]
+    folded = [fold(p) for p in pieces]
+    return {
+        "lower": DOCUMENT_SEPARATOR.join(lower),
+        "folded": DOCUMENT_SEPARATOR.join(folded),
+        "lower_words": DOCUMENT_SEPARATOR.join(filter(None, map(words_form, lower))),
+        "folded_words": DOCUMENT_SEPARATOR.join(filter(None, map(words_form, folded))),
+    }
+
+
+def build_index_fields(headword, variants, definitions):
+    """
+    Computes every EntrySearchIndex column for an entry.
+
+    @param headword: The entry headword.
+    @param variants: Iterable of variant texts.
+    @param definitions: Iterable of (gloss, examples) pairs.
+    @return: dict of field name -> value.
+    """
+    definitions = list(definitions)
+    documents = {
+        "terms": build_document([headword, *variants]),
+        "glosses": build_document(gloss for gloss, _ in definitions),
+        # Same text get_n_terms used to build: f"{gloss} {examples}"
+        "definitions": build_document(
+            f"{gloss or ''} {examples or ''}" for gloss, examples in definitions
+        ),
+    }
+
+    fields = {"sort_key": (headword or "").lower()[:255]}
+    for document, columns in documents.items():
+        for suffix, value in columns.items():
+            fields[f"{document}_{suffix}"] = value
+    return fields
+
+
+# --- 2. Index maintenance ---
+
+def _load_entries(entry_ids, Entry):
+    """
+    Returns (id, headword, [(variant_id, text)], [(gloss, examples)]) for each
+    entry. Plain value queries, since model instances and prefetch caches are
+    the slow part of a full rebuild.
+    """
+    Variant = Entry._meta.get_field("variants").related_model
+    Definition = Entry._meta.get_field("definitions").related_model
+
+    variants, definitions = defaultdict(list), defaultdict(list)
+    for entry_id, variant_id, text in Variant.objects.filter(
+        entry_id__in=entry_ids
+    ).order_by("id").values_list("entry_id", "id", "text"):
+        variants[entry_id].append((variant_id, text))
+    for entry_id, gloss, examples in Definition.objects.filter(
+        entry_id__in=entry_ids
+    ).order_by("id").values_list("entry_id", "gloss", "examples"):
+        definitions[entry_id].append((gloss, examples))
+
+    return [
+        (entry_id, headword, variants[entry_id], definitions[entry_id])
+        for entry_id, headword in Entry.objects.filter(id__in=entry_ids).values_list(
+            "id", "headword"
+        )
+    ]
+
+
+def _index_rows(entries, EntrySearchIndex):
+    for entry_id, headword, variants, definitions in entries:
+        yield EntrySearchIndex(
+            entry_id=entry_id,
+            **build_index_fields(
+                headword, [text for _, text in variants], definitions
+            ),
+        )
+
+
+def _term_key_rows(entries, TermKey):
+    for entry_id, headword, variants, _ in entries:
+        for key in term_keys(headword):
+            yield TermKey(entry_id=entry_id, key=key)
+        for variant_id, text in variants:
+            for key in term_keys(text):
+                yield TermKey(entry_id=entry_id, variant_id=variant_id, key=key)
+
+
+def reindex_entries(entry_ids):
+    """Rebuilds the search and term key rows of the given entries (deleted ids are dropped)."""
+    from .models import Entry, EntrySearchIndex, TermKey
+
+    entry_ids = {i for i in entry_ids if i is not None}
+    if not entry_ids:
+        return
+
+    entries = _load_entries(entry_ids, Entry)
+    with transaction.atomic():
+        EntrySearchIndex.objects.filter(entry_id__in=entry_ids).delete()
+        EntrySearchIndex.objects.bulk_create(_index_rows(entries, EntrySearchIndex))
+        TermKey.objects.filter(entry_id__in=entry_ids).delete()
+        TermKey.objects.bulk_create(_term_key_rows(entries, TermKey))
+
+
+def _rebuild(Entry, tables, batch_size):
+    """Refills each (table, rows_for) pair in one pass over the entries."""
+    total = 0
+    with transaction.atomic():
+        for table, _ in tables:
+            table.objects.all().delete()
+        ids = list(Entry.objects.order_by("id").values_list("id", flat=True))
+        for start in range(0, len(ids), batch_size):
+            entries = _load_entries(ids[start:start + batch_size], Entry)
+            for table, rows_for in tables:
+                table.objects.bulk_create(rows_for(entries, table), batch_size=batch_size)
+            total += len(entries)
+    return total
+
+
+def rebuild_indexes(batch_size=1000):
+    """
+    Recomputes the search and term key tables together, reading the
+    dictionary once.
+
+    @param batch_size: Entries loaded and written per batch.
+    @return: The number of entries indexed.
+    """
+    from .models import Entry, EntrySearchIndex, TermKey
+
+    return _rebuild(
+        Entry,
+        [(EntrySearchIndex, _index_rows), (TermKey, _term_key_rows)],
+        batch_size,
+    )
+
+
+def rebuild_search_index(batch_size=1000, models=None):
+    """
+    Recomputes the whole search table from the dictionary tables.
+
+    @param batch_size: Entries loaded and written per batch.
+    @param models: Optional (Entry, EntrySearchIndex) pair, used by migrations
+                   to pass their historical models.
+    @return: The number of entries indexed.
+    """
+    if models is None:
+        from .models import Entry, EntrySearchIndex
+    else:
+        Entry, EntrySearchIndex = models
+    return _rebuild(Entry, [(EntrySearchIndex, _index_rows)], batch_size)
+
+
+def rebuild_term_keys(batch_size=1000, models=None):
+    """
+    Recomputes the whole term key table from the dictionary tables.
+
+    @param batch_size: Entries loaded and written per batch.
+    @param models: Optional (Entry, TermKey) pair, used by migrations to pass
+                   their historical models.
+    @return: The number of entries indexed.
+    """
+    if models is None:
+        from .models import Entry, TermKey
+    else:
+        Entry, TermKey = models
+    return _rebuild(Entry, [(TermKey, _term_key_rows)], batch_size)
+
+
+# --- 3. Query compilation ---
+
+def search_column(*, search_definitions, search_examples, match_accents, whole_word):
+    """Picks the EntrySearchIndex column that a get_n_terms search runs against."""
+    if not search_definitions:
+        document = "terms"
+    elif search_examples:
+        document = "definitions"
+    else:
+        document = "glosses"
+
+    column = f"{document}_{'lower' if match_accents else 'folded'}"
+    if whole_word:
+        column += "_words"
+    return column
+
+
+def search_entries(
+    query="",
+    *,
+    search_definitions=False,
+    whole_word=False,
+    match_accents=False,
+    search_examples=False,
+    part_of_speech="",
+    source="",
+):
+    """
+    Compiles the get_n_terms filters into a single Entry queryset ordered by
+    (lower(headword), id). Nothing is evaluated here, so callers can slice
+    out just the page they need.
+    """
+    from .models import Entry, POS, Source
+
+    entries = Entry.objects.all()
+
+    if query:
+        column = search_column(
+            search_definitions=search_definitions,
+            search_examples=search_examples,
+            match_accents=match_accents,
+            whole_word=whole_word,
+        )
+        needle = query.lower() if match_accents else fold(query)
+        if whole_word:
+            needle = words_form(needle)
+            if not needle:
+                return entries.none()
+        entries = entries.filter(**{f"search_index__{column}__contains": needle})
+
+    if part_of_speech:
+        entries = entries.filter(
+            Exists(
+                POS.objects.filter(entry=OuterRef("pk"), part_of_speech=part_of_speech)
+            )
+        )
+
+    if source:
+        # Entry-level and variant-level sources both carry the entry id
+        entries = entries.filter(
+            Exists(
+                Source.objects.annotate(stripped=Trim("text")).filter(
+                    Q(entry=OuterRef("pk")) | Q(variant__entry=OuterRef("pk")),
+                    stripped=source,
+                )
+            )
+        )
+
+    return entries.order_by("search_index__sort_key", "id")
@@ -0,0 +1,71 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .cache import bump_version
+from .models import POS, Definition, Entry, Source, Variant
+from .search import reindex_entries
+from .suggestions import gloss_index, headword_index
+
+
+@receiver(post_save, sender=Entry)
+@receiver(post_delete, sender=Entry)
+def reindex_entry(sender, instance, **kwargs):
+    reindex_entries([instance.pk])
+
+
+@receiver(post_save, sender=Entry)
+def update_headword_suggestions(sender, instance, **kwargs):
+    # The index is process-wide and can't be rolled back, so it only takes
+    # committed changes
+    entry_id, headword = instance.pk, instance.headword
+    transaction.on_commit(lambda: headword_index.update(entry_id, headword))
+
+
+@receiver(post_delete, sender=Entry)
+def remove_headword_suggestion(sender, instance, **kwargs):
+    entry_id = instance.pk
+    transaction.on_commit(lambda: headword_index.remove(entry_id))
+
+
+@receiver(post_save, sender=Variant)
+@receiver(post_delete, sender=Variant)
+@receiver(post_save, sender=Definition)
+@receiver(post_delete, sender=Definition)
+def reindex_parent_entry(sender, instance, **kwargs):
+    reindex_entries([instance.entry_id])
+
+
+@receiver(post_save, sender=Definition)
+def update_gloss_index(sender, instance, **kwargs):
+    # Committed changes only, as for the headword index
+    definition_id, entry_id, gloss = instance.pk, instance.entry_id, instance.gloss
+    transaction.on_commit(lambda: gloss_index.update(definition_id, entry_id, gloss))
+
+
+@receiver(post_delete, sender=Definition)
+def remove_from_gloss_index(sender, instance, **kwargs):
+    definition_id = instance.pk
+    transaction.on_commit(lambda: gloss_index.remove(definition_id))
+
+
+@receiver(post_save, sender=Entry)
+@receiver(post_delete, sender=Entry)
+@receiver(post_save, sender=Variant)
+@receiver(post_delete, sender=Variant)
+@receiver(post_save, sender=Source)
+@receiver(post_delete, sender=Source)
+@receiver(post_save, sender=Definition)
+@receiver(post_delete, sender=Definition)
+@receiver(post_save, sender=POS)
+@receiver(post_delete, sender=POS)
+def invalidate_cached_responses(sender, **kwargs):
+    # After commit, or a concurrent read could cache the old rows under the
+    # new version. Registered after the index updates above, so they have
+    # already run when the indexes are told about the new version.
+    transaction.on_commit(_bump_version)
+
+
+def _bump_version():
+    version = bump_version()
+    headword_index.follow(version)
+    gloss_index.follow(version)
@@ -0,0 +1,343 @@
+import threading
+from collections import Counter, defaultdict
+from rapidfuzz import fuzz
+from rapidfuzz import utils as fuzz_utils
+from .cache import get_version
+
+# Process-wide "did you mean" index over the headwords.
+#
+# Headwords are stored in the form token_sort_ratio compares them in
+# (processed, tokens sorted), and every key is broken into padded trigrams.
+# A lookup only scores the keys that share the most trigrams with the term,
+# instead of running token_sort_ratio against the whole dictionary.
+#
+# The index is built from the database on first use and remembers the shared
+# dictionary version (cache.py) it was built at. Every lookup compares that
+# with the current version, one cache read, and rebuilds when it has moved:
+# changes made by another worker, an import or any other process bump it too.
+# Changes made in this process are applied as they commit by the Entry signals
+# in signals.py, and the bump that follows them is adopted when it is the next
+# version (nothing else changed in between), so a worker's own edits don't
+# cost a rebuild.
+
+NGRAM_SIZE = 3
+
+# Number of best trigram-overlap keys that get an exact score
+MAX_CANDIDATES = 200
+
+# Length window scanned when the term shares no trigram with any key
+FALLBACK_LENGTH_WINDOW = 2
+
+
+def comparison_form(text):
+    """
+    The string thefuzz's token_sort_ratio actually compares for `text`, so a
+    plain ratio between two forms gives the same score.
+    """
+    return " ".join(sorted(fuzz_utils.default_process(text or "").split()))
+
+
+def ngrams(form):
+    padded = f"  {form} "
+    return {padded[i:i + NGRAM_SIZE] for i in range(len(padded) - NGRAM_SIZE + 1)}
+
+
+class VersionedIndex:
+    """
+    A process-wide index loaded from the database and tied to the dictionary
+    version it was loaded at. Subclasses implement _load and _reset.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._built = False
+        self._version = None
+
+    def build(self):
+        """(Re)loads the index from the database."""
+        with self._lock:
+            # Read before loading, so a change committing meanwhile leaves the
+            # version behind and the next lookup loads again
+            version = get_version()
+            self.clear()
+            self._load()
+            self._version = version
+            self._built = True
+
+    def clear(self):
+        """Drops everything; the next lookup rebuilds from the database."""
+        with self._lock:
+            self._reset()
+            self._built = False
+            self._version = None
+
+    def _ensure_current(self):
+        if not self._built or get_version() != self._version:
+            self.build()
+
+    def follow(self, version):
+        """
+        Called with the version this process just bumped to, after its own
+        changes were applied; keeps the index if no other bump came between.
+        """
+        with self._lock:
+            if self._built and self._version is not None and version == self._version + 1:
+                self._version = version
+
+
+class SuggestionIndex(VersionedIndex):
+    def __init__(self):
+        super().__init__()
+        # lower(headword) -> {entry_id: headword}; several entries share keys
+        self._keys = {}
+        # lower(headword) -> comparison form
+        self._forms = {}
+        # entry_id -> lower(headword)
+        self._entry_keys = {}
+        # trigram -> set of keys
+        self._postings = defaultdict(set)
+        # len(comparison form) -> set of keys
+        self._lengths = defaultdict(set)
+
+    # --- Maintenance ---
+
+    def _add_key(self, key):
+        form = self._forms[key] = comparison_form(key)
+        for gram in ngrams(form):
+            self._postings[gram].add(key)
+        self._lengths[len(form)].add(key)
+
+    def _remove_key(self, key):
+        form = self._forms.pop(key)
+        for gram in ngrams(form):
+            keys = self._postings.get(gram)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._postings[gram]
+        self._lengths[len(form)].discard(key)
+
+    def _set(self, entry_id, headword):
+        self._discard(entry_id)
+        key = headword.lower()
+        if key not in self._keys:
+            self._keys[key] = {}
+            self._add_key(key)
+        self._keys[key][entry_id] = headword
+        self._entry_keys[entry_id] = key
+
+    def _discard(self, entry_id):
+        key = self._entry_keys.pop(entry_id, None)
+        if key is None:
+            return
+        owners = self._keys[key]
+        owners.pop(entry_id, None)
+        if not owners:
+            del self._keys[key]
+            self._remove_key(key)
+
+    def _load(self):
+        from .models import Entry
+
+        for entry_id, headword in Entry.objects.values_list("id", "headword").iterator():
+            if headword:
+                self._set(entry_id, headword)
+
+    def _reset(self):
+        self._keys.clear()
+        self._forms.clear()
+        self._entry_keys.clear()
+        self._postings.clear()
+        self._lengths.clear()
+
+    def update(self, entry_id, headword):
+        """Records a saved entry. Ignored until the index has been built."""
+        with self._lock:
+            if not self._built:
+                return
+            if headword:
+                self._set(entry_id, headword)
+            else:
+                self._discard(entry_id)
+
+    def remove(self, entry_id):
+        """Forgets a deleted entry. Ignored until the index has been built."""
+        with self._lock:
+            if self._built:
+                self._discard(entry_id)
+
+    # --- Lookup ---
+
+    def _candidates(self, form):
+        overlap = Counter()
+        for gram in ngrams(form):
+            overlap.update(self._postings.get(gram, ()))
+        if overlap:
+            return [key for key, _ in overlap.most_common(MAX_CANDIDATES)]
+
+        candidates = []
+        for length in range(
+            len(form) - FALLBACK_LENGTH_WINDOW, len(form) + FALLBACK_LENGTH_WINDOW + 1
+        ):
+            candidates.extend(self._lengths.get(length, ()))
+        return candidates
+
+    def closest(self, term):
+        """
+        Returns the original headword whose lowercase form has the best
+        token_sort_ratio against `term`, or None if nothing is indexed.
+        """
+        with self._lock:
+            self._ensure_current()
+
+            form = comparison_form(term)
+            best_score = 0
+            best_key = None
+            for key in self._candidates(form):
+                # Rounded like thefuzz.fuzz.token_sort_ratio(term, key)
+                score = round(fuzz.ratio(form, self._forms[key]))
+                # Ties go to the alphabetically first key, so results don't
+                # depend on set iteration order
+                if score > best_score or (score == best_score and best_key and key < best_key):
+                    best_score = score
+                    best_key = key
+
+            if best_key is None:
+                return None
+            # Same headword for a key as the old cache: the last one loaded
+            owners = self._keys[best_key]
+            return owners[max(owners)]
+
+
+headword_index = SuggestionIndex()
+
+
+# Gloss fallback for get_definition_data.
+#
+# Glosses are split into the tokens token_set_ratio works with, and those
+# tokens are kept in an inverted index (token -> definitions). The vocabulary
+# itself is indexed by trigrams, so misspelled query tokens still reach the
+# glosses containing the words they resemble. Only those glosses are scored.
+# Like the headword index, it is rebuilt when the dictionary version moves and
+# follows this process's own Definition changes as they commit.
+
+GLOSS_SCORE_THRESHOLD = 60
+
+# Minimum trigram similarity (Dice coefficient) between a query token and a
+# gloss token for that token's definitions to be scored
+MIN_TOKEN_SIMILARITY = 0.3
+
+
+def gloss_tokens(text):
+    return set(fuzz_utils.default_process(text or "").split())
+
+
+class GlossIndex(VersionedIndex):
+    def __init__(self):
+        super().__init__()
+        # definition_id -> (entry_id, gloss)
+        self._definitions = {}
+        # token -> set of definition ids
+        self._postings = defaultdict(set)
+        # trigram -> set of tokens
+        self._vocabulary = defaultdict(set)
+
+    # --- Maintenance ---
+
+    def _set(self, definition_id, entry_id, gloss):
+        self._discard(definition_id)
+        self._definitions[definition_id] = (entry_id, gloss)
+        for token in gloss_tokens(gloss):
+            if token not in self._postings:
+                for gram in ngrams(token):
+                    self._vocabulary[gram].add(token)
+            self._postings[token].add(definition_id)
+
+    def _discard(self, definition_id):
+        previous = self._definitions.pop(definition_id, None)
+        if previous is None:
+            return
+        for token in gloss_tokens(previous[1]):
+            ids = self._postings.get(token)
+            if ids is None:
+                continue
+            ids.discard(definition_id)
+            if not ids:
+                del self._postings[token]
+                for gram in ngrams(token):
+                    tokens = self._vocabulary.get(gram)
+                    if tokens is not None:
+                        tokens.discard(token)
+                        if not tokens:
+                            del self._vocabulary[gram]
+
+    def _load(self):
+        from .models import Definition
+
+        rows = Definition.objects.values_list("id", "entry_id", "gloss").iterator()
+        for definition_id, entry_id, gloss in rows:
+            self._set(definition_id, entry_id, gloss)
+
+    def _reset(self):
+        self._definitions.clear()
+        self._postings.clear()
+        self._vocabulary.clear()
+
+    def update(self, definition_id, entry_id, gloss):
+        """Records a saved definition. Ignored until the index has been built."""
+        with self._lock:
+            if self._built:
+                self._set(definition_id, entry_id, gloss)
+
+    def remove(self, definition_id):
+        """Forgets a deleted definition. Ignored until the index has been built."""
+        with self._lock:
+            if self._built:
+                self._discard(definition_id)
+
+    # --- Lookup ---
+
+    def _similar_tokens(self, token):
+        grams = ngrams(token)
+        overlap = Counter()
+        for gram in grams:
+            overlap.update(self._vocabulary.get(gram, ()))
+        return [
+            candidate
+            for candidate, shared in overlap.items()
+            if 2 * shared / (len(grams) + len(ngrams(candidate))) >= MIN_TOKEN_SIMILARITY
+        ]
+
+    def _candidates(self, term):
+        candidates = set()
+        for token in gloss_tokens(term):
+            for similar in self._similar_tokens(token):
+                candidates |= self._postings[similar]
+        return candidates
+
+    def search(self, term, limit=50):
+        """
+        Ranks entries by the best token_set_ratio of any of their glosses
+        against `term`, keeping scores above GLOSS_SCORE_THRESHOLD.
+
+        @return: Up to `limit` (entry_id, score) pairs, best first, ties
+                 broken by the higher entry id like the old full scan.
+        """
+        with self._lock:
+            self._ensure_current()
+
+            best = {}
+            for definition_id in self._candidates(term):
+                entry_id, gloss = self._definitions[definition_id]
+                # Rounded like thefuzz.fuzz.token_set_ratio(term, gloss)
+                score = round(
+                    fuzz.token_set_ratio(term, gloss, processor=fuzz_utils.default_process)
+                )
+                if score > GLOSS_SCORE_THRESHOLD and score > best.get(entry_id, 0):
+                    best[entry_id] = score
+
+        ranked = sorted(best.items(), key=lambda item: (item[1], item[0]), reverse=True)
+        return ranked[:limit]
+
+
+gloss_index = GlossIndex()
@@ -1,3 +1,411 @@
-from django.test import TestCase
+import io
+import json
+import os
+import tempfile
+from unittest import mock
+from auditlog.models import LogEntry
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DatabaseError, transaction
+from django.db.models import Q
+from rest_framework import status
+from rest_framework.test import APITestCase
+from .cache import bump_version, get_version
+from .models import POS, Definition, Entry, EntrySearchIndex, Source, Variant
+from .suggestions import gloss_index, headword_index
+from .utils import find_closest_match, term_key
+from .views import get_vowel_regex
 
-# Create your tests here.
+User = get_user_model()
+
+
+class DictionaryTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="dict_user", password="dict_pass")
+        self.client.force_authenticate(self.user)
+        # The suggestion indexes and cached responses outlive each test's
+        # rolled back transaction
+        headword_index.clear()
+        gloss_index.clear()
+        cache.clear()
+
+        self.bonjou = Entry.objects.create(headword="bonjou")
+        Variant.objects.create(entry=self.bonjou, text="bonjour")
+        Definition.objects.create(
+            entry=self.bonjou, def_number=1, gloss="hello", examples="Bonjou, to byin?"
+        )
+        POS.objects.create(entry=self.bonjou, part_of_speech="int.")
+        Source.objects.create(entry=self.bonjou, text="LA")
+
+        self.fre = Entry.objects.create(headword="frè")
+        Definition.objects.create(entry=self.fre, def_number=1, gloss="brother", examples="")
+        POS.objects.create(entry=self.fre, part_of_speech="n.")
+        Source.objects.create(entry=self.fre, text="MO")
+
+        self.bon = Entry.objects.create(headword="Bon")
+        Definition.objects.create(entry=self.bon, def_number=1, gloss="good-hearted", examples="")
+        POS.objects.create(entry=self.bon, part_of_speech="adj.")
+
+
+class SearchIndexTests(DictionaryTestCase):
+    def test_signals_keep_index_current(self):
+        index = EntrySearchIndex.objects.get(entry=self.fre)
+        self.assertEqual(index.terms_folded, "fre")
+        self.assertEqual(index.terms_lower, "frè")
+
+        Variant.objects.create(entry=self.fre, text="Frèr")
+        index.refresh_from_db()
+        self.assertEqual(index.terms_folded, "fre\nfrer")
+        self.assertEqual(index.terms_folded_words, " fre \n frer ")
+
+
+class SuggestionTests(DictionaryTestCase):
+    def test_closest_match(self):
+        self.assertEqual(find_closest_match("bonjuo"), "bonjou")
+        self.assertEqual(find_closest_match("FRE"), "frè")
+
+    def test_index_follows_entry_changes(self):
+        self.assertEqual(find_closest_match("frere"), "frè")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Entry.objects.create(headword="frère")
+        self.assertEqual(find_closest_match("frere"), "frère")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.fre.headword = "sè"
+            self.fre.save()
+            Entry.objects.filter(headword="frère").get().delete()
+        self.assertEqual(find_closest_match("se"), "sè")
+        self.assertNotEqual(find_closest_match("fre"), "frè")
+
+    def test_index_ignores_rolled_back_changes(self):
+        self.assertEqual(find_closest_match("bonjuo"), "bonjou")
+        try:
+            with transaction.atomic():
+                Entry.objects.create(headword="bonjuor")
+                self.bonjou.delete()
+                raise DatabaseError
+        except DatabaseError:
+            pass
+        self.assertEqual(find_closest_match("bonjuo"), "bonjou")
+
+    def test_index_follows_other_processes(self):
+        self.assertEqual(find_closest_match("frere"), "frè")
+        # Changed elsewhere: no signal reaches this process, only the version
+        Entry.objects.filter(pk=self.fre.pk).update(headword="frère")
+        self.assertEqual(find_closest_match("frere"), "frè")
+        bump_version()
+        self.assertEqual(find_closest_match("frere"), "frère")
+
+        # This process's own changes are adopted without a rebuild...
+        with mock.patch.object(headword_index, "_load") as load:
+            with self.captureOnCommitCallbacks(execute=True):
+                Entry.objects.create(headword="sè")
+            self.assertEqual(find_closest_match("se"), "sè")
+            load.assert_not_called()
+
+        # ...unless another process bumped in between
+        version = get_version()
+        self.assertEqual(headword_index._version, version)
+        bump_version()
+        headword_index.follow(version + 2)
+        self.assertEqual(headword_index._version, version)
+        find_closest_match("se")
+        self.assertEqual(headword_index._version, version + 1)
+
+    def test_no_match(self):
+        self.assertIsNone(find_closest_match("?"))
+        self.assertEqual(
+            self.client.get("/dictionary/headwords/zzzz/exact/data").status_code,
+            status.HTTP_404_NOT_FOUND,
+        )
+
+
+class DefinitionFallbackTests(DictionaryTestCase):
+    def search(self, term):
+        return self.client.get(f"/dictionary/definitions/{term}/data")
+
+    def test_fuzzy_gloss_fallback_with_scores(self):
+        response = self.search("my brothr")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([r["headword"] for r in response.data], ["frè"])
+        self.assertEqual(response.data[0]["score"], 75)
+
+    def test_index_follows_definition_changes(self):
+        self.assertEqual(self.search("sistr").status_code, status.HTTP_404_NOT_FOUND)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            definition = Definition.objects.create(
+                entry=self.bon, def_number=2, gloss="sister", examples=""
+            )
+        self.assertEqual([r["headword"] for r in self.search("sistr").data], ["Bon"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            definition.delete()
+        self.assertEqual(self.search("sistr").status_code, status.HTTP_404_NOT_FOUND)
+
+        try:
+            with transaction.atomic():
+                Definition.objects.create(entry=self.bon, def_number=2, gloss="sister", examples="")
+                raise DatabaseError
+        except DatabaseError:
+            pass
+        self.assertEqual(self.search("sistr").status_code, status.HTTP_404_NOT_FOUND)
+
+
+    def test_index_follows_other_processes(self):
+        self.assertEqual(self.search("sistr").status_code, status.HTTP_404_NOT_FOUND)
+        Definition.objects.filter(entry=self.fre).update(gloss="sister")
+        bump_version()
+        self.assertEqual([r["headword"] for r in self.search("sistr").data], ["frè"])
+
+
+class GetTermDataTests(DictionaryTestCase):
+    def setUp(self):
+        super().setUp()
+        for headword in ("Bœuf", "Øle", "śè", "BONJOU"):
+            Entry.objects.create(headword=headword)
+        Variant.objects.create(entry=self.fre, text="Frér")
+
+    def lookup(self, term):
+        response = self.client.get(f"/dictionary/headwords/{term}/data")
+        return sorted(r["headword"] for r in response.data)
+
+    def regex_lookup(self, term):
+        pattern = get_vowel_regex(term)
+        return sorted(
+            Entry.objects.filter(
+                Q(headword=term)
+                | Q(headword__iregex=pattern)
+                | Q(variants__text__iregex=pattern)
+            )
+            .distinct()
+            .values_list("headword", flat=True)
+        )
+
+    def test_matches_previous_regex_lookup(self):
+        terms = [
+            "bonjou", "Bonjóu", "bonjour", "frer", "FRÈR", "beuf", "bouf",
+            "bœuf", "ole", "øle", "Ølé", "śè", "bon",
+        ]
+        for term in terms:
+            with self.subTest(term=term):
+                self.assertEqual(self.lookup(term), self.regex_lookup(term))
+
+    def test_misses_match_previous_regex_lookup(self):
+        # Neither spelling folds onto the other, so both fall back to suggestions
+        for term in ("boeuf", "se"):
+            with self.subTest(term=term):
+                self.assertEqual(self.regex_lookup(term), [])
+                self.assertFalse(
+                    Entry.objects.filter(term_keys__key=term_key(term)).exists()
+                )
+
+    def test_exact_headword_first(self):
+        response = self.client.get("/dictionary/headwords/BONJOU/data")
+        self.assertEqual([r["headword"] for r in response.data], ["BONJOU", "bonjou"])
+
+
+class GetNTermsTests(DictionaryTestCase):
+    url = "/dictionary/n_words/"
+
+    def headwords(self, **params):
+        response = self.client.get(self.url, {"limit": 10, **params})
+        if response.status_code == status.HTTP_404_NOT_FOUND:
+            return []
+        return [r["headword"] for r in response.data["results"]]
+
+    def test_orders_by_lowercase_headword(self):
+        self.assertEqual(self.headwords(), ["Bon", "bonjou", "frè"])
+
+    def test_accents(self):
+        self.assertEqual(self.headwords(q="fre"), ["frè"])
+        self.assertEqual(self.headwords(q="fre", match_accents=""), [])
+        self.assertEqual(self.headwords(q="frè", match_accents=""), ["frè"])
+
+    def test_matches_variants(self):
+        self.assertEqual(self.headwords(q="jour"), ["bonjou"])
+
+    def test_whole_word(self):
+        self.assertEqual(self.headwords(q="bon"), ["Bon", "bonjou"])
+        self.assertEqual(self.headwords(q="bon", whole_word=""), ["Bon"])
+
+    def test_whole_word_does_not_span_pieces(self):
+        Variant.objects.create(entry=self.bon, text="jou")
+        self.assertEqual(self.headwords(q="jou", whole_word=""), ["Bon"])
+        self.assertEqual(self.headwords(q="bon jou", whole_word=""), [])
+
+    def test_definitions_and_examples(self):
+        self.assertEqual(self.headwords(q="hello", search_definitions=""), ["bonjou"])
+        self.assertEqual(self.headwords(q="byin", search_definitions=""), [])
+        self.assertEqual(
+            self.headwords(q="byin", search_definitions="", search_examples=""),
+            ["bonjou"],
+        )
+        self.assertEqual(
+            self.headwords(q="hearted", search_definitions="", whole_word=""), ["Bon"]
+        )
+
+    def test_pos_and_source_filters(self):
+        self.assertEqual(self.headwords(part_of_speech="n."), ["frè"])
+        self.assertEqual(self.headwords(q="bon", source="LA"), ["bonjou"])
+
+    def test_cursor_and_limit(self):
+        self.assertEqual(self.headwords(cursor="bonjou", limit=1), ["bonjou"])
+        self.assertEqual(self.headwords(cursor="missing", limit=2), ["Bon", "bonjou"])
+
+    def test_invalid_limit(self):
+        for limit in ("x", -1, 0, 1000000):
+            with self.subTest(limit=limit):
+                response = self.client.get(self.url, {"limit": limit})
+                self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class BrowseHeadwordsTests(DictionaryTestCase):
+    url = "/dictionary/headwords/browse/"
+
+    def setUp(self):
+        super().setUp()
+        # Duplicate headwords are common in the source dictionary
+        self.duplicates = [Entry.objects.create(headword="bon") for _ in range(3)]
+
+    def walk(self, limit):
+        pages, cursor = [], None
+        while True:
+            params = {"limit": limit, **({"cursor": cursor} if cursor else {})}
+            response = self.client.get(self.url, params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            pages.append(response.data)
+            cursor = response.data["next_cursor"]
+            if not cursor:
+                return pages
+
+    def test_pages_do_not_skip_or_repeat_duplicates(self):
+        expected = list(
+            Entry.objects.order_by("search_index__sort_key", "id").values_list("id", flat=True)
+        )
+        for limit in (1, 2, 4):
+            pages = self.walk(limit)
+            seen = [r["headword"] for page in pages for r in page["results"]]
+            self.assertEqual(len(seen), len(expected))
+            self.assertEqual(seen, ["Bon", "bon", "bon", "bon", "bonjou", "frè"])
+
+    def test_prev_cursor_returns_previous_page(self):
+        first, second = self.walk(2)[:2]
+        self.assertIsNone(first["prev_cursor"])
+        response = self.client.get(self.url, {"limit": 2, "cursor": second["prev_cursor"]})
+        self.assertEqual(response.data["results"], first["results"])
+
+    def test_invalid_cursor(self):
+        response = self.client.get(self.url, {"cursor": "not-a-cursor"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_n_terms_next_cursor(self):
+        response = self.client.get("/dictionary/n_words/", {"q": "bon", "limit": 2})
+        next_page = self.client.get(
+            "/dictionary/n_words/",
+            {"q": "bon", "limit": 2, "cursor": response.data["next_cursor"]},
+        )
+        self.assertEqual(
+            [r["headword"] for r in next_page.data["results"]], ["bon", "bon"]
+        )
+
+
+class BulkImportExportTests(DictionaryTestCase):
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def path(self, name):
+        return os.path.join(self.directory.name, name)
+
+    def export(self, name):
+        call_command("export_dictionary", self.path(name), stdout=io.StringIO())
+        with open(self.path(name), encoding="utf-8") as f:
+            return f.read()
+
+    def load(self, name, *args):
+        call_command("import_dictionary", self.path(name), *args, stdout=io.StringIO())
+
+    def test_round_trip(self):
+        for name in ("dump.jsonl", "dump.csv"):
+            with self.subTest(format=name):
+                before = self.export(name)
+                self.load(name, "--replace", "--batch-size", "2")
+                self.assertEqual(Entry.objects.count(), 3)
+                self.assertEqual(self.export(name), before)
+
+        record = json.loads(self.export("dump.jsonl").splitlines()[0])
+        self.assertEqual(record["variants"], [{"text": "bonjour", "sources": []}])
+        self.assertEqual(record["sources"], ["LA"])
+
+    def test_history_and_indexes(self):
+        with open(self.path("new.jsonl"), "w", encoding="utf-8") as f:
+            f.write(json.dumps({
+                "headword": "lamézon",
+                "variants": [{"text": "lamaison", "sources": ["LA"]}],
+                "definitions": [{"gloss": "house"}],
+                "parts_of_speech": ["n."],
+            }) + "\n")
+
+        self.load("new.jsonl", "--history", "skip")
+        entry = Entry.objects.get(headword="lamézon")
+        self.assertFalse(entry.history.exists())
+        self.assertFalse(LogEntry.objects.get_for_object(entry).exists())
+        self.assertEqual(entry.sources.get().variant.text, "lamaison")
+
+        # Search indexes are rebuilt after the load
+        response = self.client.get("/dictionary/n_words/", {"q": "lamezon"})
+        self.assertEqual([r["headword"] for r in response.data["results"]], ["lamézon"])
+        self.assertEqual(find_closest_match("lamezon"), "lamézon")
+
+        self.load("new.jsonl", "--replace")
+        entry = Entry.objects.get()
+        self.assertEqual(entry.history.get().history_type, "+")
+        self.assertEqual(LogEntry.objects.get_for_object(entry).get().action, LogEntry.Action.CREATE)
+        self.assertEqual(
+            self.bonjou.history.filter(history_type="-").count(), 1
+        )
+
+    def test_invalid_file(self):
+        with open(self.path("bad.jsonl"), "w", encoding="utf-8") as f:
+            f.write('{"headword": "ok"}\n{"variants": []}\n')
+        with self.assertRaisesMessage(Exception, "Line 2: missing headword."):
+            self.load("bad.jsonl", "--replace")
+        # Nothing was written
+        self.assertEqual(Entry.objects.count(), 3)
+
+
+class ResponseCacheTests(DictionaryTestCase):
+    url = "/dictionary/headwords/bonjou/data"
+
+    def test_cache_hit_and_invalidation(self):
+        first = self.client.get(self.url)
+        with self.assertNumQueries(0):
+            second = self.client.get(self.url)
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second["ETag"], first["ETag"])
+
+        # The version only moves once the change commits, so no read in
+        # between can cache the old rows under the new one
+        with self.captureOnCommitCallbacks() as callbacks:
+            Definition.objects.create(entry=self.bonjou, def_number=2, gloss="good day")
+        self.assertEqual(self.client.get(self.url)["ETag"], first["ETag"])
+        for callback in callbacks:
+            callback()
+        third = self.client.get(self.url)
+        self.assertNotEqual(third["ETag"], first["ETag"])
+        self.assertEqual(len(third.data[0]["definitions"]), 2)
+
+    def test_if_none_match(self):
+        etag = self.client.get("/dictionary/pos/")["ETag"]
+        response = self.client.get("/dictionary/pos/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            POS.objects.create(entry=self.fre, part_of_speech="v.")
+        response = self.client.get("/dictionary/pos/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, ["adj.", "int.", "n.", "v."])
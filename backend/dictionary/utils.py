@@ -1,74 +1,75 @@
 import unicodedata
 import re
-from thefuzz import fuzz
 
-# --- 1. Global Cache and Constants ---
-
-# Global cache: { 'normalized_word': 'Original Word with Accents' }
-NORMALIZED_HEADWORDS_CACHE = {} 
-
-# --- 3. Cache Management Function ---
+# --- 1. Headword Suggestions ---
 
 def build_headword_cache():
     """
-    Fetches all headwords from the database, normalizes them, 
-    and stores them in the in-memory global cache.
+    Reloads the process-wide suggestion index from the database. The index
+    builds itself on first use and rebuilds whenever the dictionary version
+    changes, so this is only needed after changes that bypass both the
+    signals and the version (raw SQL on the dictionary tables).
     """
-    # Import models here to avoid circular imports during startup
-    from .models import Entry 
-    
-    try:
-        # Fetch all entries, only selecting the headword field
-        all_entries = Entry.objects.all().values_list('headword', flat=True)
-        
-        # Clear cache before rebuilding
-        NORMALIZED_HEADWORDS_CACHE.clear()
-        
-        for headword in all_entries:
-            norm_word = headword.lower()
-            # Store the original headword as the value, so we can return it to the user
-            NORMALIZED_HEADWORDS_CACHE[norm_word] = headword
-        
-        print(f"[Dictionary Util] Cache built successfully with {len(NORMALIZED_HEADWORDS_CACHE)} entries.")
-        
-    except Exception as e:
-        # This can fail if the database isn't migrated yet during initial setup
-        print(f"[Dictionary Util] WARNING: Could not build headword cache. Error: {e}")
-
-
-# --- 4. Fuzzy Search Function ---
+    # Import here to avoid circular imports during startup
+    from .suggestions import headword_index
+
+    headword_index.build()
+
+
+# --- 2. Fuzzy Search Function ---
 
 def find_closest_match(term):
     """
-    Searches the cached normalized headwords for the closest match 
-    to the user's input 'term' using thefuzz (Levenshtein distance).
-    
-    Returns: The original (un-normalized) headword string if score >= THRESHOLD, 
-             otherwise None.
+    Finds the headword closest to the user's input 'term' using thefuzz
+    (Levenshtein distance). Only the headwords sharing the most trigrams with
+    the term are scored, see suggestions.SuggestionIndex.
+
+    Returns: The original (un-normalized) headword string, or None if there
+             is no headword with a non-zero score.
     """
-    build_headword_cache()
-
-    best_score = 0
-    closest_match_key = None
-
-    # Iterate over the normalized keys in the cache
-    for normalized_key in NORMALIZED_HEADWORDS_CACHE.keys():
-        # token_sort_ratio is robust to different word ordering/spacing, 
-        # which is useful if your aggressive_normalize didn't remove spaces.
-        # Since we removed spaces, ratio() or partial_ratio() might also work well.
-        score = fuzz.token_sort_ratio(term, normalized_key)
-        
-        if score > best_score:
-            best_score = score
-            closest_match_key = normalized_key
-
-    # Check if the best score meets your quality bar
-    if closest_match_key:
-        return NORMALIZED_HEADWORDS_CACHE[closest_match_key]
-    
-    return None
-
-# --- 5. Match Whole Words Function ---
+    from .suggestions import headword_index
+
+    return headword_index.closest(term)
+
+# --- 3. Accent-Insensitive Term Matching ---
+
+# Base letters and every character a term lookup treats as the same letter
+VOWEL_CLASSES = {
+    "a": "aàáâãäå",
+    "e": "eèéêëœ",
+    "i": "iìíîï",
+    "o": "oòóôõöøœ",
+    "u": "uùúûü",
+    "y": "yýÿ",
+    "n": "nñ",
+    "c": "cç",
+}
+
+# Maximum number of keys stored for one text (each œ/ø multiplies them)
+MAX_TERM_KEYS = 32
+
+
+def term_key(term):
+    """The key a term is looked up by: accents stripped, lowercased."""
+    return strip_accents(term).lower()
+
+
+def term_keys(text):
+    """
+    Every term_key() that matches `text` the way get_vowel_regex(term) did:
+    a character of the text matches the base letter of any class it is in,
+    and itself when stripping accents leaves it unchanged (ø, œ).
+    """
+    keys = [""]
+    for char in (text or "").lower():
+        options = [base for base, chars in VOWEL_CLASSES.items() if char in chars]
+        if not options or strip_accents(char) == char and char not in options:
+            options.append(char)
+        keys = [key + option for key in keys for option in options][:MAX_TERM_KEYS]
+    return set(keys) if text else set()
+
+
+# --- 4. Match Whole Words Function ---
 
 def strip_accents(text):
     """
@@ -1,5 +1,5 @@
 import re
-from django.db.models import Q, Prefetch, Case, When, Value, IntegerField
+from django.db.models import Q, Prefetch, Case, When, Value, IntegerField, Exists, OuterRef
 from drf_spectacular.utils import (
     extend_schema_view,
     OpenApiParameter,
@@ -11,10 +11,15 @@ from rest_framework import serializers, status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
-from thefuzz import fuzz
-from .utils import find_closest_match, strip_accents, whole_word_match
+from .utils import VOWEL_CLASSES, find_closest_match, strip_accents, term_key, term_keys
+from .suggestions import gloss_index
+from .search import search_entries
+from .cache import cached_response
+from .pagination import NEXT, decode_cursor, paginate
 from .serializers import EntrySerializer, POSSerializer, SourceSerializer
-from .models import Definition, Entry, Variant, Source, POS
+from .models import Entry, Variant, Source, POS, TermKey
+
+MAX_PAGE_SIZE = 200
 
 
 @extend_schema(
@@ -25,6 +30,7 @@ from .models import Definition, Entry, Variant, Source, POS
 )
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
+@cached_response
 def get_all_pos(request):
     all_pos = (
         POS.objects.exclude(part_of_speech__isnull=True)
@@ -33,7 +39,7 @@ def get_all_pos(request):
         .distinct()
         .order_by("part_of_speech")
     )
-    return Response(all_pos, status=status.HTTP_200_OK)
+    return Response(list(all_pos), status=status.HTTP_200_OK)
 
 
 @extend_schema(
@@ -44,6 +50,7 @@ def get_all_pos(request):
 )
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
+@cached_response
 def get_all_sources(request):
     all_sources = (
         Source.objects.exclude(text__isnull=True)
@@ -53,7 +60,7 @@ def get_all_sources(request):
         .order_by("text")
     )
 
-    return Response(all_sources, status=status.HTTP_200_OK)
+    return Response(list(all_sources), status=status.HTTP_200_OK)
 
 
 @extend_schema(
@@ -71,25 +78,71 @@ def get_all_sources(request):
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
 def get_n_to_m_headwords(request, n, m):
-    if n > m or m > Entry.objects.count() or n < 0:
+    if n > m or n < 0:
+        return Response(status=status.HTTP_400_BAD_REQUEST)
+    entries = list(Entry.objects.all()[n:m])
+    # A short slice means m is past the end of the table (no COUNT(*) needed)
+    if len(entries) < m - n:
         return Response(status=status.HTTP_400_BAD_REQUEST)
-    entries = Entry.objects.all()[n:m]
     serializer = EntrySerializer(entries, many=True)
     return Response(serializer.data, status=status.HTTP_200_OK)
 
 
+@extend_schema(
+    tags=["Dictionary"],
+    summary="Browse headwords.",
+    description="Page through all entries ordered by lowercase headword. Pass the returned next_cursor or prev_cursor back as ?cursor= to move between pages; every page costs the same no matter how deep it is. Entries sharing a headword are never skipped or repeated across pages.",
+    parameters=[
+        OpenApiParameter("cursor", str, OpenApiParameter.QUERY),
+        OpenApiParameter("limit", int, OpenApiParameter.QUERY),
+    ],
+    responses={
+        200: inline_serializer(
+            name="BrowseHeadwordsResponse",
+            fields={
+                "results": EntrySerializer(many=True),
+                "next_cursor": serializers.CharField(allow_null=True),
+                "prev_cursor": serializers.CharField(allow_null=True),
+            },
+        ),
+        400: OpenApiResponse(description="Invalid cursor or limit."),
+    },
+)
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def browse_headwords(request):
+    cursor = request.GET.get("cursor", "")
+    position = decode_cursor(cursor)
+    try:
+        limit = int(request.GET.get("limit", 50))
+    except ValueError:
+        limit = 0
+    if (cursor and position is None) or not 0 < limit <= MAX_PAGE_SIZE:
+        return Response(
+            {"message": "Invalid cursor or limit."}, status=status.HTTP_400_BAD_REQUEST
+        )
+
+    variants_prefetch = Prefetch(
+        "variants", queryset=Variant.objects.prefetch_related("sources")
+    )
+    entries = Entry.objects.prefetch_related(
+        "definitions", "parts_of_speech", "sources", variants_prefetch
+    )
+    rows, next_cursor, prev_cursor = paginate(entries, limit, position)
+
+    return Response(
+        {
+            "results": EntrySerializer(rows, many=True).data,
+            "next_cursor": next_cursor,
+            "prev_cursor": prev_cursor,
+        },
+        status=status.HTTP_200_OK,
+    )
+
+
 def get_vowel_regex(term):
     # Map base vowels to their possible accented versions
-    vowel_map = {
-        "a": "[aàáâãäå]",
-        "e": "[eèéêëœ]",
-        "i": "[iìíîï]",
-        "o": "[oòóôõöøœ]",
-        "u": "[uùúûü]",
-        "y": "[yýÿ]",
-        "n": "[nñ]",
-        "c": "[cç]",
-    }
+    vowel_map = {base: f"[{chars}]" for base, chars in VOWEL_CLASSES.items()}
 
     # 1. Strip existing accents and lowercase to get the "base" string
     base_term = strip_accents(term).lower()
@@ -116,15 +169,17 @@ def get_vowel_regex(term):
 )
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
+@cached_response
 def get_term_data(request, term):
-    norm_term = strip_accents(term).lower()
-    regex_pattern = get_vowel_regex(term)
+    # Indexed probes into the folded key table replace the old iregex match
+    # of get_vowel_regex(term) against headwords and variants
+    keys = TermKey.objects.filter(entry=OuterRef("pk"))
 
     entries = (
         Entry.objects.filter(
-            Q(headword=term)
-            | Q(headword__iregex=regex_pattern)
-            | Q(variants__text__iregex=regex_pattern)
+            Exists(keys.filter(key=term_key(term)))
+            # Exact headwords whose accents get_vowel_regex can't express
+            | (Q(headword=term) & Exists(keys.filter(key__in=term_keys(term), variant=None)))
         )
         .annotate(
             # Create a temporary priority field: 1 for exact match, 2 for others
@@ -135,7 +190,6 @@ def get_term_data(request, term):
             )
         )
         .order_by("priority", "headword")
-        .distinct()
     )
     top_50_enteris = entries[:50]
 
@@ -166,6 +220,7 @@ def get_term_data(request, term):
 )
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
+@cached_response
 def get_term_exact_data(request, term):
     entries = Entry.objects.filter(headword=term)
 
@@ -186,7 +241,7 @@ def get_term_exact_data(request, term):
 @extend_schema(
     tags=["Dictionary"],
     summary="Search within definitions.",
-    description="Search for a term within the 'gloss' of all definitions using a regular expression. The search is case-insensitive and accent-insensitive. If no entries are found, it suggests entries for the closest matching headword. Returns up to 50 matching entries.",
+    description="Search for a term within the 'gloss' of all definitions using a regular expression. The search is case-insensitive and accent-insensitive. If no entries are found, it suggests the entries with the closest matching glosses (fuzzy token match), each with its 'score'. Returns up to 50 matching entries.",
     responses={
         200: EntrySerializer(many=True),
         404: OpenApiResponse(
@@ -214,43 +269,25 @@ def get_definition_data(request, term):
         serializer = EntrySerializer(top_50_entries, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
     else:
-        # Fallback: Find the top 50 definitions with the closest matching gloss
-        matches = []
-        # Fetch only the necessary fields to optimize memory usage
-        all_definitions = list(Definition.objects.values("gloss", "entry_id"))
-
-        for definition in all_definitions:
-            # token_set_ratio is good for finding a phrase within a larger text block
-            score = fuzz.token_set_ratio(term, definition["gloss"])
-            # A threshold of 60 is a decent starting point to avoid irrelevant results
-            if score > 60:
-                matches.append({"score": score, "entry_id": definition["entry_id"]})
+        # Fallback: the top 50 entries with the closest matching gloss, only
+        # scoring the glosses that share (possibly misspelled) words with the term
+        matches = gloss_index.search(term, limit=50)
 
         if matches:
-            # Sort by score descending, then by entry_id to have a stable sort
-            matches.sort(key=lambda x: (x["score"], x["entry_id"]), reverse=True)
-
-            # Get unique entry IDs while preserving order of first appearance
-            seen_ids = set()
-            unique_ordered_ids = []
-            for match in matches:
-                if match["entry_id"] not in seen_ids:
-                    seen_ids.add(match["entry_id"])
-                    unique_ordered_ids.append(match["entry_id"])
-
-            # Limit to the top 50 unique entries
-            top_50_ids = unique_ordered_ids[:50]
-
-            # Preserve the sort order from the fuzzy match in the final queryset
-            preserved_order = Case(
-                *[When(pk=pk, then=pos) for pos, pk in enumerate(top_50_ids)]
+            scores = dict(matches)
+            suggested_entries = Entry.objects.filter(pk__in=scores).prefetch_related(
+                "definitions", "parts_of_speech", "sources", "variants__sources"
             )
-            suggested_entries = Entry.objects.filter(pk__in=top_50_ids).order_by(
-                preserved_order
+            # Preserve the sort order from the fuzzy match
+            suggested_entries = sorted(
+                suggested_entries, key=lambda e: (scores[e.pk], e.pk), reverse=True
             )
 
             serializer = EntrySerializer(suggested_entries, many=True)
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            data = serializer.data
+            for item, entry in zip(data, suggested_entries):
+                item["score"] = scores[entry.pk]
+            return Response(data, status=status.HTTP_200_OK)
 
         # If no match is found at all, return an empty list with a 404.
         return Response([], status=status.HTTP_404_NOT_FOUND)
@@ -259,7 +296,7 @@ def get_definition_data(request, term):
 @extend_schema(
     tags=["Dictionary"],
     summary="Get n terms",
-    description="Get terms starting at cursor and up to the limit. For example, ?cursor=bon&limit=50 will return bon + the next 49 words.",
+    description="Get terms starting at cursor and up to the limit. The cursor is either a next_cursor/prev_cursor returned by a previous call with the same filters, or (legacy) a headword: ?cursor=bon&limit=50 will return bon + the next 49 words.",
     parameters=[
         OpenApiParameter("cursor", str, OpenApiParameter.QUERY),
         OpenApiParameter("limit", int, OpenApiParameter.QUERY),
@@ -401,8 +438,11 @@ def get_definition_data(request, term):
                 ),
                 "result_count": serializers.IntegerField(),
                 "results": EntrySerializer(many=True),
+                "next_cursor": serializers.CharField(allow_null=True),
+                "prev_cursor": serializers.CharField(allow_null=True),
             },
         ),
+        400: OpenApiResponse(description="Invalid limit."),
         404: OpenApiResponse(description="No terms found with given parameters."),
     },
 )
@@ -410,7 +450,14 @@ def get_definition_data(request, term):
 @permission_classes([IsAuthenticated])
 def get_n_terms(request):
     cursor = request.GET.get("cursor", "").strip()
-    limit = int(request.GET.get("limit", ""))
+    try:
+        limit = int(request.GET.get("limit", 50))
+    except ValueError:
+        limit = 0
+    if not 0 < limit <= MAX_PAGE_SIZE:
+        return Response(
+            {"message": "Invalid limit."}, status=status.HTTP_400_BAD_REQUEST
+        )
     query = request.GET.get("q", "").strip()
     search_definitions = "search_definitions" in request.GET
     whole_word = "whole_word" in request.GET
@@ -419,161 +466,43 @@ def get_n_terms(request):
     selected_pos = request.GET.get("part_of_speech", "")
     selected_source = request.GET.get("source", "")
 
-    display_query = query
-    search_query = strip_accents(query) if not match_accents else query
+    # --- Compile every filter into one queryset (see dictionary/search.py) ---
+    results = search_entries(
+        query,
+        search_definitions=search_definitions,
+        whole_word=whole_word,
+        match_accents=match_accents,
+        search_examples=search_examples,
+        part_of_speech=selected_pos,
+        source=selected_source,
+    )
 
-    # Prefetch related objects to avoid N+1 queries
+    # --- Opaque keyset cursor, or (legacy) the headword to start at ---
+    position = decode_cursor(cursor)
+    if position is None and cursor:
+        anchor = (
+            results.filter(headword=cursor)
+            .values("search_index__sort_key", "id")
+            .first()
+        )
+        if anchor:
+            # Starting *at* (key, id) is the same as starting after (key, id - 1)
+            position = (anchor["search_index__sort_key"], anchor["id"] - 1, NEXT)
+
+    # --- Only the requested page is ever loaded and serialized ---
     variants_prefetch = Prefetch(
         "variants", queryset=Variant.objects.prefetch_related("sources")
     )
-    results = (
-        Entry.objects.all()
-        .prefetch_related(
+    limited_results, next_cursor, prev_cursor = paginate(
+        results.prefetch_related(
             "definitions", "parts_of_speech", "sources", variants_prefetch
-        )
-        .distinct()
+        ),
+        limit,
+        position,
     )
 
-    # --- Apply search query ---
-    if search_query:
-        search_norm = (
-            search_query.lower()
-            if match_accents
-            else strip_accents(search_query).lower()
-        )
-        filtered = []
-
-        for entry in results:
-            definitions_match = False
-            head_matches = False
-            variant_matches = False
-
-            # --- Definitions search ---
-            if search_definitions == True:
-                for definition in entry.definitions.all():
-                    gloss = definition.gloss or ""
-                    examples = definition.examples or ""
-                    text_to_search = f"{gloss} {examples}" if search_examples else gloss
-
-                    if whole_word:
-                        if whole_word_match(text_to_search, query, match_accents):
-                            definitions_match = True
-                            break
-                    else:
-                        text_norm = (
-                            text_to_search
-                            if match_accents
-                            else strip_accents(text_to_search)
-                        )
-                        if search_norm in text_norm.lower():
-                            definitions_match = True
-                            break
-            else:
-                # --- Headword match ---
-                head = entry.headword or ""
-                if whole_word:
-                    head_matches = whole_word_match(head, query, match_accents)
-                else:
-                    head_norm = head if match_accents else strip_accents(head)
-                    head_matches = search_norm in head_norm.lower()
-
-                # --- Variant match ---
-                if whole_word:
-                    variant_matches = any(
-                        whole_word_match(v.text or "", query, match_accents)
-                        for v in entry.variants.all()
-                    )
-                else:
-                    variant_matches = any(
-                        search_norm
-                        in (v.text if match_accents else strip_accents(v.text)).lower()
-                        for v in entry.variants.all()
-                    )
-
-            # --- POS filter ---
-            pos_matches = True
-            if selected_pos:
-                pos_matches = any(
-                    p.part_of_speech == selected_pos
-                    for p in entry.parts_of_speech.all()
-                )
-
-            # --- Source filter ---
-            source_matches = True
-            if selected_source:
-                entry_sources = [s.text.strip() for s in entry.sources.all() if s.text]
-                variant_sources = [
-                    s.text.strip()
-                    for v in entry.variants.all()
-                    for s in v.sources.all()
-                    if s.text
-                ]
-                source_matches = (
-                    selected_source in entry_sources
-                    or selected_source in variant_sources
-                )
-
-            # --- Include entry if it passes filters ---
-            if (
-                (definitions_match or head_matches or variant_matches)
-                and pos_matches
-                and source_matches
-            ):
-                filtered.append(entry)
-
-        # --- Apply POS & Source filters for remaining results ---
-        if selected_pos:
-            results = results.filter(parts_of_speech__part_of_speech=selected_pos)
-        if selected_source:
-            results = results.filter(
-                Q(sources__text=selected_source)
-                | Q(variants__sources__text=selected_source)
-            ).distinct()
-
-        results = filtered
-
-    # --- Prepare sources for display ---
-    processed_results = []
-    for entry in results:
-        # --- Entry-level sources only ---
-        entry_sources = [
-            s.text.strip()
-            for s in entry.sources.all()
-            if s.text and s.text.strip() and s.variant_id is None
-        ]
-        entry.sources_display = (
-            ", ".join(entry_sources) if entry_sources else "No sources"
-        )
-
-        variants_list = []
-        for variant in entry.variants.all():
-            variant_sources = [s.text.strip() for s in variant.sources.all() if s.text]
-            variant.sources_display = (
-                ", ".join(variant_sources) if variant_sources else "No sources"
-            )
-            variants_list.append(variant)
-
-        entry.variants_display = variants_list
-        processed_results.append(entry)
-
-    processed_results.sort(key=lambda e: (e.headword or "").lower())
-
-    # 1. Determine the start index based on the 'cursor' string
-    try:
-        # This assumes 'cursor' matches an entry's headword or unique identifier
-        start_index = next(
-            i for i, e in enumerate(processed_results) if e.headword == cursor
-        )
-    except (ValueError, StopIteration):
-        # Fallback to the beginning if the cursor is not found
-        start_index = 0
-
-    # 2. Slice from start_index up to the limit
-    # Note: start_index + limit is the exclusive stop index
-    limited_results = processed_results[start_index : start_index + limit]
-
     data = {
-        "query": display_query,
+        "query": query,
         "search_definitions": search_definitions,
         "whole_word": whole_word,
         "match_accents": match_accents,
@@ -581,11 +510,11 @@ def get_n_terms(request):
         "selected_pos": selected_pos,
         "selected_source": selected_source,
         "result_count": len(limited_results),
-        "results": limited_results,
+        "results": EntrySerializer(limited_results, many=True).data,
+        "next_cursor": next_cursor,
+        "prev_cursor": prev_cursor,
     }
 
-    data["results"] = EntrySerializer(limited_results, many=True).data
-
     if not data["results"]:
         return Response(data, status=status.HTTP_404_NOT_FOUND)
 
@@ -0,0 +1,229 @@
+import bisect
+import contextvars
+import heapq
+import logging
+import os
+import threading
+import time
+from contextlib import ExitStack
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger("heritage_project_backend.slow_requests")
+
+# Per-request timings, aggregated per endpoint.
+#
+# InstrumentationMiddleware measures every request: wall time, the number and
+# total time of its SQL queries (through connection.execute_wrapper), the time
+# spent producing serializer.data, and the response size. They are sent back
+# in a Server-Timing header and added to the process-wide METRICS, which the
+# admin-only metrics view returns as histograms. Each worker process keeps its
+# own numbers.
+#
+# Requests slower than settings.SLOW_REQUEST_MS (None to turn it off) are
+# logged with their settings.SLOW_REQUEST_TOP_SQL slowest statements.
+
+# Upper bounds of the histogram buckets; the last bucket is unbounded
+BUCKETS = {
+    "wall_ms": (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000),
+    "db_ms": (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500),
+    "queries": (0, 1, 2, 5, 10, 20, 50, 100, 200),
+    "serializer_ms": (1, 5, 10, 25, 50, 100, 250, 500, 1000),
+    "response_bytes": (1_000, 10_000, 50_000, 100_000, 500_000, 1_000_000, 5_000_000),
+}
+
+# Longest SQL text kept for the slow-request log
+MAX_SQL_LENGTH = 1000
+
+_current = contextvars.ContextVar("request_timings", default=None)
+
+
+class RequestTimings:
+    def __init__(self, top_sql=0):
+        self.queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self._serializing = 0
+        self._top_sql = top_sql
+        self.slowest_sql = []  # min-heap of (duration, sql)
+
+    def __call__(self, execute, sql, params, many, context):
+        # connection.execute_wrapper() hook
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            self.queries += 1
+            self.db_time += duration
+            if self._top_sql:
+                entry = (duration, sql[:MAX_SQL_LENGTH])
+                if len(self.slowest_sql) < self._top_sql:
+                    heapq.heappush(self.slowest_sql, entry)
+                elif entry > self.slowest_sql[0]:
+                    heapq.heapreplace(self.slowest_sql, entry)
+
+
+class Histogram:
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.total = 0
+        self.max = 0
+
+    def add(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def as_dict(self, count):
+        buckets, cumulative = {}, 0
+        for bound, n in zip([*map(str, self.bounds), "+Inf"], self.counts):
+            cumulative += n
+            buckets[bound] = cumulative
+        return {
+            "buckets": buckets,
+            "sum": round(self.total, 3),
+            "avg": round(self.total / count, 3) if count else 0,
+            "max": round(self.max, 3),
+        }
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints = {}
+
+    def record(self, endpoint, status, values):
+        with self._lock:
+            entry = self._endpoints.get(endpoint)
+            if entry is None:
+                entry = self._endpoints[endpoint] = {
+                    "count": 0,
+                    "statuses": {},
+                    "histograms": {name: Histogram(bounds) for name, bounds in BUCKETS.items()},
+                }
+            entry["count"] += 1
+            entry["statuses"][status] = entry["statuses"].get(status, 0) + 1
+            for name, value in values.items():
+                entry["histograms"][name].add(value)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "pid": os.getpid(),
+                "endpoints": {
+                    endpoint: {
+                        "count": entry["count"],
+                        "statuses": dict(entry["statuses"]),
+                        **{
+                            name: histogram.as_dict(entry["count"])
+                            for name, histogram in entry["histograms"].items()
+                        },
+                    }
+                    for endpoint, entry in sorted(self._endpoints.items())
+                },
+            }
+
+    def reset(self):
+        with self._lock:
+            self._endpoints.clear()
+
+
+METRICS = Metrics()
+
+
+def _patch_serializer_data():
+    """Times BaseSerializer.data, which every serializer's .data goes through."""
+    from rest_framework.serializers import BaseSerializer
+
+    data = BaseSerializer.data
+    if getattr(data.fget, "_timed", False):
+        return
+
+    def timed_data(serializer):
+        timings = _current.get()
+        if timings is None:
+            return data.fget(serializer)
+        # Nested .data calls are part of the outermost one
+        timings._serializing += 1
+        start = time.perf_counter()
+        try:
+            return data.fget(serializer)
+        finally:
+            timings._serializing -= 1
+            if not timings._serializing:
+                timings.serializer_time += time.perf_counter() - start
+
+    timed_data._timed = True
+    BaseSerializer.data = property(timed_data)
+
+
+def endpoint_name(request):
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return "<unresolved>"
+    return match.view_name if match.url_name else match.route
+
+
+class InstrumentationMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        _patch_serializer_data()
+
+    def __call__(self, request):
+        slow_ms = getattr(settings, "SLOW_REQUEST_MS", 1000)
+        timings = RequestTimings(
+            top_sql=getattr(settings, "SLOW_REQUEST_TOP_SQL", 5) if slow_ms is not None else 0
+        )
+        token = _current.set(timings)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(timings))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        wall_ms = (time.perf_counter() - start) * 1000
+
+        db_ms = timings.db_time * 1000
+        serializer_ms = timings.serializer_time * 1000
+        size = len(response.content) if not response.streaming else 0
+        response["Server-Timing"] = ", ".join(
+            [
+                f"total;dur={wall_ms:.1f}",
+                f'db;dur={db_ms:.1f};desc="{timings.queries} queries"',
+                f"serializer;dur={serializer_ms:.1f}",
+            ]
+        )
+
+        endpoint = endpoint_name(request)
+        METRICS.record(
+            endpoint,
+            response.status_code,
+            {
+                "wall_ms": wall_ms,
+                "db_ms": db_ms,
+                "queries": timings.queries,
+                "serializer_ms": serializer_ms,
+                "response_bytes": size,
+            },
+        )
+
+        if slow_ms is not None and wall_ms >= slow_ms:
+            logger.warning(
+                "Slow request %s %s (%s): %.0fms, %d queries in %.0fms, serializers %.0fms%s",
+                request.method,
+                request.get_full_path(),
+                endpoint,
+                wall_ms,
+                timings.queries,
+                db_ms,
+                serializer_ms,
+                "".join(
+                    f"\n  {duration * 1000:.1f}ms {sql}"
+                    for duration, sql in sorted(timings.slowest_sql, reverse=True)
+                ),
+            )
+        return response
@@ -16,8 +16,9 @@ class IPAddressHistoricalModel(models.Model):
 @receiver(pre_create_historical_record)
 def record_history_ip_address(sender, **kwargs):
     history_instance = kwargs['history_instance']
-    # The middleware puts the request object here
-    request = HistoricalRecords.context.request
+    # The middleware puts the request object here (absent outside of requests,
+    # e.g. in management commands and tests)
+    request = getattr(HistoricalRecords.context, "request", None)
     
     if request:
         # Get the IP we cleaned in our custom middleware
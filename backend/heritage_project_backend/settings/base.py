@@ -56,6 +56,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so its timings include the other middleware
+    "heritage_project_backend.instrumentation.InstrumentationMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -136,6 +138,23 @@ STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
+# Per-process cache for development; prod shares Redis (REDIS_URL) or a
+# database cache table between all workers (see settings/prod.py)
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    }
+}
+
+# Cache alias holding the leaderboards (see apps/website/leaderboards.py); it
+# must be shared by every worker to rank users consistently
+LEADERBOARD_CACHE = "default"
+
+# Requests slower than this (ms) are logged with their slowest SQL statements
+# (see instrumentation.py); None turns the log off
+SLOW_REQUEST_MS = 1000
+SLOW_REQUEST_TOP_SQL = 5
+
 # jwt settings
 SIMPLE_JWT = {
     #todo: change to 15 mins for prod
@@ -9,9 +9,40 @@ load_dotenv()
 DEBUG = False
 
 #store media in gcp bucket
-DEFAULT_FILE_STORAGE = "storages.backends.gcloud.GoogleCloudStorage"
 GCP_BUCKET_NAME = os.environ.get("GCP_BUCKET_NAME") 
 MEDIA_URL = f"https://storage.googleapis.com/{GCP_BUCKET_NAME}/"
+# DEFAULT_FILE_STORAGE is ignored since Django 5.1, so default_storage (and
+# with it generated avatars) used to end up on local disk
+STORAGES = {
+    "default": {
+        "BACKEND": "storages.backends.gcloud.GoogleCloudStorage",
+        "OPTIONS": {"bucket_name": GCP_BUCKET_NAME},
+    },
+    "staticfiles": {
+        "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage",
+    },
+}
+
+# Shared by every worker of every instance: the dictionary cache version, the
+# leaderboards and the friends graph adjacency all rely on it. Redis when
+# REDIS_URL is set, otherwise a table in the Postgres database (created by
+# `manage.py createcachetable`, see the Dockerfile).
+if os.environ.get("REDIS_URL"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.environ["REDIS_URL"],
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+            "LOCATION": "django_cache",
+            # The default of 300 entries would keep culling leaderboard blocks
+            "OPTIONS": {"MAX_ENTRIES": 200000, "CULL_FREQUENCY": 10},
+        }
+    }
 
 
 ALLOWED_HOSTS = [
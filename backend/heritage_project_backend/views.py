@@ -0,0 +1,30 @@
+from drf_spectacular.utils import OpenApiResponse, extend_schema
+from rest_framework import status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from .instrumentation import METRICS
+
+
+@extend_schema(
+    tags=["Metrics"],
+    summary="Request metrics",
+    description=(
+        "Per-endpoint request counts and histograms of wall time, DB time, query "
+        "count, serializer time and response size, for the worker process that "
+        "answers. Histogram buckets are cumulative counts per upper bound. "
+        "DELETE clears them."
+    ),
+    responses={
+        200: OpenApiResponse(description="Metrics of this worker process."),
+        204: OpenApiResponse(description="Metrics cleared."),
+        403: OpenApiResponse(description="Admins only."),
+    },
+)
+@api_view(["GET", "DELETE"])
+@permission_classes([IsAdminUser])
+def request_metrics(request):
+    if request.method == "DELETE":
+        METRICS.reset()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+    return Response(METRICS.snapshot(), status=status.HTTP_200_OK)